@@ -1,5 +1,3 @@
-import shap as sh
-
 """
 #explainer = sh.Explainer(model.get_model(), X_train)
 #shap_values = explainer(X_test)
@@ -17,40 +15,84 @@ def GetDependencePlot(dataFrame, X_test, shap_values):
 import joblib
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import shap
 import os
 import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ProAndTrain import dataCache, instrumentation, modelRegistry, shapPlots, shapStore
 
 
-def load_model_and_data(model_path, data_path):
+def load_model_and_data(model_path, data_path, chunksize=100000):
     """
     Load a saved model from a .pkl file and the associated data for SHAP explanations
 
+    The features are put in the model's feature order and scaled with the scaler of its
+    registry metadata (the <name>.json next to the .pkl), so the model is explained on the
+    inputs it was trained on. The unscaled values are returned too, for the plot axes.
+
     Parameters:
     model_path (str): Path to the .pkl model file
     data_path (str): Path to CSV data file
+    chunksize (int): Rows per chunk when the processed-data cache has to be built
 
     Returns:
-    tuple: (model, X_test, feature_names)
+    tuple: (model, X_sample, feature_names, X_display) with X_sample the scaled model inputs and X_display their unscaled values
     """
     print(f"Loading model from {model_path}...")
-    model = joblib.load(model_path)
+    with instrumentation.span('load', source='model') as stage:
+        model = joblib.load(model_path)
+        stage.add(bytes=os.path.getsize(model_path))
 
     print(f"Loading data from {data_path}...")
-    data = pd.read_csv(data_path)
-
-    # Assuming the last column is the target variable
-    X = data.iloc[:, :-1]
-    feature_names = X.columns.tolist()
+    # Memory-mapped processed features, built from the CSV on first use
+    X, _, feature_names = dataCache.load_processed(data_path, chunksize=chunksize)
 
     # If dataset is large, use a sample
     if X.shape[0] > 10000:
-        X_sample = X.sample(n=1000, random_state=42)
+        # Same rows as X.sample(n=1000, random_state=42); only those rows are read from the map
+        positions = np.random.RandomState(42).choice(X.shape[0], size=1000, replace=False)
+        X_sample = pd.DataFrame(X[positions], index=positions, columns=feature_names)
     else:
-        X_sample = X
+        X_sample = pd.DataFrame(X, columns=feature_names)
+
+    registry = modelRegistry.get_registry(os.path.dirname(model_path) or '.')
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    metadata = registry.metadata(name)
+    if metadata.get('feature_names'):
+        feature_names = list(metadata['feature_names'])
+    if metadata.get('scaler') is None:
+        print(f"No scaler in the metadata of {model_path}; explaining the unscaled features")
+    X_display = X_sample[feature_names]
+    X_sample = pd.DataFrame(registry.scale(name, X_display.to_numpy()), index=X_display.index, columns=feature_names)
+
+    return model, X_sample, feature_names, X_display
+
+
+def explainer_kind(model, model_type=None):
+    """
+    Which SHAP explainer create_shap_explainer builds for a model
+
+    Parameters:
+    model: The machine learning model
+    model_type (str, optional): Type of model to use specific explainer
+
+    Returns:
+    str: 'tree', 'linear' or 'kernel' (only 'tree' ignores the background data)
+    """
+    if model_type is None:
+        model_name = type(model).__name__.lower()
+        if any(x in model_name for x in ['xgb', 'lgbm', 'catboost', 'forest', 'tree', 'gbm', 'boost']):
+            return 'tree'
+        elif any(x in model_name for x in ['svm', 'sgd', 'linear', 'logistic', 'regression']):
+            return 'linear'
+        return 'kernel'
 
-    return model, X_sample, feature_names
+    if model_type.lower() in ['xgboost', 'lightgbm', 'catboost', 'randomforest', 'tree']:
+        return 'tree'
+    elif model_type.lower() in ['linear', 'logistic', 'regression']:
+        return 'linear'
+    return 'kernel'
 
 
 def create_shap_explainer(model, X_sample, model_type=None):
@@ -65,45 +107,121 @@ def create_shap_explainer(model, X_sample, model_type=None):
     Returns:
     shap.Explainer: SHAP explainer object
     """
+    import shap
+
     print("Creating SHAP explainer...")
 
-    # Auto-detect model type if not specified
+    kind = explainer_kind(model, model_type)
     if model_type is None:
-        model_name = type(model).__name__.lower()
-
-        if any(x in model_name for x in ['xgb', 'lgbm', 'catboost', 'forest', 'tree', 'gbm', 'boost']):
-            print("Detected tree-based model, using TreeExplainer")
-            return shap.TreeExplainer(model)
-        elif any(x in model_name for x in ['svm', 'sgd', 'linear', 'logistic', 'regression']):
-            print("Detected linear model, using LinearExplainer")
-            return shap.LinearExplainer(model, X_sample)
-        else:
-            print("Model type not detected, using KernelExplainer")
-            return shap.KernelExplainer(model.predict if hasattr(model, 'predict') else model, X_sample)
+        print({'tree': "Detected tree-based model, using TreeExplainer",
+               'linear': "Detected linear model, using LinearExplainer",
+               'kernel': "Model type not detected, using KernelExplainer"}[kind])
 
-    # Use specified model type
-    if model_type.lower() in ['xgboost', 'lightgbm', 'catboost', 'randomforest', 'tree']:
+    if kind == 'tree':
         return shap.TreeExplainer(model)
-    elif model_type.lower() in ['linear', 'logistic', 'regression']:
+    elif kind == 'linear':
         return shap.LinearExplainer(model, X_sample)
     else:
         predict_fn = model.predict if hasattr(model, 'predict') else model
         return shap.KernelExplainer(predict_fn, X_sample)
 
 
-def generate_shap_values(explainer, X_sample):
+_worker_explainer = None
+_worker_kwargs = None
+
+
+def _init_shap_worker(explainer, kwargs):
+    global _worker_explainer, _worker_kwargs
+    # The explainer (model and background data) is unpickled once per worker, not once per chunk
+    _worker_explainer = explainer
+    _worker_kwargs = kwargs
+
+
+def _shap_chunk(chunk):
+    return _worker_explainer.shap_values(chunk, **_worker_kwargs)
+
+
+def _concatenate(parts):
+    """
+    Joins per-chunk SHAP values along the rows, for arrays or per-class lists of arrays
+    """
+    if isinstance(parts[0], list):
+        return [np.concatenate([part[i] for part in parts]) for i in range(len(parts[0]))]
+    return np.concatenate(parts)
+
+
+def _report_progress(done, total, start):
+    elapsed = time.perf_counter() - start
+    remaining = elapsed / done * (total - done)
+    print(f"\rSHAP values: {done}/{total} chunks ({done / total:.0%}), {elapsed:.1f} s elapsed, "
+          f"about {remaining:.1f} s left   ", end='' if done < total else '\n', flush=True)
+
+
+def generate_shap_values(explainer, X_sample, n_jobs=1, chunksize=None, nsamples=None):
     """
     Generate SHAP values using the explainer
 
+    The rows are explained in chunks, in a process pool when n_jobs > 1, and the
+    results are joined into the same shape as one explainer.shap_values call.
+
     Parameters:
     explainer: SHAP explainer object
     X_sample: Sample data for explanation
+    n_jobs (int): Number of worker processes
+    chunksize (int, optional): Rows per chunk (default: about four chunks per worker)
+    nsamples (int, optional): KernelExplainer model evaluations per row (default: 'auto'); fewer is faster but less accurate
 
     Returns:
-    shap_values: Computed SHAP values
+    shap_values: Computed SHAP values (a ValueError for an X_sample without rows)
     """
+    if X_sample.shape[0] == 0:
+        # The result's shape (one array, or one per class) is only known from a computed chunk
+        raise ValueError("X_sample has no rows to explain.")
     print("Calculating SHAP values (this may take some time)...")
-    return explainer.shap_values(X_sample)
+    kwargs = {}
+    if type(explainer).__name__ == 'KernelExplainer':
+        kwargs = {'nsamples': nsamples or 'auto', 'silent': True}
+
+    n_rows = X_sample.shape[0]
+    if chunksize is None:
+        chunksize = max(1, -(-n_rows // (4 * n_jobs)))
+    take = X_sample.iloc if isinstance(X_sample, pd.DataFrame) else X_sample
+    chunks = [take[start:start + chunksize] for start in range(0, n_rows, chunksize)]
+
+    start = time.perf_counter()
+    parts = [None] * len(chunks)
+    with instrumentation.span('shap', explainer=type(explainer).__name__, jobs=n_jobs) as stage:
+        stage.add(rows=n_rows, chunks=len(chunks))
+        if n_jobs <= 1:
+            for i, chunk in enumerate(chunks):
+                parts[i] = explainer.shap_values(chunk, **kwargs)
+                _report_progress(i + 1, len(chunks), start)
+            return _concatenate(parts)
+
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_shap_worker, initargs=(explainer, kwargs)) as pool:
+            futures = {pool.submit(_shap_chunk, chunk): i for i, chunk in enumerate(chunks)}
+            for done, future in enumerate(as_completed(futures), 1):
+                parts[futures[future]] = future.result()
+                _report_progress(done, len(chunks), start)
+        return _concatenate(parts)
+
+
+def explain_patient(explainer, x_row, nsamples=500):
+    """
+    SHAP values of a single patient for the positive class
+
+    Parameters:
+    explainer: SHAP explainer object (e.g. from explainerCache or create_shap_explainer)
+    x_row: One row of model inputs, scaled like the training data (e.g. by ModelRegistry.scale; 1-D or a single-row 2-D array)
+    nsamples (int): KernelExplainer model evaluations (ignored by other explainers)
+
+    Returns:
+    tuple: (values 1-D array, expected value)
+    """
+    X_row = np.asarray(x_row, dtype='float64').reshape(1, -1)
+    kwargs = {'nsamples': nsamples, 'silent': True} if type(explainer).__name__ == 'KernelExplainer' else {}
+    values, expected_value, _ = shapPlots.positive_class(explainer.shap_values(X_row, **kwargs), explainer.expected_value)
+    return values[0], float(np.ravel(expected_value)[0])
 
 
 def create_output_directory(output_dir):
@@ -120,149 +238,147 @@ def create_output_directory(output_dir):
         print(f"Output directory already exists: {output_dir}")
 
 
-def generate_shap_visualizations(shap_values, X_sample, feature_names, output_dir):
+def generate_shap_visualizations(shap_values, X_sample, feature_names, output_dir, expected_value=None,
+                                 mode='publication', image_format=None, jobs=1):
     """
     Generate and save various SHAP visualizations
 
+    The summary, bar, dependence, force and decision plots are rendered by
+    shapPlots.render_plots; plots whose inputs are unchanged since the last run are skipped.
+
     Parameters:
     shap_values: Computed SHAP values
-    X_sample: Sample data used for explanations
+    X_sample: Feature values of the explained rows shown on the plot axes (the unscaled values)
     feature_names: List of feature names
     output_dir (str): Directory to save plots
+    expected_value: The explainer's expected value (base value of the force and decision plots)
+    mode (str): 'publication' (300 dpi PNG) or 'draft' (72 dpi JPEG)
+    image_format (str, optional): 'png', 'jpg' or 'webp' instead of the mode's format
+    jobs (int): Number of worker processes rendering the plots
     """
     print("Generating visualizations...")
 
-    # For classification models with multiple classes
-    if isinstance(shap_values, list):
-        class_index = 1  # Usually 1 is the positive class (adjust if needed)
-        values_to_plot = shap_values[class_index]
-        title_suffix = f" (Class {class_index})"
-    else:
-        values_to_plot = shap_values
-        title_suffix = ""
-
-    # 1. Summary Plot (Feature Importance)
-    plt.figure(figsize=(12, 8))
-    shap.summary_plot(values_to_plot, X_sample, feature_names=feature_names, show=False)
-    plt.title(f"SHAP Feature Importance{title_suffix}")
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, "shap_summary_plot.png"), dpi=300, bbox_inches='tight')
-    plt.close()
-
-    # 2. Bar Plot (Mean absolute SHAP value for each feature)
-    plt.figure(figsize=(12, 8))
-    shap.summary_plot(values_to_plot, X_sample, feature_names=feature_names, plot_type="bar", show=False)
-    plt.title(f"SHAP Feature Importance (Bar Plot){title_suffix}")
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, "shap_bar_plot.png"), dpi=300, bbox_inches='tight')
-    plt.close()
-
-    # 3. Dependence plots for top 5 features
-    mean_abs_shap = np.mean(np.abs(values_to_plot), axis=0)
-    feature_importance = pd.DataFrame(list(zip(feature_names, mean_abs_shap)),
-                                      columns=['feature_name', 'feature_importance'])
-    feature_importance.sort_values(by=['feature_importance'], ascending=False, inplace=True)
-
-    # Get top 5 features
-    top_features = feature_importance.head(5)['feature_name'].tolist()
-
-    for feature in top_features:
-        try:
-            plt.figure(figsize=(12, 8))
-            feature_idx = feature_names.index(feature)
-            shap.dependence_plot(feature_idx, values_to_plot, X_sample, feature_names=feature_names, show=False)
-            plt.title(f"SHAP Dependence Plot for {feature}{title_suffix}")
-            plt.tight_layout()
-            plt.savefig(os.path.join(output_dir, f"shap_dependence_{feature.replace(' ', '_')}.png"),
-                        dpi=300, bbox_inches='tight')
-            plt.close()
-        except Exception as e:
-            print(f"Error creating dependence plot for feature {feature}: {e}")
-
-    # 4. Force plot for sample examples (first 3 examples)
-    try:
-        num_examples = min(3, X_sample.shape[0])
-        for i in range(num_examples):
-            plt.figure(figsize=(20, 3))
-            force_plot = shap.force_plot(
-                explainer.expected_value[class_index] if isinstance(explainer.expected_value, list)
-                else explainer.expected_value,
-                values_to_plot[i, :], X_sample.iloc[i, :],
-                feature_names=feature_names, matplotlib=True, show=False)
-            plt.title(f"SHAP Force Plot for Example {i + 1}")
-            plt.tight_layout()
-            plt.savefig(os.path.join(output_dir, f"shap_force_plot_example_{i + 1}.png"),
-                        dpi=300, bbox_inches='tight')
-            plt.close()
-    except Exception as e:
-        print(f"Error creating force plots: {e}")
-
-    # 5. Decision plot for top 10 examples
-    try:
-        plt.figure(figsize=(12, 10))
-        num_examples = min(10, X_sample.shape[0])
-        shap.decision_plot(explainer.expected_value[class_index] if isinstance(explainer.expected_value, list)
-                           else explainer.expected_value,
-                           values_to_plot[:num_examples], X_sample.iloc[:num_examples],
-                           feature_names=feature_names, show=False)
-        plt.title(f"SHAP Decision Plot{title_suffix}")
-        plt.tight_layout()
-        plt.savefig(os.path.join(output_dir, "shap_decision_plot.png"), dpi=300, bbox_inches='tight')
-        plt.close()
-    except Exception as e:
-        print(f"Error creating decision plot: {e}")
-
-    print(f"All visualizations saved to {output_dir}")
-
-
-parser = argparse.ArgumentParser(description='Generate SHAP explanation visualizations for a trained model.')
-parser.add_argument('--model', type=str, required=True, help='Path to .pkl model file')
-parser.add_argument('--data', type=str, required=True, help='Path to CSV data file')
-parser.add_argument('--output', type=str, default='shap_results', help='Output directory for visualizations')
-parser.add_argument('--model-type', type=str, help='Model type (tree, linear, kernel) for specific explainer')
-
-args = parser.parse_args()
-
-# Create output directory
-create_output_directory(args.output)
-
-# Load model and data
-model, X_sample, feature_names = load_model_and_data(args.model, args.data)
-
-# Create SHAP explainer
-explainer = create_shap_explainer(model, X_sample, args.model_type)
-
-# Generate SHAP values
-shap_values = generate_shap_values(explainer, X_sample)
-
-# Generate and save visualizations
-generate_shap_visualizations(shap_values, X_sample, feature_names, args.output)
-
-# Also save feature importance data to CSV
-if isinstance(shap_values, list):
-    class_index = 1  # Usually 1 is the positive class
-    values_to_analyze = shap_values[class_index]
-else:
-    values_to_analyze = shap_values
-
-# Calculate mean absolute SHAP values for each feature
-mean_abs_shap = np.mean(np.abs(values_to_analyze), axis=0)
-
-# Create DataFrame with feature importance information
-feature_importance = pd.DataFrame({
-    'Feature': feature_names,
-    'Mean_Absolute_SHAP_Value': mean_abs_shap,
-    'Relative_Importance': mean_abs_shap / np.sum(mean_abs_shap) * 100
-})
-
-# Sort by importance
-feature_importance = feature_importance.sort_values('Mean_Absolute_SHAP_Value', ascending=False)
-
-# Save to CSV
-importance_file = os.path.join(args.output, 'feature_importance.csv')
-feature_importance.to_csv(importance_file, index=False)
-print(f"Feature importance saved to {importance_file}")
-
-print("SHAP analysis completed successfully!")
+    result = shapPlots.render_plots(shap_values, X_sample, feature_names, output_dir, expected_value,
+                                    mode=mode, image_format=image_format, jobs=jobs)
+    for error in result['errors']:
+        print(error)
+
+    print(f"{len(result['rendered'])} visualizations saved to {output_dir}, {len(result['skipped'])} unchanged")
+
+
+def save_feature_importance(shap_values, feature_names, output_dir):
+    """
+    Save the mean absolute SHAP value of each feature to feature_importance.csv
+
+    Parameters:
+    shap_values: SHAP values (computed or read from a ShapStore)
+    feature_names: List of feature names
+    output_dir (str): Directory to save the CSV
+
+    Returns:
+    str: Path of the written file
+    """
+    # Positive class of per-class lists or (rows, features, classes) arrays
+    values_to_analyze, _, _ = shapPlots.positive_class(shap_values, None)
+
+    # Calculate mean absolute SHAP values for each feature
+    mean_abs_shap = np.mean(np.abs(values_to_analyze), axis=0)
+
+    # Create DataFrame with feature importance information
+    feature_importance = pd.DataFrame({
+        'Feature': feature_names,
+        'Mean_Absolute_SHAP_Value': mean_abs_shap,
+        'Relative_Importance': mean_abs_shap / np.sum(mean_abs_shap) * 100
+    })
 
+    # Sort by importance
+    feature_importance = feature_importance.sort_values('Mean_Absolute_SHAP_Value', ascending=False)
 
+    # Save to CSV
+    importance_file = os.path.join(output_dir, 'feature_importance.csv')
+    feature_importance.to_csv(importance_file, index=False)
+    return importance_file
+
+
+def run(model_path, data_path, output_dir='shap_results', model_type=None, jobs=1, chunksize=None, nsamples=None,
+        store_dir=None, mode='publication', image_format=None):
+    """
+    Full SHAP report of a model: stored or newly computed SHAP values, the plots and feature_importance.csv
+
+    Parameters:
+    model_path (str): Path to .pkl model file
+    data_path (str): Path to CSV data file
+    output_dir (str): Output directory for visualizations
+    model_type (str, optional): Model type (tree, linear, kernel) for specific explainer
+    jobs (int): Number of worker processes for the SHAP values and the plots
+    chunksize (int, optional): Rows per SHAP chunk
+    nsamples (int, optional): KernelExplainer model evaluations per row
+    store_dir (str, optional): Directory of the stored SHAP values (default: <output_dir>/shap_store)
+    mode (str): 'publication' or 'draft'
+    image_format (str, optional): 'png', 'jpg' or 'webp'
+
+    Returns:
+    tuple: (shap_values, X_sample, feature_names)
+    """
+    # Create output directory
+    create_output_directory(output_dir)
+
+    # Load model and data; the model is explained on scaled inputs, the plots show the unscaled values
+    model, X_sample, feature_names, X_display = load_model_and_data(model_path, data_path)
+
+    # SHAP values already computed for this model artifact are reused; only new rows are explained.
+    # Linear and kernel explainers use the whole sample as background, so their values (and the
+    # expected value) change with it and the store is keyed on its hash; tree explainers ignore it.
+    settings = {'model_type': model_type, 'nsamples': nsamples, 'inputs': 'scaled'}
+    if explainer_kind(model, model_type) != 'tree':
+        settings['background_sha256'] = shapStore.data_hash(X_sample)
+    store = shapStore.ShapStore(store_dir or os.path.join(output_dir, 'shap_store'), dataCache.file_hash(model_path),
+                                feature_names, settings=settings)
+    hashes = shapStore.row_hashes(X_sample)
+    missing = store.missing(hashes)
+    print(f"{int(missing.sum())} of {len(hashes)} rows have no stored SHAP values")
+
+    if missing.any():
+        # Create SHAP explainer
+        explainer = create_shap_explainer(model, X_sample, model_type)
+
+        # Generate SHAP values
+        store.add(hashes[missing], generate_shap_values(explainer, X_sample[missing], jobs, chunksize, nsamples),
+                  explainer.expected_value)
+
+    shap_values = store.get(hashes)
+
+    # Generate and save visualizations
+    generate_shap_visualizations(shap_values, X_display, feature_names, output_dir, store.expected_value,
+                                 mode=mode, image_format=image_format, jobs=jobs)
+
+    # Also save feature importance data to CSV
+    importance_file = save_feature_importance(shap_values, feature_names, output_dir)
+    print(f"Feature importance saved to {importance_file}")
+
+    print("SHAP analysis completed successfully!")
+    return shap_values, X_sample, feature_names
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate SHAP explanation visualizations for a trained model.')
+    parser.add_argument('--model', type=str, required=True, help='Path to .pkl model file')
+    parser.add_argument('--data', type=str, required=True, help='Path to CSV data file')
+    parser.add_argument('--output', type=str, default='shap_results', help='Output directory for visualizations')
+    parser.add_argument('--model-type', type=str, help='Model type (tree, linear, kernel) for specific explainer')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes for the SHAP values')
+    parser.add_argument('--chunksize', type=int, help='Rows per SHAP chunk (default: about four chunks per worker)')
+    parser.add_argument('--nsamples', type=int, help="KernelExplainer model evaluations per row (default: shap's 'auto')")
+    parser.add_argument('--store', type=str, help='Directory of the stored SHAP values (default: <output>/shap_store)')
+    parser.add_argument('--draft', action='store_true', help='Render quick low-resolution drafts instead of 300 dpi plots')
+    parser.add_argument('--format', type=str, choices=['png', 'jpg', 'webp'], help='Image format of the plots')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+    instrumentation.enable_from_args(args)
+
+    run(args.model, args.data, args.output, args.model_type, args.jobs, args.chunksize, args.nsamples,
+        args.store, 'draft' if args.draft else 'publication', args.format)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Kernel SVM for large training sets: an explicit approximate kernel feature map feeding a linear SGD classifier.
+
+SVC's training cost grows quadratically to cubically with the number of rows, and its
+prediction cost with the number of support vectors. ApproximateKernelSVC maps the rows
+into n_components features whose dot products approximate the RBF kernel (Nystroem
+landmarks, or random Fourier features), and trains a linear hinge-loss model on them
+with SGD in mini-batches. Training is linear in the row count; only one mini-batch is
+ever mapped at a time, so memory is bounded by batch_size x n_components; and
+partial_fit takes new rows without revisiting the old ones.
+"""
+
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.linear_model import SGDClassifier
+from sklearn.utils.metaestimators import available_if
+
+
+# Feature maps: 'nystroem' fits landmarks on the data, 'rff' draws data-independent random features
+APPROXIMATIONS = ['nystroem', 'rff']
+
+
+class ApproximateKernelSVC(ClassifierMixin, BaseEstimator):
+    def __init__(self, approximation='nystroem', n_components=300, gamma='scale', alpha=1e-4, loss='hinge',
+                 class_weight=None, batch_size=4096, epochs=5, random_state=42):
+        """
+        :param approximation: 'nystroem' or 'rff', see APPROXIMATIONS.
+        :param n_components: Dimension of the feature map (landmarks or random features).
+        :param gamma: RBF kernel coefficient, or 'scale' for 1 / (n_features * X.var()) as in SVC, with the variance
+            taken over the n_components rows the feature map is fitted on.
+        :param alpha: L2 regularization of the SGD classifier (about 1 / (C * n_rows) of an SVC).
+        :param loss: SGD loss: 'hinge' (SVM; no probabilities), 'log_loss' or 'modified_huber'.
+        :param class_weight: None, 'balanced' or a {class: weight} dict.
+        :param batch_size: Rows per mini-batch.
+        :param epochs: Passes over the training rows in fit.
+        :param random_state: Seed of the landmarks/features, the batch order and SGD.
+        """
+        self.approximation = approximation
+        self.n_components = n_components
+        self.gamma = gamma
+        self.alpha = alpha
+        self.loss = loss
+        self.class_weight = class_weight
+        self.batch_size = batch_size
+        self.epochs = epochs
+        self.random_state = random_state
+
+    def _init_map(self, X, y):
+        """
+        Fits the feature map on a sample of the first rows seen and sets up the SGD classifier.
+
+        Only the sampled rows are converted to float64, so X can be a memmap larger than memory.
+        """
+        if self.approximation not in APPROXIMATIONS:
+            raise ValueError(f"Approximation '{self.approximation}' is not recognized. Available options: {', '.join(APPROXIMATIONS)}.")
+        X = np.asarray(X)
+        n_components = min(self.n_components, len(X))
+        rows = np.random.default_rng(self.random_state).choice(len(X), size=n_components, replace=False)
+        sample = np.asarray(X[np.sort(rows)], dtype='float64')
+        gamma = 1.0 / (sample.shape[1] * sample.var()) if self.gamma == 'scale' else float(self.gamma)
+
+        if self.approximation == 'nystroem':
+            self.feature_map_ = Nystroem(gamma=gamma, n_components=n_components, random_state=self.random_state).fit(sample)
+        else:
+            # RBFSampler only draws the random features; the rows just give it the input width
+            self.feature_map_ = RBFSampler(gamma=gamma, n_components=self.n_components, random_state=self.random_state).fit(sample)
+
+        class_weight = self.class_weight
+        if class_weight == 'balanced':
+            # partial_fit needs fixed weights; they are taken from the rows the model starts with
+            labels, counts = np.unique(y, return_counts=True)
+            class_weight = {label: len(y) / (len(labels) * count) for label, count in zip(labels, counts)}
+        self.classifier_ = SGDClassifier(loss=self.loss, alpha=self.alpha, class_weight=class_weight,
+                                         random_state=self.random_state)
+        self.gamma_ = gamma
+        self.n_features_in_ = X.shape[1]
+
+    def _transform(self, X):
+        """
+        Maps one batch of rows, converted to float64 batch by batch.
+        """
+        return self.feature_map_.transform(np.asarray(X, dtype='float64'))
+
+    def partial_fit(self, X, y, classes=None):
+        """
+        One SGD pass over new rows; the first call also fits the feature map on them.
+
+        :param X: Rows (any number; mapped batch_size rows at a time).
+        :param y: Labels.
+        :param classes: All class labels (default: [0, 1]), needed on the first call.
+        :return: self
+        """
+        y = np.asarray(y)
+        if not hasattr(self, 'classifier_'):
+            self._init_map(X, y)
+        classes = np.array([0, 1]) if classes is None else np.asarray(classes)
+        for start in range(0, len(y), self.batch_size):
+            features = self._transform(X[start:start + self.batch_size])
+            self.classifier_.partial_fit(features, y[start:start + self.batch_size], classes=classes)
+        self.classes_ = self.classifier_.classes_
+        return self
+
+    def fit(self, X, y):
+        """
+        Trains from scratch: `epochs` shuffled passes of mini-batch SGD.
+
+        :param X: Training rows (an array or a memmap; batches are gathered in row order).
+        :param y: Labels.
+        :return: self
+        """
+        for attribute in ('classifier_', 'feature_map_', 'classes_'):
+            self.__dict__.pop(attribute, None)
+        y = np.asarray(y)
+        classes = np.unique(y)
+        rng = np.random.default_rng(self.random_state)
+        self._init_map(X, y)
+        for _ in range(self.epochs):
+            order = rng.permutation(len(y))
+            for start in range(0, len(y), self.batch_size):
+                rows = np.sort(order[start:start + self.batch_size])
+                self.partial_fit(X[rows], y[rows], classes=classes)
+        return self
+
+    def decision_function(self, X):
+        """
+        :param X: Rows to score.
+        :return: Signed distance to the separating hyperplane in the mapped space (positive: classes_[1]).
+        """
+        X = np.asarray(X)
+        return np.concatenate([self.classifier_.decision_function(self._transform(X[start:start + self.batch_size]))
+                               for start in range(0, len(X), self.batch_size)]) if len(X) else np.empty(0)
+
+    def predict(self, X):
+        """
+        :param X: Rows to classify.
+        :return: Predicted class labels.
+        """
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
+
+    def _has_proba(self):
+        return self.loss in ('log_loss', 'modified_huber')
+
+    @available_if(_has_proba)
+    def predict_proba(self, X):
+        """
+        Class probabilities (only for loss='log_loss' or 'modified_huber').
+        """
+        X = np.asarray(X)
+        return np.concatenate([self.classifier_.predict_proba(self._transform(X[start:start + self.batch_size]))
+                               for start in range(0, len(X), self.batch_size)]) if len(X) else np.empty((0, len(self.classes_)))
@@ -0,0 +1,306 @@
+"""
+Array form of the tree-ensemble backends, for low-latency scoring.
+
+compile_model flattens a trained RandomForestClassifier or XGBClassifier into one set of
+contiguous node arrays (split feature, threshold, children, missing-value direction,
+leaf value), with the trees stored one after the other. TreeEnsemble walks every tree
+for every row at once, one tree level per NumPy step, so scoring one patient costs a few
+array operations instead of the estimator's input validation and per-tree dispatch.
+Leaves point to themselves, so a walk of max_depth steps ends on a leaf in every tree.
+
+CatBoost's symmetric (oblivious) trees use one split per level, so ObliviousEnsemble
+computes every row's leaf index directly from one comparison per level.
+
+Both keep everything they need in their `arrays` dict, plus the scalars in `params`,
+which is what modelArtifact writes to disk.
+"""
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+
+# Traversal temporaries hold rows x trees node indices; larger inputs are scored in blocks of this many entries
+BLOCK_ENTRIES = 1 << 20
+
+
+class TreeEnsemble:
+    def __init__(self, arrays, kind, max_depth, base_margin=0.0):
+        """
+        Flattened tree ensemble; see compile_model.
+
+        :param arrays: Dict of node arrays 'feature', 'threshold', 'missing_left', 'value', 'children'
+                       (left and right child of every node, interleaved) and 'roots' (first node of every tree).
+        :param kind: 'random_forest' (mean of the leaf probabilities, x <= threshold goes left) or
+                     'xgboost' (sigmoid of the summed leaf margins, x < threshold goes left).
+        :param max_depth: Depth of the deepest tree.
+        :param base_margin: Margin added to the summed leaves (XGBoost's base score).
+        """
+        if kind not in ('random_forest', 'xgboost'):
+            raise ValueError(f"Ensemble kind '{kind}' is not recognized. Available options: 'random_forest', 'xgboost'.")
+        self.arrays = arrays
+        self.kind = kind
+        self.max_depth = int(max_depth)
+        self.base_margin = float(base_margin)
+
+    @property
+    def params(self):
+        return {'kind': self.kind, 'max_depth': self.max_depth, 'base_margin': self.base_margin}
+
+    @property
+    def n_trees(self):
+        return len(self.arrays['roots'])
+
+    @property
+    def n_nodes(self):
+        return len(self.arrays['feature'])
+
+    def leaves(self, X):
+        """
+        :param X: 2-D array of model inputs (or one 1-D row).
+        :return: (rows x trees) int32 array of the leaf each row reaches in each tree.
+        """
+        X = np.asarray(X, dtype='float32')
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        a = self.arrays
+        n_rows, n_features = X.shape
+        block = max(1, BLOCK_ENTRIES // self.n_trees)
+        out = np.empty((n_rows, self.n_trees), dtype='int32')
+        for start in range(0, n_rows, block):
+            X_block = X[start:start + block]
+            values = X_block.ravel()
+            has_missing = np.isnan(values).any()
+            # Row offset of every (row, tree) pair into the flattened block
+            offsets = np.repeat(np.arange(len(X_block), dtype='int64') * n_features, self.n_trees)
+            node = np.tile(a['roots'], len(X_block))
+            for _ in range(self.max_depth):
+                x = values.take(offsets + a['feature'].take(node))
+                threshold = a['threshold'].take(node)
+                go_right = x >= threshold if self.kind == 'xgboost' else x > threshold
+                if has_missing:
+                    go_right = np.where(np.isnan(x), ~a['missing_left'].take(node), go_right)
+                node = a['children'].take(node * 2 + go_right)
+            out[start:start + block] = node.reshape(len(X_block), self.n_trees)
+        return out
+
+    def predict_proba(self, X):
+        """
+        :param X: 2-D array of model inputs (or one 1-D row).
+        :return: Positive-class probabilities, like MLModel.predict_proba.
+        """
+        values = self.arrays['value'][self.leaves(X)]
+        if self.kind == 'random_forest':
+            return values.mean(axis=1)
+        return 1.0 / (1.0 + np.exp(-(values.sum(axis=1) + self.base_margin)))
+
+    def predict(self, X):
+        """
+        :param X: 2-D array of model inputs (or one 1-D row).
+        :return: 0/1 class predictions (positive when the probability is above 0.5, as both estimators do).
+        """
+        return (self.predict_proba(X) > 0.5).astype('int64')
+
+
+def _tree_depth(left, right):
+    depth, level = 0, [0]
+    while True:
+        children = [child for node in level for child in (left[node], right[node]) if child >= 0]
+        if not children:
+            return depth
+        depth, level = depth + 1, children
+
+
+def _concatenate(trees):
+    """
+    Joins per-tree node arrays into ensemble arrays, offsetting the child indices and
+    pointing every leaf (child -1) at itself.
+    """
+    arrays = {name: [] for name in ('feature', 'threshold', 'children', 'missing_left', 'value')}
+    roots = []
+    offset = 0
+    for tree in trees:
+        n = len(tree['feature'])
+        own = np.arange(offset, offset + n, dtype='int32')
+        is_leaf = tree['left'] < 0
+        # (left, right) pairs, so one take picks the branch
+        children = [np.where(is_leaf, own, tree[side] + offset) for side in ('left', 'right')]
+        arrays['children'].append(np.stack(children, axis=1).ravel().astype('int32'))
+        arrays['feature'].append(np.where(is_leaf, 0, tree['feature']).astype('int32'))
+        arrays['threshold'].append(np.asarray(tree['threshold'], dtype='float64'))
+        arrays['missing_left'].append(np.asarray(tree['missing_left'], dtype=bool))
+        arrays['value'].append(np.asarray(tree['value'], dtype='float64'))
+        roots.append(offset)
+        offset += n
+
+    arrays = {name: np.ascontiguousarray(np.concatenate(parts)) for name, parts in arrays.items()}
+    arrays['roots'] = np.asarray(roots, dtype='int32')
+    return arrays
+
+
+def _from_random_forest(forest):
+    trees, depth = [], 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        counts = tree.value[:, 0, :]
+        positive = list(forest.classes_).index(1) if 1 in forest.classes_ else len(forest.classes_) - 1
+        missing_left = getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=bool))
+        trees.append({'feature': tree.feature, 'threshold': tree.threshold, 'left': tree.children_left,
+                      'right': tree.children_right, 'missing_left': missing_left,
+                      'value': counts[:, positive] / counts.sum(axis=1)})
+        depth = max(depth, tree.max_depth)
+    return TreeEnsemble(_concatenate(trees), 'random_forest', depth)
+
+
+def _from_xgboost(classifier):
+    booster = classifier.get_booster()
+    learner = json.loads(booster.save_raw(raw_format='json'))['learner']
+    objective = learner['objective']['name']
+    if objective != 'binary:logistic':
+        raise ValueError(f"XGBoost objective '{objective}' is not supported. Available options: 'binary:logistic'.")
+
+    model = learner['gradient_booster']['model']
+    tree_dumps = model['trees']
+    best_iteration = getattr(classifier, 'best_iteration', None) if getattr(classifier, 'early_stopping_rounds', None) else None
+    if best_iteration is not None:
+        # Same trees as the estimator's predict after early stopping
+        tree_dumps = tree_dumps[:(best_iteration + 1) * int(model['gbtree_model_param']['num_parallel_tree'])]
+
+    trees, depth = [], 0
+    for dump in tree_dumps:
+        if any(dump.get('split_type', [])):
+            raise ValueError("Categorical XGBoost splits are not supported.")
+        left, right = np.asarray(dump['left_children']), np.asarray(dump['right_children'])
+        conditions = np.asarray(dump['split_conditions'], dtype='float32')
+        is_leaf = left < 0
+        trees.append({'feature': np.asarray(dump['split_indices']), 'left': left, 'right': right,
+                      'threshold': np.where(is_leaf, np.inf, conditions),
+                      'missing_left': np.asarray(dump['default_left'], dtype=bool),
+                      # Leaves keep their weight in split_conditions
+                      'value': np.where(is_leaf, conditions, 0.0)})
+        depth = max(depth, _tree_depth(left, right))
+
+    # base_score is stored as a probability (as "5E-1", or "[5E-1]" in newer versions)
+    base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+    return TreeEnsemble(_concatenate(trees), 'xgboost', depth, base_margin=np.log(base_score / (1.0 - base_score)))
+
+
+class ObliviousEnsemble:
+    def __init__(self, arrays, scale=1.0, bias=0.0):
+        """
+        Symmetric trees of a binary CatBoost model; see compile_model.
+
+        Shallower trees are padded to the deepest one with splits that are never taken.
+
+        :param arrays: Dict of (trees x depth) arrays 'feature', 'border' and 'missing_greater' (NaN counts
+                       as above the border), and (trees x 2 ** depth) 'leaf_value'.
+        :param scale: Scale of the summed leaf values.
+        :param bias: Bias added after scaling.
+        """
+        self.arrays = arrays
+        self.scale = float(scale)
+        self.bias = float(bias)
+
+    @property
+    def params(self):
+        return {'scale': self.scale, 'bias': self.bias}
+
+    @property
+    def n_trees(self):
+        return len(self.arrays['feature'])
+
+    def leaves(self, X):
+        """
+        :param X: 2-D array of model inputs (or one 1-D row).
+        :return: (rows x trees) int64 array of every row's leaf index in each tree.
+        """
+        X = np.asarray(X, dtype='float32')
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        a = self.arrays
+        depth = a['feature'].shape[1]
+        # Level d of a tree sets bit d of the leaf index
+        bits = np.left_shift(1, np.arange(depth, dtype='int64'))
+        block = max(1, BLOCK_ENTRIES // (self.n_trees * max(depth, 1)))
+        out = np.empty((len(X), self.n_trees), dtype='int64')
+        for start in range(0, len(X), block):
+            x = X[start:start + block][:, a['feature']]
+            greater = x > a['border']
+            if np.isnan(x).any():
+                greater = np.where(np.isnan(x), a['missing_greater'], greater)
+            out[start:start + block] = greater @ bits
+        return out
+
+    def predict_proba(self, X):
+        """
+        :param X: 2-D array of model inputs (or one 1-D row).
+        :return: Positive-class probabilities, like MLModel.predict_proba.
+        """
+        leaves = self.leaves(X)
+        raw = np.take_along_axis(self.arrays['leaf_value'], leaves.T, axis=1).sum(axis=0)
+        return 1.0 / (1.0 + np.exp(-(self.scale * raw + self.bias)))
+
+    def predict(self, X):
+        """
+        :param X: 2-D array of model inputs (or one 1-D row).
+        :return: 0/1 class predictions (positive when the probability is above 0.5).
+        """
+        return (self.predict_proba(X) > 0.5).astype('int64')
+
+
+def _from_catboost(classifier):
+    # CatBoost exports its trees only to a file
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.json')
+        classifier.save_model(path, format='json')
+        with open(path) as f:
+            dump = json.load(f)
+
+    if dump['features_info'].get('categorical_features') or 'non_symmetric_trees' in dump:
+        raise ValueError("Only CatBoost models with numeric features and symmetric trees can be compiled.")
+    if len(dump['oblivious_trees'][0]['leaf_values']) != 2 ** len(dump['oblivious_trees'][0]['splits']):
+        raise ValueError("Only binary CatBoost classifiers can be compiled.")
+    missing_greater = {feature['feature_index']: feature.get('nan_value_treatment') == 'AsTrue'
+                       for feature in dump['features_info']['float_features']}
+
+    trees = dump['oblivious_trees']
+    depth = max(len(tree['splits']) for tree in trees)
+    # Padding splits compare against +inf, so they never set their bit
+    feature = np.zeros((len(trees), depth), dtype='int32')
+    border = np.full((len(trees), depth), np.inf, dtype='float32')
+    greater = np.zeros((len(trees), depth), dtype=bool)
+    leaf_value = np.zeros((len(trees), 2 ** depth), dtype='float64')
+    for i, tree in enumerate(trees):
+        for level, split in enumerate(tree['splits']):
+            feature[i, level] = split['float_feature_index']
+            border[i, level] = split['border']
+            greater[i, level] = missing_greater[split['float_feature_index']]
+        leaf_value[i, :len(tree['leaf_values'])] = tree['leaf_values']
+
+    scale, bias = dump['scale_and_bias']
+    return ObliviousEnsemble({'feature': feature, 'border': border, 'missing_greater': greater, 'leaf_value': leaf_value},
+                             scale=scale, bias=float(np.ravel(bias)[0]))
+
+
+def compile_model(model):
+    """
+    Flattens a trained tree ensemble into node arrays
+
+    Parameters:
+    model: Trained RandomForestClassifier, XGBClassifier or CatBoostClassifier (binary)
+
+    Returns:
+    TreeEnsemble or ObliviousEnsemble: Array predictor with the same predict_proba / predict outputs
+    """
+    name = type(model).__name__
+    if name == 'RandomForestClassifier':
+        return _from_random_forest(model)
+    if name == 'XGBClassifier':
+        return _from_xgboost(model)
+    if name == 'CatBoostClassifier':
+        return _from_catboost(model)
+    raise ValueError(f"Model type '{name}' cannot be compiled. Available options: RandomForestClassifier, XGBClassifier, CatBoostClassifier.")
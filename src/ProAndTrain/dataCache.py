@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from ProAndTrain import dataProcessing, instrumentation, momory_opt
+
+
+SCHEMA_FILE = 'schema.json'
+FEATURES_FILE = 'features.npy'
+TARGET_FILE = 'target.npy'
+PREPROCESSOR_FILE = 'preprocessor.npz'
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    SHA-256 of a file, read in blocks
+
+    Parameters:
+    path (str): File to hash
+    block_size (int): Bytes read at a time
+
+    Returns:
+    str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def default_cache_dir(data_path):
+    """
+    Cache directory of a CSV file: data/cache/<file name>/ next to the file itself
+    """
+    name = os.path.splitext(os.path.basename(data_path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(data_path)), 'cache', name)
+
+
+def _read_schema(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, SCHEMA_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_schema(cache_dir, schema):
+    tmp_path = os.path.join(cache_dir, SCHEMA_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(schema, f, indent=2)
+    os.replace(tmp_path, os.path.join(cache_dir, SCHEMA_FILE))
+
+
+def is_cache_valid(data_path, cache_dir):
+    """
+    Check whether the cache was built from this exact CSV with the current preprocessing.
+
+    Size and modification time are compared first, so an untouched file is not re-hashed;
+    a file that was touched but has the same content keeps its cache.
+
+    Parameters:
+    data_path (str): CSV the cache was built from
+    cache_dir (str): Cache directory
+
+    Returns:
+    bool: True if the cached arrays can be used as they are
+    """
+    schema = _read_schema(cache_dir)
+    if schema is None or schema['preprocessing_version'] != dataProcessing.PREPROCESSING_VERSION:
+        return False
+
+    stat = os.stat(data_path)
+    if schema['source_size'] == stat.st_size and schema['source_mtime_ns'] == stat.st_mtime_ns:
+        return True
+
+    if schema['source_sha256'] != file_hash(data_path):
+        return False
+
+    schema['source_size'], schema['source_mtime_ns'] = stat.st_size, stat.st_mtime_ns
+    _write_schema(cache_dir, schema)
+    return True
+
+
+def build_cache(data_path, cache_dir, chunksize=100000):
+    """
+    Process a CSV chunk by chunk into memory-mappable float32 arrays.
+
+    Only the momory_opt.MODEL_SCHEMA columns are parsed, straight to float64, which
+    keeps each chunk smaller than a default float64/object parse of every column; the
+    imputed chunks are narrowed to float32 as they are written.
+
+    Writes features.npy (rows x features), target.npy ('Biopsy'), the fitted
+    preprocessor and schema.json. The schema is written last, so an interrupted
+    build is never mistaken for a valid cache.
+
+    Parameters:
+    data_path (str): CSV in the raw (or already processed) layout, with a 'Biopsy' column
+    cache_dir (str): Cache directory
+    chunksize (int): Rows per chunk
+
+    Returns:
+    dict: The written schema
+    """
+    print(f"Building processed-data cache for {data_path}...")
+    os.makedirs(cache_dir, exist_ok=True)
+    stat = os.stat(data_path)
+    source_sha256 = file_hash(data_path)
+
+    n_rows = 0
+
+    def counted_chunks():
+        # Called once per pass of fit_chunks; the count of the last pass is kept
+        nonlocal n_rows
+        n_rows = 0
+        for chunk in momory_opt.read_csv_with_schema(data_path, chunksize=chunksize):
+            n_rows += len(chunk)
+            yield chunk
+
+    preprocessor = dataProcessing.Preprocessor().fit_chunks(counted_chunks)
+    feature_names = preprocessor.feature_names
+
+    tmp_features = os.path.join(cache_dir, FEATURES_FILE + '.tmp')
+    tmp_target = os.path.join(cache_dir, TARGET_FILE + '.tmp')
+    features = np.lib.format.open_memmap(tmp_features, mode='w+', dtype='float32', shape=(n_rows, len(feature_names)))
+    target = np.lib.format.open_memmap(tmp_target, mode='w+', dtype='float32', shape=(n_rows,))
+
+    start = 0
+    for chunk in momory_opt.read_csv_with_schema(data_path, chunksize=chunksize):
+        chunk = preprocessor.transform(chunk)
+        stop = start + len(chunk)
+        features[start:stop] = chunk[feature_names].to_numpy(dtype='float32')
+        target[start:stop] = chunk['Biopsy'].to_numpy(dtype='float32')
+        start = stop
+
+    features.flush()
+    target.flush()
+    del features, target
+
+    os.replace(tmp_features, os.path.join(cache_dir, FEATURES_FILE))
+    os.replace(tmp_target, os.path.join(cache_dir, TARGET_FILE))
+    preprocessor.save(os.path.join(cache_dir, PREPROCESSOR_FILE))
+
+    schema = {
+        'preprocessing_version': dataProcessing.PREPROCESSING_VERSION,
+        'source': os.path.abspath(data_path),
+        'source_sha256': source_sha256,
+        'source_size': stat.st_size,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'rows': n_rows,
+        'dtype': 'float32',
+        'feature_names': feature_names,
+        'target': 'Biopsy',
+    }
+    _write_schema(cache_dir, schema)
+    return schema
+
+
+def load_processed(data_path, cache_dir=None, chunksize=100000):
+    """
+    Load the processed feature matrix of a CSV, building the cache first if needed.
+
+    The arrays are memory-mapped read-only, so no CSV text is parsed once the cache exists.
+
+    Parameters:
+    data_path (str): CSV in the raw (or already processed) layout, with a 'Biopsy' column
+    cache_dir (str, optional): Cache directory, default_cache_dir(data_path) if not given
+    chunksize (int): Rows per chunk when the cache has to be (re)built
+
+    Returns:
+    tuple: (X, y, feature_names) with X a float32 (rows x features) memmap and y a float32 memmap
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir(data_path)
+
+    with instrumentation.span('load', source='processed_cache') as stage:
+        if not is_cache_valid(data_path, cache_dir):
+            build_cache(data_path, cache_dir, chunksize)
+
+        schema = _read_schema(cache_dir)
+        X = np.load(os.path.join(cache_dir, FEATURES_FILE), mmap_mode='r')
+        y = np.load(os.path.join(cache_dir, TARGET_FILE), mmap_mode='r')
+        stage.add(rows=len(y), bytes=X.nbytes + y.nbytes)
+    return X, y, schema['feature_names']
+
+
+def load_cached_preprocessor(data_path, cache_dir=None, chunksize=100000):
+    """
+    Preprocessor fitted when the cache of data_path was built (building it if needed).
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir(data_path)
+
+    if not is_cache_valid(data_path, cache_dir):
+        build_cache(data_path, cache_dir, chunksize)
+
+    return dataProcessing.Preprocessor.load(os.path.join(cache_dir, PREPROCESSOR_FILE))
@@ -1,65 +1,547 @@
+import functools
 
 import numpy as np
 import pandas as pd
 
-from math import floor
+from ProAndTrain import instrumentation
 
-import seaborn as sns
 
-import matplotlib.pyplot as plt
+# Bump when the processing rules change, so cached processed data (see dataCache) is rebuilt
+PREPROCESSING_VERSION = 3
+
+# Columns imputed with the mean of their Age group, in the order process_data fills them
+MEAN_IMPUTED_COLUMNS = ['Number of sexual partners', 'First sexual intercourse', 'Num of pregnancies', 'Hormonal Contraceptives (years)', 'IUD (years)', 'Smokes (years)', 'STDs (number)', 'Smokes (packs/year)']
+
+# Mean-imputed columns that keep the fractional part of the group mean
+UNFLOORED_COLUMNS = ['Hormonal Contraceptives (years)']
+
+# Columns imputed with the mode of their group, mapped to the column they are grouped by
+MODE_IMPUTED_COLUMNS = {
+    'Hormonal Contraceptives': 'Number of sexual partners',
+    'IUD': 'Number of sexual partners',
+    'STDs': 'Number of sexual partners',
+    'Smokes': 'Age',
+}
+
+# Value used when a group has no mode (all NaN): True, kept numeric so the column stays float
+MODE_FALLBACK = 1.0
 
 
 def fill_nan_with_group_mean(row, df_filtered, column):
+    """
+    Row-wise reference implementation of the group-mean imputation.
+
+    process_data uses compute_group_means / impute_group_means instead; this
+    is kept so the imputation benchmark can check the vectorized output against it.
+    np.floor leaves an all-NaN group as NaN where math.floor used to raise.
+    """
     if pd.isna(row[column]):
 
         mean_value = df_filtered[df_filtered['Age'] == row['Age']][column].mean()
         if column != 'Hormonal Contraceptives (years)':
-            return floor(mean_value)
+            return np.floor(mean_value)
         else:
             return mean_value
     else:
         return row[column]
-    
-def fill_with_mode(group):
+
+def first_mode(group):
     # Try to get the mode of the group
     mode_value = group.mode()
-    
-    # If there is a mode, fill with that, otherwise fill with a fallback value (e.g., the global mode or a default value)
+
+    # If there is a mode, use that, otherwise use a fallback value (e.g., the global mode or a default value)
     if not mode_value.empty:
-        return group.fillna(mode_value[0])
+        return mode_value[0]
     else:
         # Provide a fallback value in case of empty groups (can be set to True or False or the global mode)
-        return group.fillna(True)  # Example fallback value: True
+        return MODE_FALLBACK
+
+def fill_with_mode(group):
+    return group.fillna(first_mode(group))
+
+def compute_group_means(df, columns=MEAN_IMPUTED_COLUMNS, key='Age'):
+    """
+    Compute the per-Age mean of every imputed column in a single grouping pass.
+
+    Only ages occurring more than once are kept, and every column except the
+    ones in UNFLOORED_COLUMNS is floored, matching the row-wise rules.
+
+    Each group is summed with np.sum over a contiguous slice, as Series.mean does,
+    so the means are bit-identical to the ones the row-wise implementation produces
+    (groupby().mean() uses compensated summation and can differ in the last digit).
+
+    Parameters:
+    df (pd.DataFrame): Numeric frame holding `key` and `columns`
+    columns (list): Columns to average
+    key (str): Grouping column
+
+    Returns:
+    pd.DataFrame: Means indexed by the valid `key` values, one column per imputed column
+    """
+    groups = {k: idx for k, idx in df.groupby(key).indices.items() if len(idx) > 1}
+
+    # One contiguous row per column so each group slice is summed like a standalone Series
+    values = np.ascontiguousarray(df[columns].to_numpy(dtype='float64').T)
+    present = ~np.isnan(values)
+    values = np.where(present, values, 0.0)
+
+    sums = np.empty((len(groups), len(columns)))
+    counts = np.empty((len(groups), len(columns)))
+    for i, idx in enumerate(groups.values()):
+        for j in range(len(columns)):
+            sums[i, j] = values[j, idx].sum()
+            counts[i, j] = present[j, idx].sum()
+
+    return _means_frame(list(groups.keys()), sums, counts, columns)
+
+def _means_frame(keys, sums, counts, columns):
+    """
+    Turn per-group sums and non-NaN counts into the floored means table.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = pd.DataFrame(sums / counts, index=keys, columns=columns)
+
+    floored = [column for column in columns if column not in UNFLOORED_COLUMNS]
+    means[floored] = np.floor(means[floored])
+
+    return means
+
+
+# Rows np.sum adds with 8 interleaved partial sums before it splits an array in two (numpy's PW_BLOCKSIZE)
+PAIRWISE_BLOCK = 128
+
+
+@functools.lru_cache(maxsize=None)
+def _pairwise_leaves(n_rows):
+    """
+    Leaves of np.sum's pairwise summation of n_rows values, in row order.
 
-def process_data(df : pd.DataFrame):
-    df.drop('STDs: Time since last diagnosis', axis=1, inplace=True)
-    df.drop('STDs: Time since first diagnosis', axis=1, inplace=True)
+    np.sum sums up to PAIRWISE_BLOCK contiguous values directly and splits longer
+    arrays at half their length rounded down to a multiple of 8, adding the two halves'
+    sums. So the sum of n_rows values equals the sums of these leaves combined along
+    the same binary tree.
+
+    :return: Tuple of (rows, path) per leaf; path is the leaf's position in the tree as a tuple of 0 (left) / 1 (right).
+    """
+    def split(n, path):
+        if n <= PAIRWISE_BLOCK:
+            return [(n, path)]
+        half = n // 2
+        half -= half % 8
+        return split(half, path + (0,)) + split(n - half, path + (1,))
+    return tuple(split(n_rows, ()))
+
+
+class _StreamingGroupSums:
+    def __init__(self, group_rows, width):
+        """
+        Per-group column sums accumulated chunk by chunk, bit-identical to compute_group_means.
+
+        Knowing every group's final row count (a cheap first pass over the keys), the
+        rows of a group are collected leaf by leaf along the tree of _pairwise_leaves:
+        a complete leaf is summed with np.sum and pushed on the group's stack, and two
+        sibling sums are added as soon as both exist. So the sums equal np.sum over the
+        whole group for any group size, while each group holds at most one leaf of rows
+        plus one partial sum per tree level.
+
+        :param group_rows: Dict of group key -> number of rows the group will receive.
+        :param width: Number of summed columns.
+        """
+        self.width = width
+        self.group_rows = group_rows
+        self.leaf = {key: 0 for key in group_rows}
+        self.buffer = {key: [] for key in group_rows}
+        self.buffered = {key: 0 for key in group_rows}
+        self.stack = {key: [] for key in group_rows}
+        self.counts = {key: np.zeros(width) for key in group_rows}
+
+    def update(self, keys, values):
+        """
+        Add a chunk of rows, given in file order.
+
+        :param keys: 1-D array with the group of each row.
+        :param values: 2-D float array (rows x width), NaN for missing values.
+        """
+        present = ~np.isnan(values)
+        values = np.where(present, values, 0.0)
+
+        order = np.argsort(keys, kind='stable')
+        uniques, starts = np.unique(keys[order], return_index=True)
+        for key, rows in zip(uniques.tolist(), np.split(order, starts[1:])):
+            self.counts[key] += present[rows].sum(axis=0)
+            leaves = _pairwise_leaves(self.group_rows[key])
+            while len(rows):
+                leaf_rows, path = leaves[self.leaf[key]]
+                take = leaf_rows - self.buffered[key]
+                self.buffer[key].append(values[rows[:take]])
+                self.buffered[key] += len(rows[:take])
+                rows = rows[take:]
+                if self.buffered[key] == leaf_rows:
+                    self._push(key, path)
+
+    def _push(self, key, path):
+        block = np.concatenate(self.buffer[key])
+        # One contiguous array per column, summed like a standalone Series
+        total = np.array([np.ascontiguousarray(block[:, j]).sum() for j in range(self.width)])
+        self.buffer[key], self.buffered[key] = [], 0
+        self.leaf[key] += 1
+
+        stack = self.stack[key]
+        while path and path[-1] == 1 and stack and stack[-1][0] == path[:-1] + (0,):
+            total = stack.pop()[1] + total
+            path = path[:-1]
+        stack.append((path, total))
+
+    def sums(self):
+        """
+        :return: (keys, sums, counts, rows) with one entry per group, once every group has received all its rows.
+        """
+        keys = sorted(self.group_rows)
+        if any(len(self.stack[key]) != 1 or self.stack[key][0][0] != () for key in keys):
+            raise ValueError("The chunks do not hold the rows counted in the first pass.")
+        sums = np.array([self.stack[key][0][1] for key in keys]).reshape(len(keys), self.width)
+        counts = np.array([self.counts[key] for key in keys]).reshape(len(keys), self.width)
+        rows = np.array([self.group_rows[key] for key in keys])
+        return keys, sums, counts, rows
+
+def impute_group_means(df, means, key='Age'):
+    """
+    Fill NaNs in all mean-imputed columns at once from a table built by compute_group_means.
+
+    Rows whose `key` is not in the table are left untouched.
+
+    Parameters:
+    df (pd.DataFrame): Frame to impute in place
+    means (pd.DataFrame): Per-`key` means, as returned by compute_group_means
+    key (str): Grouping column
+
+    Returns:
+    pd.DataFrame: The imputed frame
+    """
+    columns = means.columns.tolist()
+    fill = means.reindex(df[key].to_numpy())
+    fill.index = df.index
+
+    df[columns] = df[columns].fillna(fill)
+
+    return df
+
+def select_model_columns(df : pd.DataFrame):
+    """
+    Drop the columns the models do not use and coerce the rest to numbers ('?' becomes NaN).
+
+    Columns that are already numeric (e.g. read with momory_opt.read_csv_with_schema)
+    keep their dtype.
+
+    Parameters:
+    df (pd.DataFrame): Raw frame in the risk_factors_cervical_cancer.csv layout
+
+    Returns:
+    pd.DataFrame: Numeric frame with the model columns and 'Biopsy'
+    """
+    df = df.drop(['STDs: Time since last diagnosis', 'STDs: Time since first diagnosis'], axis=1, errors='ignore')
 
     df = df.loc[:, ~((df.columns.str.startswith('STDs:')) & (df.columns != 'STDs: Number of diagnosis'))]
 
-    df = df.apply(pd.to_numeric, errors='coerce')
+    return _coerce_numeric(df)
+
+def _coerce_numeric(df):
+    """
+    pd.to_numeric(errors='coerce') on the non-numeric columns only.
+    """
+    text = [column for column in df.columns if not pd.api.types.is_numeric_dtype(df[column])]
+    if text:
+        df = df.copy()
+        df[text] = df[text].apply(pd.to_numeric, errors='coerce')
+    return df
+
+def _lookup(table, keys):
+    """
+    Index a dense lookup table by integer key; keys outside the table (or not integral) give NaN.
+    """
+    keys = np.asarray(keys, dtype='float64')
+    found = (keys >= 0) & (keys < len(table)) & (keys == np.floor(keys))
+
+    result = np.full((len(keys),) + table.shape[1:], np.nan)
+    result[found] = table[keys[found].astype(np.intp)]
+    return result
+
+def _dense_table(keys, values):
+    """
+    Scatter (key, value) pairs into a NaN-filled array indexed directly by the integer key.
+    """
+    keys = np.asarray(keys, dtype='float64')
+    values = np.asarray(values, dtype='float64')
+    integral = (keys >= 0) & (keys == np.floor(keys))
+    keys, values = keys[integral].astype(np.intp), values[integral]
+
+    table = np.full((keys.max() + 1 if len(keys) else 0,) + values.shape[1:], np.nan)
+    table[keys] = values
+    return table
+
+
+def _modes_from_counts(counts):
+    """
+    First mode of each group from (key, value) occurrence counts, like first_mode.
+
+    :return: (keys, modes) arrays; ties go to the smallest value, as Series.mode is sorted.
+    """
+    table = counts.rename('count').reset_index()
+    table.columns = ['key', 'value', 'count']
+    table = table.sort_values(['key', 'count', 'value'], ascending=[True, False, True]).drop_duplicates('key')
+    return table['key'].to_numpy(), table['value'].to_numpy()
+
+
+class Preprocessor:
+    def __init__(self):
+        """
+        Fit/transform version of process_data.
+
+        fit learns the per-Age means and the group modes once and stores them as dense
+        arrays indexed by the group value, so transform imputes a new batch (or a single
+        form submission) with array lookups and no groupby.
+        """
+        self.columns = None
+        self.float_columns = []
+        self.mean_table = None
+        self.mode_tables = {}
+
+    @property
+    def feature_names(self):
+        """
+        Model input columns, in training order (everything but 'Biopsy').
+        """
+        return [column for column in self.columns if column != 'Biopsy']
+
+    def fit(self, df: pd.DataFrame):
+        """
+        Learns the imputation tables from a raw frame.
+
+        :param df: Raw frame in the risk_factors_cervical_cancer.csv layout.
+        :return: The fitted preprocessor.
+        """
+        df = select_model_columns(df)
+        self.columns = df.columns.tolist()
+        self.float_columns = [column for column in self.columns if df[column].dtype.kind == 'f']
+
+        means = compute_group_means(df)
+        self.mean_table = _dense_table(means.index, means.to_numpy())
+
+        # Modes are taken after the mean imputation, as process_data groups by the imputed keys
+        df = impute_group_means(df, means)
+        self.mode_tables = {}
+        for column, key in MODE_IMPUTED_COLUMNS.items():
+            self.mode_tables[column] = _dense_table(*_modes_from_counts(df.groupby([key, column]).size()))
+
+        return self
+
+    def fit_chunks(self, chunks):
+        """
+        Learns the same tables as fit from raw chunks, holding one chunk at a time.
+
+        A first pass counts the rows of every Age group, so the second can sum each group
+        exactly as compute_group_means does (see _StreamingGroupSums). The mode counts of
+        the columns grouped by an imputed key are collected per Age for rows missing that
+        key, and moved to the imputed key once the means are known.
+
+        :param chunks: Chunk source, a callable returning a new iterable of raw frames on every call,
+            e.g. lambda: pd.read_csv(path, chunksize=...).
+        :return: The fitted preprocessor.
+        """
+        group_rows = {}
+        for chunk in chunks():
+            ages, rows = np.unique(pd.to_numeric(chunk['Age'], errors='coerce').to_numpy(dtype='float64'), return_counts=True)
+            for age, n in zip(ages.tolist(), rows.tolist()):
+                if not np.isnan(age):
+                    group_rows[age] = group_rows.get(age, 0) + n
+
+        sums = _StreamingGroupSums(group_rows, len(MEAN_IMPUTED_COLUMNS))
+        direct = {column: [] for column in MODE_IMPUTED_COLUMNS}
+        deferred = {column: [] for column in MODE_IMPUTED_COLUMNS}
+        self.columns = None
+        float_columns = set()
+
+        for chunk in chunks():
+            chunk = select_model_columns(chunk)
+            if self.columns is None:
+                self.columns = chunk.columns.tolist()
+            float_columns.update(column for column in self.columns if chunk[column].dtype.kind == 'f')
+
+            aged = chunk[chunk['Age'].notna()]
+            sums.update(aged['Age'].to_numpy(dtype='float64'), aged[MEAN_IMPUTED_COLUMNS].to_numpy(dtype='float64'))
+
+            for column, key in MODE_IMPUTED_COLUMNS.items():
+                direct[column].append(chunk.groupby([key, column]).size())
+                if key in MEAN_IMPUTED_COLUMNS:
+                    deferred[column].append(chunk[chunk[key].isna()].groupby(['Age', column]).size())
+
+            # Keep the partial counts small instead of one entry per chunk
+            for counts in (direct, deferred):
+                for column, parts in counts.items():
+                    if len(parts) > 1:
+                        counts[column] = [pd.concat(parts).groupby(level=[0, 1]).sum()]
+
+        self.float_columns = [column for column in self.columns if column in float_columns]
+
+        keys, group_sums, counts, rows = sums.sums()
+        valid = rows > 1
+        means = _means_frame([key for key, ok in zip(keys, valid) if ok], group_sums[valid], counts[valid], MEAN_IMPUTED_COLUMNS)
+        self.mean_table = _dense_table(means.index, means.to_numpy())
+
+        self.mode_tables = {}
+        for column, key in MODE_IMPUTED_COLUMNS.items():
+            counts = pd.concat(direct[column]) if direct[column] else pd.Series(dtype='int64')
+            if deferred[column]:
+                by_age = pd.concat(deferred[column])
+                imputed_key = by_age.index.get_level_values(0).map(means[key])
+                moved = pd.Series(by_age.to_numpy(), index=pd.MultiIndex.from_arrays([imputed_key, by_age.index.get_level_values(1)]))
+                counts = pd.concat([counts, moved[imputed_key.notna()]])
+
+            counts = counts.groupby(level=[0, 1]).sum()
+            self.mode_tables[column] = _dense_table(*_modes_from_counts(counts))
+
+        return self
+
+    def _mean_fill(self, ages):
+        return _lookup(self.mean_table, ages)
+
+    def _mode_fill(self, column, keys):
+        fill = _lookup(self.mode_tables[column], keys)
+        # A group never seen at fit time has no mode, like an all-NaN group in process_data
+        return np.where(np.isnan(fill), MODE_FALLBACK, fill)
+
+    def transform(self, df: pd.DataFrame):
+        """
+        Imputes a frame with the fitted tables.
+
+        :param df: Frame holding the model columns (raw or already processed); 'Biopsy' is optional.
+        :return: Imputed frame with the columns in training order.
+        """
+        df = _coerce_numeric(df[[column for column in self.columns if column in df.columns]])
+        # A batch without missing values parses as int; keep the training float columns float
+        df = df.astype({column: 'float64' for column in self.float_columns if column in df.columns and df[column].dtype.kind != 'f'})
+
+        fill = pd.DataFrame(self._mean_fill(df['Age']), index=df.index, columns=MEAN_IMPUTED_COLUMNS)
+        df[MEAN_IMPUTED_COLUMNS] = df[MEAN_IMPUTED_COLUMNS].fillna(fill)
+
+        for column, key in MODE_IMPUTED_COLUMNS.items():
+            df[column] = df[column].fillna(pd.Series(self._mode_fill(column, df[key]), index=df.index))
+
+        df.loc[df['Num of pregnancies'].isna(), 'Num of pregnancies'] = 0
+
+        return df
+
+    def transform_array(self, X):
+        """
+        Imputes a float array of model features without going through pandas.
+
+        :param X: 2-D array (or a single row) with the columns of feature_names.
+        :return: Imputed float64 array of the same shape.
+        """
+        X = np.array(X, dtype='float64', ndmin=2)
+        index = {column: i for i, column in enumerate(self.feature_names)}
+
+        age = X[:, index['Age']]
+        mean_columns = [index[column] for column in MEAN_IMPUTED_COLUMNS]
+        block = X[:, mean_columns]
+        X[:, mean_columns] = np.where(np.isnan(block), self._mean_fill(age), block)
+
+        for column, key in MODE_IMPUTED_COLUMNS.items():
+            values = X[:, index[column]]
+            X[:, index[column]] = np.where(np.isnan(values), self._mode_fill(column, X[:, index[key]]), values)
+
+        pregnancies = X[:, index['Num of pregnancies']]
+        pregnancies[np.isnan(pregnancies)] = 0
+
+        return X
+
+    def fit_transform(self, df: pd.DataFrame):
+        """
+        Fits the tables on a raw frame and imputes that same frame.
+        """
+        return self.fit(df).transform(df)
+
+    def save(self, path):
+        """
+        Saves the fitted tables as a compressed .npz archive (no pickle).
+
+        :param path: Destination file, usually next to the model pickles.
+        """
+        arrays = {'columns': np.array(self.columns), 'float_columns': np.isin(self.columns, self.float_columns), 'mean_table': self.mean_table}
+        for i, column in enumerate(MODE_IMPUTED_COLUMNS):
+            arrays[f'mode_table_{i}'] = self.mode_tables[column]
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads tables written by save.
+
+        :param path: Path to the .npz archive.
+        :return: A fitted preprocessor.
+        """
+        preprocessor = cls()
+        with np.load(path, allow_pickle=False) as arrays:
+            preprocessor.columns = arrays['columns'].tolist()
+            preprocessor.float_columns = arrays['columns'][arrays['float_columns']].tolist()
+            preprocessor.mean_table = arrays['mean_table']
+            preprocessor.mode_tables = {column: arrays[f'mode_table_{i}'] for i, column in enumerate(MODE_IMPUTED_COLUMNS)}
+        return preprocessor
+
+def iter_processed_chunks(data_path, chunksize=100000, preprocessor=None):
+    """
+    Streaming version of process_data for files larger than memory.
+
+    The preprocessor is fitted with two passes over the chunks (see Preprocessor.fit_chunks),
+    then every chunk is read again, imputed and yielded, so peak memory follows chunksize
+    and not the file size. Concatenated, the chunks equal process_data's output.
+
+    Parameters:
+    data_path (str): Raw CSV in the risk_factors_cervical_cancer.csv layout
+    chunksize (int): Rows per chunk
+    preprocessor (Preprocessor, optional): Preprocessor to fit, e.g. to save it afterwards
+
+    Returns:
+    generator: Imputed frames, one per chunk of data_path
+    """
+    if preprocessor is None:
+        preprocessor = Preprocessor()
+    preprocessor.fit_chunks(lambda: pd.read_csv(data_path, chunksize=chunksize))
 
-    age_counts = df['Age'].value_counts()
+    for chunk in pd.read_csv(data_path, chunksize=chunksize):
+        yield preprocessor.transform(chunk)
 
-    valid_ages = age_counts[age_counts > 1].index
+def process_csv_in_chunks(data_path, output_path, chunksize=100000, preprocessor=None):
+    """
+    Writes the chunks of iter_processed_chunks to a CSV, one chunk at a time.
 
-    df_filtered = df[df['Age'].isin(valid_ages)]
+    The file is byte for byte the one process_data writes.
 
-    columns = ['Number of sexual partners', 'First sexual intercourse', 'Num of pregnancies', 'Hormonal Contraceptives (years)', 'IUD (years)', 'Smokes (years)', 'STDs (number)', 'Smokes (packs/year)']
-    for column in columns:
-        df_filtered[column] = df_filtered.apply(lambda row: fill_nan_with_group_mean(row, df_filtered, column), axis=1)
+    Parameters:
+    data_path (str): Raw CSV in the risk_factors_cervical_cancer.csv layout
+    output_path (str): Where to write the processed CSV
+    chunksize (int): Rows per chunk
+    preprocessor (Preprocessor, optional): Preprocessor to fit, e.g. to save it afterwards
 
+    Returns:
+    Preprocessor: The fitted preprocessor
+    """
+    if preprocessor is None:
+        preprocessor = Preprocessor()
+    for i, chunk in enumerate(iter_processed_chunks(data_path, chunksize, preprocessor)):
+        chunk.to_csv(output_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
 
-    df.update(df_filtered)
+    return preprocessor
 
-    # Fill NaN values in 'Hormonal Contraceptives' based on 'Number of Sexual Relations'
-    df['Hormonal Contraceptives'] = df.groupby('Number of sexual partners')['Hormonal Contraceptives'].transform(fill_with_mode)
-    df['IUD'] = df.groupby('Number of sexual partners')['IUD'].transform(fill_with_mode)
-    df['STDs'] = df.groupby('Number of sexual partners')['STDs'].transform(fill_with_mode)
-    df['Smokes'] = df.groupby('Age')['Smokes'].transform(fill_with_mode)
+def process_data(df : pd.DataFrame, output_path='../data/output.csv', preprocessor=None):
+    # The imputation statistics are learnt by the preprocessor, which callers can keep and save
+    if preprocessor is None:
+        preprocessor = Preprocessor()
+    with instrumentation.span('process_data') as stage:
+        df = preprocessor.fit_transform(df)
+        stage.add(rows=len(df), bytes=instrumentation.nbytes(df))
 
-    df.loc[df['Num of pregnancies'].isna(), 'Num of pregnancies'] = 0
+    if output_path is not None:
+        df.to_csv(output_path, index=False)  # index=False to exclude the index from being saved
 
-    df.to_csv('../data/output.csv', index=False)  # index=False to exclude the index from being saved
-    
-    return df
\ No newline at end of file
+    return df
@@ -0,0 +1,319 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from ProAndTrain import dataCache, instrumentation, model, resampling
+
+
+# Metrics of binary_metrics, in report order
+METRICS = ['accuracy', 'precision', 'recall', 'f1', 'roc_auc']
+
+# Backends whose training is single-threaded whatever they are given
+SINGLE_THREADED = ['svm', 'svm_approx']
+
+# Rows gathered and scaled at a time when a fold's matrices are filled
+GATHER_ROWS = 65536
+
+
+def binary_metrics(y_true, y_pred, scores=None):
+    """
+    Accuracy, precision, recall, F1 and ROC-AUC of binary predictions in one pass over the labels
+
+    The confusion matrix comes from a single bincount; ROC-AUC is the Mann-Whitney rank
+    statistic of the scores (ties averaged), which equals sklearn's roc_auc_score.
+
+    Parameters:
+    y_true (array): True labels (0/1)
+    y_pred (array): Predicted labels (0/1)
+    scores (array, optional): Continuous scores for ROC-AUC (e.g. MLModel.decision_scores)
+
+    Returns:
+    dict: Metric name -> value (roc_auc is None without scores or with a single class)
+    """
+    from scipy.stats import rankdata
+
+    y_true = np.asarray(y_true).astype(bool)
+    y_pred = np.asarray(y_pred).astype(bool)
+    tn, fp, fn, tp = np.bincount(2 * y_true + y_pred, minlength=4)
+
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    metrics = {
+        'accuracy': (tp + tn) / len(y_true),
+        'precision': precision,
+        'recall': recall,
+        'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        'roc_auc': None,
+    }
+
+    n_pos = int(tp + fn)
+    n_neg = len(y_true) - n_pos
+    if scores is not None and n_pos and n_neg:
+        ranks = rankdata(np.asarray(scores, dtype='float64'))
+        metrics['roc_auc'] = (ranks[y_true].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+
+    return {name: None if value is None else float(value) for name, value in metrics.items()}
+
+
+def fold_indices(y, n_folds=4, seed=42):
+    """
+    Stratified k-fold (train, test) row index arrays
+
+    Parameters:
+    y (array): Target labels
+    n_folds (int): Number of folds; each test fold holds 1 / n_folds of the rows
+    seed (int): Shuffle seed
+
+    Returns:
+    list: (train, test) int32 index arrays per fold
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+    return [(train.astype('int32'), test.astype('int32')) for train, test in splitter.split(np.zeros(len(y)), y)]
+
+
+def _fit_scaler(X, rows, chunk_rows=None):
+    from sklearn.preprocessing import StandardScaler
+
+    with instrumentation.span('scale') as stage:
+        stage.add(rows=len(rows))
+        if chunk_rows is None:
+            return StandardScaler().fit(X[rows])
+        # Running mean and variance, reading chunk_rows rows at a time
+        scaler = StandardScaler()
+        for start in range(0, len(rows), chunk_rows):
+            scaler.partial_fit(X[rows[start:start + chunk_rows]])
+        return scaler
+
+
+def build_fold_cache(data_path, n_folds=4, seed=42, resampler='smote', cache_dir=None):
+    """
+    Fold indices and resampled rows of the processed data, built once and shared by every model.
+
+    Each fold<i>.npz holds the train/test row indices into the cached feature matrix,
+    the training rows kept by the resampler ('fit') and the synthetic minority rows it
+    adds to that training fold (in the fold's scaled space). The resampler only ever
+    sees the training rows of a fold. The original rows are not copied; they are read
+    through the indices. The cache is rebuilt only when the data, the preprocessing or
+    the fold settings change.
+
+    Parameters:
+    data_path (str): Path to the raw CSV data file
+    n_folds (int): Number of folds
+    seed (int): Seed of the split and of the resampler
+    resampler (str): Class-imbalance strategy, one of resampling.RESAMPLERS
+    cache_dir (str, optional): Data cache directory, dataCache.default_cache_dir(data_path) if not given
+
+    Returns:
+    str: Fold cache directory
+    """
+    if cache_dir is None:
+        cache_dir = dataCache.default_cache_dir(data_path)
+    X, y, feature_names = dataCache.load_processed(data_path, cache_dir)
+    schema = dataCache._read_schema(cache_dir)
+
+    fold_dir = os.path.join(cache_dir, f'kfold-{n_folds}-seed{seed}-{resampler}')
+    settings = {'source_sha256': schema['source_sha256'], 'preprocessing_version': schema['preprocessing_version'],
+                'n_folds': n_folds, 'seed': seed, 'resampler': resampler}
+    try:
+        with open(os.path.join(fold_dir, 'folds.json')) as f:
+            if {key: value for key, value in json.load(f).items() if key in settings} == settings:
+                return fold_dir
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(fold_dir, exist_ok=True)
+    for i, (train, test) in enumerate(fold_indices(y, n_folds, seed)):
+        X_train = _fit_scaler(X, train).transform(X[train])
+        rows, X_synthetic, y_synthetic = resampling.resample(resampler, X_train, y[train], seed)
+        np.savez(os.path.join(fold_dir, f'fold{i}.npz'), train=train, test=test, fit=train[rows],
+                 X_synthetic=X_synthetic, y_synthetic=y_synthetic.astype('float32'))
+
+    # Written last, so an interrupted build is never mistaken for a complete one
+    with open(os.path.join(fold_dir, 'folds.json'), 'w') as f:
+        json.dump({**settings, 'feature_names': feature_names}, f, indent=2)
+    return fold_dir
+
+
+def load_fold(fold_dir, i):
+    """
+    Index arrays and synthetic rows of fold i of a build_fold_cache directory.
+
+    Returns:
+    dict: 'train', 'test', 'fit', 'X_synthetic', 'y_synthetic' arrays
+    """
+    with np.load(os.path.join(fold_dir, f'fold{i}.npz'), allow_pickle=False) as fold:
+        return {name: fold[name] for name in fold.files}
+
+
+def fold_data(X, y, fold):
+    """
+    Scaled training (the resampler's rows, with its synthetic rows appended) and test matrices of one fold.
+
+    The in-memory backends need the fold as one matrix, so it is built once: its rows are
+    gathered through the fold's indices and scaled GATHER_ROWS at a time straight into the
+    preallocated float32 result, with no full-size intermediate copies. X and y can be the
+    read-only memmaps of the data cache; fold_chunks avoids even this copy.
+
+    Returns:
+    tuple: (X_fit, y_fit, X_test, y_test, scaler)
+    """
+    scaler = _fit_scaler(X, fold['train'])
+    n_fit = len(fold['fit'])
+    X_fit = np.empty((n_fit + len(fold['y_synthetic']), X.shape[1]), dtype='float32')
+    _gather_scaled(X, fold['fit'], scaler, X_fit[:n_fit])
+    X_fit[n_fit:] = fold['X_synthetic']
+    y_fit = np.concatenate([y[fold['fit']], fold['y_synthetic']])
+
+    X_test = np.empty((len(fold['test']), X.shape[1]), dtype='float32')
+    _gather_scaled(X, fold['test'], scaler, X_test)
+    return X_fit, y_fit, X_test, y[fold['test']], scaler
+
+
+def _gather_scaled(X, rows, scaler, out):
+    # Row-wise scaling, so filling out chunk by chunk gives the same values as one transform
+    for start in range(0, len(rows), GATHER_ROWS):
+        out[start:start + GATHER_ROWS] = scaler.transform(X[rows[start:start + GATHER_ROWS]])
+
+
+def fold_chunks(X, y, fold, chunk_rows):
+    """
+    Like fold_data, but the training rows are a chunk source (see outOfCore) read chunk_rows rows at a time.
+
+    The scaler is fitted in chunks too; only the test matrix is materialized.
+
+    Returns:
+    tuple: (chunks, X_test, y_test, scaler)
+    """
+    from ProAndTrain import outOfCore
+
+    scaler = _fit_scaler(X, fold['train'], chunk_rows)
+    chunks = outOfCore.chain_chunks(outOfCore.array_chunks(X, y, fold['fit'], chunk_rows, scaler.transform),
+                                    outOfCore.array_chunks(fold['X_synthetic'], fold['y_synthetic'], chunk_rows=chunk_rows))
+    return chunks, scaler.transform(X[fold['test']]).astype('float32'), y[fold['test']], scaler
+
+
+def thread_budget(model_names, workers, cores=None):
+    """
+    Threads per backend so that the tasks running at the same time share the cores.
+
+    Parameters:
+    model_names (list): Backends
+    workers (int): Number of tasks running at the same time
+    cores (int): Available cores (default: os.cpu_count())
+
+    Returns:
+    dict: Backend name -> number of threads (1 for single-threaded backends)
+    """
+    cores = cores or os.cpu_count() or 1
+    per_task = max(1, cores // workers)
+    return {name: 1 if name in SINGLE_THREADED else per_task for name in model_names}
+
+
+_worker_data = None
+
+
+def _init_worker(data_path, fold_dir):
+    global _worker_data
+    # Read-only memmaps of the cached data, opened once per worker
+    X, y, _ = dataCache.load_processed(data_path)
+    with open(os.path.join(fold_dir, 'folds.json')) as f:
+        resampler = json.load(f)['resampler']
+    _worker_data = (X, y, fold_dir, resampler)
+
+
+def evaluate_fold(model_name, i, params=None, n_threads=None, keep_model=False, out_of_core=None):
+    """
+    Trains one backend on a training fold and scores it on the test fold (runs in a worker).
+
+    out_of_core (for 'xgboost' only): {'chunk_rows': ..., 'external_memory': ...} trains from chunks, see MLModel.train_chunks.
+
+    Returns:
+    dict: Metrics, fold number, train seconds and parameters; with keep_model, also the trained 'model' and its 'scaler'
+    """
+    X, y, fold_dir, resampler = _worker_data
+    fold = load_fold(fold_dir, i)
+    if out_of_core:
+        chunks, X_test, y_test, scaler = fold_chunks(X, y, fold, out_of_core['chunk_rows'])
+        y_fit = np.concatenate([y[fold['fit']], fold['y_synthetic']])
+    else:
+        X_fit, y_fit, X_test, y_test, scaler = fold_data(X, y, fold)
+    if resampler == 'class_weight':
+        params = {**resampling.class_weight_params(model_name, y_fit), **(params or {})}
+
+    Model = model.MLModel(model_name, n_threads=n_threads, params=params)
+    start = time.perf_counter()
+    if out_of_core:
+        Model.train_chunks(chunks, external_memory=out_of_core.get('external_memory', False))
+    else:
+        Model.train(X_fit, y_fit)
+    train_seconds = time.perf_counter() - start
+
+    result = {'fold': i, 'train_seconds': train_seconds, 'params': Model.params, **Model.evaluate(X_test, y_test)}
+    if keep_model:
+        result['model'] = Model.get_model()
+        result['scaler'] = scaler
+    return result
+
+
+def summarize_folds(folds):
+    """
+    Mean and standard deviation of each metric over the folds.
+    """
+    summary = {}
+    for name in METRICS:
+        values = [fold[name] for fold in folds if fold[name] is not None]
+        summary[name] = {'mean': float(np.mean(values)), 'std': float(np.std(values))} if values else None
+    return summary
+
+
+def evaluate_models(data_path, model_names, n_folds=4, seed=42, jobs=None, params=None, keep_fold=None, resampler='smote',
+                    out_of_core=None):
+    """
+    Stratified k-fold evaluation of several backends, every (model, fold) pair in parallel.
+
+    The fold cache (with the resampled rows) is built once; the workers memory-map the processed data and
+    materialize only the rows of the fold they train on.
+
+    Parameters:
+    data_path (str): Path to the raw CSV data file
+    model_names (list): Backends to evaluate
+    n_folds (int): Number of folds
+    seed (int): Seed of the folds and the resampler
+    jobs (int): Number of worker processes (default: os.cpu_count())
+    params (dict, optional): Backend name -> hyperparameters
+    keep_fold (int, optional): Fold whose trained models (and scalers) are returned
+    resampler (str): Class-imbalance strategy of the training folds, one of resampling.RESAMPLERS
+    out_of_core (dict, optional): {'chunk_rows': ..., 'external_memory': ...} to train XGBoost from chunks (see evaluate_fold)
+
+    Returns:
+    dict: Backend name -> {'folds': per-fold metrics, 'cv': summarize_folds, and 'model'/'scaler' of keep_fold}
+    """
+    fold_dir = build_fold_cache(data_path, n_folds, seed, resampler)
+    tasks = [(name, i) for name in model_names for i in range(n_folds)]
+    workers = min(jobs or os.cpu_count() or 1, len(tasks))
+    threads = thread_budget(model_names, workers)
+    params = params or {}
+
+    results = {name: {'folds': []} for name in model_names}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data_path, fold_dir)) as pool:
+        futures = {pool.submit(evaluate_fold, name, i, params.get(name), threads[name], i == keep_fold,
+                               out_of_core if name == 'xgboost' else None): name
+                   for name, i in tasks}
+        for future in as_completed(futures):
+            name = futures[future]
+            fold = future.result()
+            if 'model' in fold:
+                results[name]['model'] = fold.pop('model')
+                results[name]['scaler'] = fold.pop('scaler')
+            results[name]['folds'].append(fold)
+
+    for name in model_names:
+        results[name]['folds'].sort(key=lambda fold: fold['fold'])
+        results[name]['cv'] = summarize_folds(results[name]['folds'])
+        results[name]['threads'] = threads[name]
+    return results
@@ -0,0 +1,134 @@
+import os
+import threading
+
+import numpy as np
+
+from ProAndTrain import dataCache
+
+
+# Registry names of the models explained with shap.TreeExplainer; the others use KernelExplainer
+TREE_MODELS = ['random_forest', 'xgboost', 'catboost']
+
+
+def summarize_background(X, size=50, method='kmeans', seed=42):
+    """
+    Reduce a background dataset to `size` rows for KernelExplainer
+
+    Parameters:
+    X (array): Background rows, in the model's input space
+    size (int): Number of rows to keep
+    method (str): 'kmeans' (shap.kmeans centers weighted by cluster size) or 'sample' (uniform random rows)
+    seed (int): Seed for 'sample'
+
+    Returns:
+    The summary as KernelExplainer takes it: the object shap.kmeans returns, or an array of rows
+    """
+    X = np.asarray(X, dtype='float64')
+    if method not in ('kmeans', 'sample'):
+        raise ValueError(f"Background method '{method}' is not recognized. Available options: 'kmeans', 'sample'.")
+    if len(X) <= size:
+        return X
+
+    if method == 'kmeans':
+        import shap
+        return shap.kmeans(X, size)
+    else:
+        rows = np.random.default_rng(seed).choice(len(X), size=size, replace=False)
+        return X[rows]
+
+        raise ValueError(f"Background method '{method}' is not recognized. Available options: 'kmeans', 'sample'.")
+
+
+class ExplainerCache:
+    def __init__(self, registry, background_size=50, method='kmeans'):
+        """
+        SHAP explainers of the models of a ModelRegistry, built once per model artifact.
+
+        The KernelExplainer background summary is stored next to the artifact as
+        <name>.background.pkl and reused by later sessions as long as the artifact
+        (compared by hash), the summary settings and the shap version are unchanged.
+        The explainers themselves are cheap to build from it and are kept in memory
+        per process.
+
+        :param registry: ModelRegistry the models are loaded from.
+        :param background_size: Number of background rows kept for KernelExplainer.
+        :param method: 'kmeans' or 'sample', see summarize_background.
+        """
+        self.registry = registry
+        self.background_size = background_size
+        self.method = method
+        self._explainers = {}
+        self._lock = threading.Lock()
+
+    def _background_path(self, name):
+        return os.path.join(self.registry.directory, name + '.background.pkl')
+
+    def background(self, name, X):
+        """
+        Background summary of a model, loaded from disk or computed from X and saved.
+
+        :param name: Model name in the registry.
+        :param X: Unscaled training rows (scaled here like the model's inputs) used when no valid summary is stored.
+        :return: The summary, see summarize_background.
+        """
+        import joblib
+        import shap
+
+        path = self._background_path(name)
+        settings = {'artifact_sha256': dataCache.file_hash(os.path.join(self.registry.directory, name + '.pkl')),
+                    'method': self.method, 'size': self.background_size, 'shap_version': shap.__version__}
+
+        try:
+            stored = joblib.load(path)
+            if stored['settings'] == settings:
+                return stored['background']
+        except FileNotFoundError:
+            pass
+        except (AttributeError, ImportError, KeyError, TypeError, EOFError):
+            # The summary is a shap object; one pickled by a shap version that laid it out differently is rebuilt
+            pass
+
+        background = summarize_background(self.registry.scale(name, X), self.background_size, self.method)
+        tmp_path = path + '.tmp'
+        joblib.dump({'settings': settings, 'background': background}, tmp_path)
+        os.replace(tmp_path, path)
+        return background
+
+    def get(self, name, X):
+        """
+        Returns the explainer of a model, building it only once per artifact version.
+
+        :param name: Model name in the registry.
+        :param X: Unscaled training rows, used for the KernelExplainer background if none is stored yet.
+        :return: A shap explainer.
+        """
+        model = self.registry.load(name)
+        with self._lock:
+            cached = self._explainers.get(name)
+            if cached is not None and cached[0] is model:
+                return cached[1]
+
+        from ProAndTrain import SHAPexpls
+        if name in TREE_MODELS:
+            explainer = SHAPexpls.create_shap_explainer(model, None, model_type='tree')
+        else:
+            explainer = SHAPexpls.create_shap_explainer(model, self.background(name, X), model_type='kernel')
+
+        with self._lock:
+            self._explainers[name] = (model, explainer)
+        return explainer
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_explainer_cache(registry, background_size=50, method='kmeans'):
+    """
+    Process-wide explainer cache of a registry, shared by every Streamlit rerun.
+    """
+    key = (id(registry), background_size, method)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = ExplainerCache(registry, background_size, method)
+        return _caches[key]
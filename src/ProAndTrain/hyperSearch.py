@@ -0,0 +1,307 @@
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from ProAndTrain import dataCache, evaluation, model, resampling
+
+
+def search_key(*parts):
+    """
+    Short stable hash of JSON-serializable parts, used to tag trial logs.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def tuning_folds(X, y, fold_dir, stop_size=0.15, seed=42):
+    """
+    Training, early-stopping and validation matrices of every fold of a build_fold_cache directory.
+
+    The folds are the ones evaluation.evaluate_models scores (same split, scaler and resampled
+    rows, built by evaluation.fold_data); the early-stopping rows are a stratified stop_size
+    part of each fold's original training rows ('fit'), held out of X_fit. The resampler's
+    synthetic rows stay in X_fit, and the validation fold is untouched.
+
+    Parameters:
+    X (array): Processed features (e.g. the memmap of dataCache.load_processed)
+    y (array): Target labels
+    fold_dir (str): Directory returned by evaluation.build_fold_cache
+    stop_size (float): Fraction of each fold's training rows held out for early stopping
+    seed (int): Seed of the early-stopping split
+
+    Returns:
+    list: Per fold, a dict of 'X_fit', 'y_fit', 'X_stop', 'y_stop', 'X_eval', 'y_eval' arrays
+    """
+    from sklearn.model_selection import train_test_split
+
+    with open(os.path.join(fold_dir, 'folds.json')) as f:
+        n_folds = json.load(f)['n_folds']
+    folds = []
+    for i in range(n_folds):
+        fold = evaluation.load_fold(fold_dir, i)
+        fit_rows, stop_rows = train_test_split(fold['fit'], test_size=stop_size, stratify=y[fold['fit']], random_state=seed)
+        X_fit, y_fit, X_eval, y_eval, scaler = evaluation.fold_data(X, y, {**fold, 'fit': np.sort(fit_rows)})
+        stop_rows = np.sort(stop_rows)
+        folds.append({'X_fit': X_fit, 'y_fit': y_fit, 'X_stop': scaler.transform(X[stop_rows]).astype('float32'),
+                      'y_stop': y[stop_rows], 'X_eval': X_eval, 'y_eval': y_eval})
+    return folds
+
+
+def sample_params(space, rng):
+    """
+    Draws one configuration from a search space (see MLModel.SEARCH_SPACES)
+
+    Parameters:
+    space (dict): Parameter -> ('int', low, high), ('float', low, high), ('log', low, high) or ('choice', options)
+    rng (numpy.random.Generator): Random generator
+
+    Returns:
+    dict: Parameter values, as plain Python types
+    """
+    params = {}
+    for name, (kind, *spec) in space.items():
+        if kind == 'int':
+            params[name] = int(rng.integers(spec[0], spec[1] + 1))
+        elif kind == 'float':
+            params[name] = float(rng.uniform(spec[0], spec[1]))
+        elif kind == 'log':
+            params[name] = float(math.exp(rng.uniform(math.log(spec[0]), math.log(spec[1]))))
+        elif kind == 'choice':
+            params[name] = spec[0][int(rng.integers(len(spec[0])))]
+        else:
+            raise ValueError(f"Search space kind '{kind}' is not recognized. Available options: 'int', 'float', 'log', 'choice'.")
+    return params
+
+
+def hyperband_brackets(eta=3, rungs=4, method='hyperband'):
+    """
+    Successive-halving schedules: one per Hyperband bracket, or only the most aggressive one.
+
+    Parameters:
+    eta (int): Fraction of configurations (1 / eta) promoted to the next rung
+    rungs (int): Rungs of the most aggressive bracket; its smallest budget is eta ** -(rungs - 1)
+    method (str): 'hyperband' (all brackets) or 'halving' (successive halving only)
+
+    Returns:
+    list: Per bracket, a list of (number of configurations, budget fraction) rungs
+    """
+    if method not in ('hyperband', 'halving'):
+        raise ValueError(f"Search method '{method}' is not recognized. Available options: 'hyperband', 'halving'.")
+
+    s_max = rungs - 1
+    brackets = []
+    for s in range(s_max, -1 if method == 'hyperband' else s_max - 1, -1):
+        n = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+        brackets.append([(max(1, int(n * eta ** -i)), float(eta ** (i - s))) for i in range(s + 1)])
+    return brackets
+
+
+_worker_folds = None
+_worker_resampler = None
+
+
+def _init_worker(data_path, fold_dir, stop_size, seed):
+    global _worker_folds, _worker_resampler
+    # The fold matrices are gathered once per worker and shared by all its trials
+    X, y, _ = dataCache.load_processed(data_path)
+    _worker_folds = tuning_folds(X, y, fold_dir, stop_size, seed)
+    with open(os.path.join(fold_dir, 'folds.json')) as f:
+        _worker_resampler = json.load(f)['resampler']
+
+
+def _budgeted(model_name, params, budget, n_rows):
+    """
+    Applies a budget fraction to a configuration: scales the backend's resource parameter,
+    or returns the number of training rows for 'n_samples' backends.
+    """
+    resource, full = model.MLModel.SEARCH_RESOURCES[model_name]
+    if resource == 'n_samples':
+        return dict(params), max(2, int(round(budget * n_rows)))
+    return {**params, resource: max(1, int(round(budget * full)))}, n_rows
+
+
+def run_trial(model_name, params, budget, n_threads=1, early_stopping_rounds=20, seed=42):
+    """
+    Cross-validated ROC-AUC of one configuration at one budget, on the worker's cached folds.
+
+    Returns:
+    dict: Mean score, per-fold scores, early-stopped iterations and seconds
+    """
+    from sklearn.metrics import roc_auc_score
+
+    start = time.perf_counter()
+    fold_scores, iterations = [], []
+    for fold in _worker_folds:
+        X_fit, y_fit = fold['X_fit'], fold['y_fit']
+        trial_params, n_rows = _budgeted(model_name, params, budget, len(X_fit))
+        if n_rows < len(X_fit):
+            rows = np.random.default_rng(seed).permutation(len(X_fit))[:n_rows]
+            X_fit, y_fit = X_fit[rows], y_fit[rows]
+
+        if _worker_resampler == 'class_weight':
+            trial_params = {**resampling.class_weight_params(model_name, y_fit), **trial_params}
+
+        Model = model.MLModel(model_name, n_threads=n_threads, params=trial_params)
+        Model.train(X_fit, y_fit, eval_set=(fold['X_stop'], fold['y_stop']), early_stopping_rounds=early_stopping_rounds)
+        fold_scores.append(float(roc_auc_score(fold['y_eval'], Model.decision_scores(fold['X_eval']))))
+        iterations.append(Model.best_iteration())
+
+    return {'score': float(np.mean(fold_scores)), 'fold_scores': fold_scores,
+            'best_iterations': iterations, 'seconds': time.perf_counter() - start}
+
+
+def _safe_trial(*args):
+    # A configuration the backend rejects scores as failed instead of ending the search
+    try:
+        return run_trial(*args)
+    except Exception as e:
+        return {'score': None, 'error': f'{type(e).__name__}: {e}', 'seconds': 0.0}
+
+
+def read_trial_log(path, key):
+    """
+    Completed trials of a search, keyed by (bracket, trial, rung); records of other searches are skipped.
+    """
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by an interrupted write
+                continue
+            if record.get('search') == key:
+                records[(record['bracket'], record['trial'], record['rung'])] = record
+    return records
+
+
+class HyperSearch:
+    def __init__(self, model_name, data_path, fold_dir, log_dir, eta=3, rungs=4, method='hyperband',
+                 jobs=1, early_stopping_rounds=20, stop_size=0.15, seed=42):
+        """
+        Hyperband / successive-halving search over MLModel.SEARCH_SPACES[model_name].
+
+        Every trial is scored by cross-validated ROC-AUC on the folds of evaluation.build_fold_cache
+        (see tuning_folds); XGBoost and CatBoost stop early on each fold's held-out split. Trials of a rung run
+        in a process pool and are appended to <log_dir>/<model_name>.trials.jsonl as they
+        finish, so an interrupted search picks up where it stopped.
+
+        :param model_name: Backend to tune, one of MLModel.AVAILABLE_MODELS.
+        :param data_path: Path to the raw CSV data file of the folds.
+        :param fold_dir: Fold directory returned by evaluation.build_fold_cache; its resampler is used for every trial.
+        :param log_dir: Directory of the trial log and the best-configuration file.
+        :param eta: Fraction (1 / eta) of configurations promoted at each rung.
+        :param rungs: Rungs of the most aggressive bracket.
+        :param method: 'hyperband' or 'halving'.
+        :param jobs: Number of worker processes.
+        :param early_stopping_rounds: Early stopping patience of the boosting backends.
+        :param stop_size: Fraction of each fold's training rows held out for early stopping.
+        :param seed: Seed of the configuration sampling and of the early-stopping split.
+        """
+        if model_name not in model.MLModel.SEARCH_SPACES:
+            raise ValueError(f"Model '{model_name}' is not recognized. Available options: {', '.join(model.MLModel.SEARCH_SPACES)}.")
+        self.model_name = model_name
+        self.data_path = data_path
+        self.fold_dir = fold_dir
+        self.log_dir = log_dir
+        self.brackets = hyperband_brackets(eta, rungs, method)
+        self.jobs = jobs
+        self.early_stopping_rounds = early_stopping_rounds
+        self.stop_size = stop_size
+        self.seed = seed
+
+        with open(os.path.join(fold_dir, 'folds.json')) as f:
+            folds = json.load(f)
+        self.key = search_key(model_name, model.MLModel.SEARCH_SPACES[model_name], model.MLModel.SEARCH_RESOURCES[model_name],
+                              self.brackets, early_stopping_rounds, stop_size, seed, folds)
+        self.log_path = os.path.join(log_dir, model_name + '.trials.jsonl')
+        self.best_path = os.path.join(log_dir, model_name + '.best.json')
+
+    def _configs(self, bracket, n):
+        # Seeded per (bracket, trial), so a resumed search draws the same configurations
+        space = model.MLModel.SEARCH_SPACES[self.model_name]
+        return {trial: sample_params(space, np.random.default_rng([self.seed, bracket, trial])) for trial in range(n)}
+
+    def run(self):
+        """
+        Runs (or resumes) the search and writes the best configuration.
+
+        :return: Dict with the best 'params', its 'score' and the number of trials run now and read from the log.
+        """
+        os.makedirs(self.log_dir, exist_ok=True)
+        done = read_trial_log(self.log_path, self.key)
+        resumed = len(done)
+        n_threads = max(1, (os.cpu_count() or 1) // self.jobs)
+
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker,
+                                 initargs=(self.data_path, self.fold_dir, self.stop_size, self.seed)) as pool, \
+                open(self.log_path, 'a') as log:
+            for bracket, schedule in enumerate(self.brackets):
+                configs = self._configs(bracket, schedule[0][0])
+                for rung, (n, budget) in enumerate(schedule):
+                    pending = {pool.submit(_safe_trial, self.model_name, configs[trial], budget, n_threads,
+                                           self.early_stopping_rounds, self.seed): trial
+                               for trial in configs if (bracket, trial, rung) not in done}
+                    for future in as_completed(pending):
+                        trial = pending[future]
+                        record = {'search': self.key, 'bracket': bracket, 'trial': trial, 'rung': rung,
+                                  'budget': budget, 'params': configs[trial], **future.result()}
+                        log.write(json.dumps(record) + '\n')
+                        log.flush()
+                        done[(bracket, trial, rung)] = record
+
+                    if rung + 1 < len(schedule):
+                        ranked = sorted(configs, key=lambda trial: _rank(done[(bracket, trial, rung)]), reverse=True)
+                        configs = {trial: configs[trial] for trial in ranked[:schedule[rung + 1][0]]}
+
+        best = self.best(done)
+        best['trials_run'] = len(done) - resumed
+        best['trials_resumed'] = resumed
+        return best
+
+    def best(self, done):
+        """
+        Best full-budget configuration of the completed trials, written to <model_name>.best.json.
+
+        If no trial scored at the full budget (e.g. every one failed there), the best trial at
+        the highest budget that has a score is taken instead. For early-stopped backends the
+        resource parameter is set to the mean number of rounds kept at the full budget.
+        """
+        scored = [record for record in done.values() if record['score'] is not None]
+        if not scored:
+            raise ValueError(f"No trial of '{self.model_name}' has a score; see the errors in {self.log_path}.")
+        budget = max(record['budget'] for record in scored)
+        record = max((record for record in scored if record['budget'] == budget), key=_rank)
+
+        params = dict(record['params'])
+        resource, full_value = model.MLModel.SEARCH_RESOURCES[self.model_name]
+        iterations = [iteration for iteration in record.get('best_iterations') or [] if iteration is not None]
+        if resource != 'n_samples':
+            params[resource] = int(round(np.mean(iterations))) if iterations and budget == 1.0 else full_value
+
+        best = {'model_name': self.model_name, 'params': params, 'score': record['score'], 'budget': budget,
+                'fold_scores': record['fold_scores'], 'search': self.key}
+        with open(self.best_path, 'w') as f:
+            json.dump(best, f, indent=2)
+        return best
+
+
+def _rank(record):
+    return -math.inf if record['score'] is None else record['score']
+
+
+def load_best_params(log_dir, model_name):
+    """
+    Tuned hyperparameters of a backend from <log_dir>/<model_name>.best.json, or None if it was not tuned.
+    """
+    path = os.path.join(log_dir, model_name + '.best.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)['params']
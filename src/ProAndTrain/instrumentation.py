@@ -0,0 +1,294 @@
+"""
+Stage timers, counters and opt-in profiling for the training, scoring and SHAP pipelines.
+
+    with instrumentation.span('train', model='xgboost') as stage:
+        ...
+        stage.add(rows=len(X), bytes=X.nbytes)
+
+While instrumentation is disabled (the default) span() returns a shared no-op object, so
+an instrumented call costs one function call and a global lookup. enable() turns it on:
+
+- an output ending in .prom gets Prometheus text-format totals per stage (calls, seconds
+  and counters), rewritten by flush() and at exit;
+- any other output gets one JSON line per finished span (stage, parent stage, labels,
+  counters, seconds, pid).
+
+Worker processes append JSON lines either way: enable() exports its settings in
+PROANDTRAIN_* environment variables, which spawned workers pick up on import (forked
+workers inherit them directly). In .prom mode they write to <output>.spans, which the
+process that called enable() adds to its totals on every flush(), so spans of workers
+that exit without running atexit (as forked pool workers do) are counted too.
+
+Stages listed in profile are also run under cProfile, one .prof file per span, for
+`python -m pstats` or snakeviz.
+"""
+
+import atexit
+import cProfile
+import itertools
+import json
+import os
+import threading
+import time
+
+
+ENV_OUTPUT = 'PROANDTRAIN_METRICS'
+ENV_PROFILE = 'PROANDTRAIN_PROFILE'
+ENV_PROFILE_DIR = 'PROANDTRAIN_PROFILE_DIR'
+
+# Suffix of the JSON-lines file worker processes write to in .prom mode
+WORKER_SPANS_SUFFIX = '.spans'
+
+# Stages the pipelines report; span() accepts any name, these are the ones --profile offers
+STAGES = ['load', 'process_data', 'scale', 'resample', 'train', 'predict', 'shap', 'plot', 'save']
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add(self, **counters):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+_state = None
+_local = threading.local()
+
+
+class _State:
+    def __init__(self, output, profile, profile_dir, owner=True):
+        self.output = output
+        self.prometheus = output.endswith('.prom')
+        # Only the process that called enable() keeps the Prometheus totals and writes the .prom file
+        self.owner_pid = os.getpid() if owner else None
+        self.worker_spans = output + WORKER_SPANS_SUFFIX
+        self.worker_offset = 0
+        self.profile = set(profile or ())
+        self.profile_dir = profile_dir
+        self.lock = threading.Lock()
+        self.file = None
+        self.totals = {}
+        self.sequence = itertools.count()
+
+
+class Span:
+    __slots__ = ('stage', 'labels', 'counters', 'parent', 'start', 'profiler')
+
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+        self.counters = {}
+        self.parent = None
+        self.profiler = None
+
+    def add(self, **counters):
+        """
+        Adds to the span's counters (e.g. rows=..., bytes=...); None values are ignored.
+        """
+        for name, value in counters.items():
+            if value is not None:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1].stage if stack else None
+        stack.append(self)
+
+        state = _state
+        # One cProfile profiler can be active at a time, so nested profiled stages are left to the outer one
+        if state is not None and self.stage in state.profile and not getattr(_local, 'profiling', False):
+            _local.profiling = True
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        state = _state
+        if self.profiler is not None:
+            self.profiler.disable()
+            _local.profiling = False
+            if state is not None:
+                os.makedirs(state.profile_dir, exist_ok=True)
+                self.profiler.dump_stats(os.path.join(state.profile_dir, f"{self.stage}-{os.getpid()}-{next(state.sequence)}.prof"))
+        _local.stack.pop()
+        if state is not None:
+            _record(state, self, seconds, exc_type is not None)
+        return False
+
+
+def _add_totals(state, stage, labels, seconds, failed, counters):
+    key = (stage, tuple(sorted(labels.items())))
+    totals = state.totals.setdefault(key, {'calls': 0, 'seconds': 0.0, 'errors': 0})
+    totals['calls'] += 1
+    totals['seconds'] += seconds
+    totals['errors'] += failed
+    for name, value in counters.items():
+        totals[name] = totals.get(name, 0) + value
+
+
+def _record(state, span, seconds, failed):
+    with state.lock:
+        if state.prometheus and state.owner_pid == os.getpid():
+            _add_totals(state, span.stage, span.labels, seconds, failed, span.counters)
+            return
+
+        event = {'ts': time.time(), 'pid': os.getpid(), 'stage': span.stage, 'parent': span.parent,
+                 'seconds': seconds, 'labels': span.labels, 'counters': span.counters, 'error': failed}
+        if state.file is None:
+            path = state.worker_spans if state.prometheus else state.output
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            state.file = open(path, 'a')
+        # One write per line, flushed at once, so lines of concurrent processes do not interleave
+        state.file.write(json.dumps(event, default=float) + '\n')
+        state.file.flush()
+
+
+def span(stage, **labels):
+    """
+    Times a pipeline stage (a context manager); a no-op while instrumentation is disabled.
+
+    Parameters:
+    stage (str): Stage name, e.g. one of STAGES
+    labels: Constant attributes of the span, e.g. model='xgboost'
+
+    Returns:
+    Span: Context manager whose add(**counters) records rows, bytes, ...
+    """
+    if _state is None:
+        return _NULL_SPAN
+    return Span(stage, labels)
+
+
+def nbytes(data):
+    """
+    Size in bytes of an array or DataFrame, for the bytes counter (None for other inputs)
+    """
+    if hasattr(data, 'memory_usage'):
+        return int(data.memory_usage(index=False).sum())
+    return getattr(data, 'nbytes', None)
+
+
+def enabled():
+    return _state is not None
+
+
+def enable(output, profile=None, profile_dir='profiles'):
+    """
+    Turns instrumentation on for this process and the worker processes it starts.
+
+    Parameters:
+    output (str): JSON-lines file to append spans to, or a .prom file for Prometheus totals
+    profile (list, optional): Stages to run under cProfile ('all' for every stage)
+    profile_dir (str): Directory of the .prof files
+
+    Returns:
+    None
+    """
+    global _state
+    disable()
+    profile = list(profile or [])
+    if 'all' in profile:
+        profile = STAGES
+    _state = _State(os.path.abspath(output), profile, os.path.abspath(profile_dir))
+    if _state.prometheus and os.path.exists(_state.worker_spans):
+        # Spans of an earlier run's workers are not part of this run's totals
+        os.remove(_state.worker_spans)
+    os.environ[ENV_OUTPUT] = _state.output
+    os.environ[ENV_PROFILE] = ','.join(profile)
+    os.environ[ENV_PROFILE_DIR] = _state.profile_dir
+
+
+def _collect_worker_spans(state):
+    """
+    Adds the spans worker processes appended to <output>.spans since the last call to the totals.
+    """
+    try:
+        with open(state.worker_spans) as f:
+            f.seek(state.worker_offset)
+            data = f.read()
+    except FileNotFoundError:
+        return
+    # A line still being written by a worker is read on the next flush
+    complete = data[:data.rfind('\n') + 1]
+    state.worker_offset += len(complete)
+    for line in complete.splitlines():
+        event = json.loads(line)
+        _add_totals(state, event['stage'], event['labels'], event['seconds'], event['error'], event['counters'])
+
+
+def flush():
+    """
+    Writes the Prometheus totals, including the spans of worker processes (JSON lines are written as spans finish)
+    """
+    state = _state
+    if state is None or not state.prometheus or state.owner_pid != os.getpid():
+        return
+    lines = []
+    with state.lock:
+        _collect_worker_spans(state)
+        counters = sorted({name for totals in state.totals.values() for name in totals})
+        for name in counters:
+            metric = f"proandtrain_stage_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (stage, labels), totals in sorted(state.totals.items()):
+                if name in totals:
+                    label_text = ','.join(f'{key}="{value}"' for key, value in (('stage', stage),) + labels)
+                    lines.append(f"{metric}{{{label_text}}} {totals[name]}")
+    os.makedirs(os.path.dirname(state.output) or '.', exist_ok=True)
+    tmp_path = state.output + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    # Replaced in one step, so a scraper never reads a half-written file
+    os.replace(tmp_path, state.output)
+
+
+def disable():
+    """
+    Flushes and turns instrumentation off
+    """
+    global _state
+    if _state is None:
+        return
+    flush()
+    if _state.file is not None:
+        _state.file.close()
+    _state = None
+    for name in (ENV_OUTPUT, ENV_PROFILE, ENV_PROFILE_DIR):
+        os.environ.pop(name, None)
+
+
+def add_arguments(parser):
+    """
+    Adds the --metrics, --profile and --profile-dir options of the command line scripts
+    """
+    parser.add_argument('--metrics', type=str, help='Write stage timings and counters to this file (JSON lines, or Prometheus text for .prom)')
+    parser.add_argument('--profile', type=str, nargs='+', choices=STAGES + ['all'], help='Stages to run under cProfile (needs --metrics)')
+    parser.add_argument('--profile-dir', type=str, default='profiles', help='Directory of the cProfile .prof files')
+
+
+def enable_from_args(args):
+    if args.metrics:
+        enable(args.metrics, args.profile, args.profile_dir)
+
+
+def _enable_from_environment():
+    # Worker processes started with spawn append to the output their parent configured
+    output = os.environ.get(ENV_OUTPUT)
+    if output:
+        global _state
+        profile = [stage for stage in os.environ.get(ENV_PROFILE, '').split(',') if stage]
+        _state = _State(output, profile, os.environ.get(ENV_PROFILE_DIR, 'profiles'), owner=False)
+
+
+_enable_from_environment()
+atexit.register(flush)
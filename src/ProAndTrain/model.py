@@ -1,42 +1,220 @@
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.svm import SVC
-import xgboost as xgb
-from catboost import CatBoostClassifier
+from ProAndTrain import instrumentation
 
 
 class MLModel:
-    def __init__(self, model_name: str):
+    # Backends _get_model can build
+    AVAILABLE_MODELS = ['random_forest', 'xgboost', 'svm', 'catboost', 'svm_approx']
+
+    # Hyperparameter search spaces: parameter -> ('int', low, high), ('float', low, high),
+    # ('log', low, high) (log-uniform) or ('choice', [options])
+    SEARCH_SPACES = {
+        'random_forest': {
+            'max_depth': ('choice', [None, 4, 8, 16]),
+            'min_samples_leaf': ('int', 1, 10),
+            'max_features': ('choice', ['sqrt', 'log2', None]),
+        },
+        'xgboost': {
+            'learning_rate': ('log', 0.01, 0.3),
+            'max_depth': ('int', 2, 10),
+            'min_child_weight': ('log', 0.5, 10.0),
+            'subsample': ('float', 0.5, 1.0),
+            'colsample_bytree': ('float', 0.5, 1.0),
+        },
+        'svm': {
+            'C': ('log', 0.01, 100.0),
+            'gamma': ('log', 1e-4, 1.0),
+            'kernel': ('choice', ['rbf', 'poly', 'sigmoid']),
+        },
+        'catboost': {
+            'learning_rate': ('log', 0.01, 0.3),
+            'depth': ('int', 3, 10),
+            'l2_leaf_reg': ('log', 1.0, 10.0),
+        },
+        'svm_approx': {
+            'approximation': ('choice', ['nystroem', 'rff']),
+            'n_components': ('choice', [100, 300, 1000]),
+            'gamma': ('log', 1e-3, 1.0),
+            'alpha': ('log', 1e-6, 1e-2),
+        },
+    }
+
+    # Budget of each backend in a successive-halving search: (parameter, full-budget value);
+    # 'n_samples' means the number of training rows
+    SEARCH_RESOURCES = {
+        'random_forest': ('n_estimators', 300),
+        'xgboost': ('n_estimators', 900),
+        'svm': ('n_samples', None),
+        'catboost': ('iterations', 900),
+        'svm_approx': ('n_samples', None),
+    }
+
+    # Backends compile() supports -> largest batch their compiled predictor scores
+    # (above it the estimator's own multi-row code is faster, see benchmarks/compiled.py)
+    COMPILED_MAX_ROWS = {'random_forest': 256, 'xgboost': 32}
+
+    # Trees / boosting rounds update() adds by default, as a fraction of the model's current count
+    UPDATE_FRACTION = 0.1
+
+    def __init__(self, model_name: str, n_threads: int = None, params: dict = None):
         """
         Initializes the ML model based on the model_name passed.
         
-        :param model_name: Name of the model to use. Available options: 'random_forest', 'xgboost', 'svm', 'catboost'.
+        :param model_name: Name of the model to use. Available options: 'random_forest', 'xgboost', 'svm', 'catboost', 'svm_approx'.
+        :param n_threads: Threads the backend may use for training and prediction (default: the backend's own default). The SVMs are single-threaded and ignore it.
+        :param params: Hyperparameters passed to the backend's constructor (default: the library defaults).
         """
         self.model_name = model_name.lower()
+        self.n_threads = n_threads
+        self.params = dict(params or {})
         self.model = self._get_model()
+        self.compiled = None
 
     def _get_model(self):
         """
         Returns the corresponding model based on the provided model_name.
+
+        Only the chosen backend's library is imported.
         """
         if self.model_name == 'random_forest':
-            return RandomForestClassifier()
+            from sklearn.ensemble import RandomForestClassifier
+            return RandomForestClassifier(n_jobs=self.n_threads, **self.params)
         elif self.model_name == 'xgboost':
-            return xgb.XGBClassifier()
+            import xgboost as xgb
+            return xgb.XGBClassifier(n_jobs=self.n_threads, **self.params)
         elif self.model_name == 'svm':
-            return SVC()
+            from sklearn.svm import SVC
+            return SVC(**self.params)
         elif self.model_name == 'catboost':
-            return CatBoostClassifier(silent=True)
+            from catboost import CatBoostClassifier
+            return CatBoostClassifier(silent=True, thread_count=-1 if self.n_threads is None else self.n_threads, **self.params)
+        elif self.model_name == 'svm_approx':
+            # Kernel-approximated SVM trained with mini-batch SGD, for training sets too large for SVC
+            from ProAndTrain.approxSVM import ApproximateKernelSVC
+            return ApproximateKernelSVC(**self.params)
         else:
-            raise ValueError(f"Model '{self.model_name}' is not recognized. Available options: 'random_forest', 'xgboost', 'svm', 'catboost'.")
+            raise ValueError(f"Model '{self.model_name}' is not recognized. Available options: 'random_forest', 'xgboost', 'svm', 'catboost', 'svm_approx'.")
 
-    def train(self, X_train, y_train):
+    @classmethod
+    def from_model(cls, model_name: str, model, compiled=None):
+        """
+        Wraps an already trained model, e.g. one loaded from genModels/.
+
+        :param model_name: Name of the backend the model was built with ('random_forest', 'xgboost', 'svm', 'catboost', 'svm_approx').
+        :param model: The trained model instance.
+        :param compiled: The model's array predictor, if already built (e.g. ModelRegistry.load_predictor); used up to COMPILED_MAX_ROWS rows.
+        :return: An MLModel around the given model.
+        """
+        instance = cls.__new__(cls)
+        instance.model_name = model_name.lower()
+        instance.n_threads = None
+        instance.params = {}
+        instance.model = model
+        instance.compiled = compiled
+        return instance
+
+    def train(self, X_train, y_train, eval_set=None, early_stopping_rounds=None):
         """
         Trains the model on the provided training data.
         
         :param X_train: Features for training.
         :param y_train: Target values for training.
+        :param eval_set: Optional (X_val, y_val) validation split, used by XGBoost and CatBoost for early stopping.
+        :param early_stopping_rounds: Stop boosting once the validation loss has not improved for this many rounds.
+        """
+        self.compiled = None
+        with instrumentation.span('train', model=self.model_name) as stage:
+            if eval_set is not None and self.model_name == 'xgboost':
+                self.model.set_params(early_stopping_rounds=early_stopping_rounds)
+                self.model.fit(X_train, y_train, eval_set=[eval_set], verbose=False)
+            elif eval_set is not None and self.model_name == 'catboost':
+                self.model.fit(X_train, y_train, eval_set=eval_set, early_stopping_rounds=early_stopping_rounds)
+            else:
+                self.model.fit(X_train, y_train)
+            stage.add(rows=len(X_train), bytes=getattr(X_train, 'nbytes', None))
+
+    def train_chunks(self, chunks, eval_set=None, early_stopping_rounds=None, external_memory=False, cache_dir=None):
         """
-        self.model.fit(X_train, y_train)
+        Trains the XGBoost backend out of core, from chunks read one at a time (see outOfCore).
+
+        :param chunks: Chunk source: a callable returning a new iterable of (X, y) chunks on every call (e.g. outOfCore.array_chunks).
+        :param eval_set: Optional in-memory (X_val, y_val) validation split for early stopping.
+        :param early_stopping_rounds: Stop boosting once the validation loss has not improved for this many rounds.
+        :param external_memory: Page the quantized training matrix to a disk cache instead of keeping it in memory.
+        :param cache_dir: Directory of the disk cache (default: the system's temporary directory).
+        """
+        if self.model_name != 'xgboost':
+            raise ValueError(f"Model '{self.model_name}' cannot be trained from chunks. Available options: 'xgboost'.")
+        from ProAndTrain import outOfCore
+
+        self.compiled = None
+        with instrumentation.span('train', model=self.model_name, source='chunks') as stage:
+            iterator = outOfCore.train_classifier(self.model, chunks, eval_set, early_stopping_rounds, external_memory, cache_dir)
+            stage.add(rows=iterator.rows, chunks=iterator.n_chunks)
+
+    def update(self, X_new, y_new, n_estimators=None):
+        """
+        Continues training the trained model on new rows only, so the cost grows with len(X_new), not with the rows it was trained on.
+
+        xgboost and catboost boost n_estimators more rounds from the current trees; random_forest adds
+        n_estimators trees fitted on the new rows; svm_approx makes one partial_fit pass over them; svm
+        refits on its current support vectors (which stand in for the old rows) plus the new rows.
+
+        :param X_new: Features of the new rows, scaled like the training data.
+        :param y_new: Target values of the new rows.
+        :param n_estimators: Trees or boosting rounds to add (default: UPDATE_FRACTION of the current count, at least 1); ignored by the SVMs.
+        """
+        import numpy as np
+
+        self.compiled = None
+        with instrumentation.span('train', model=self.model_name, mode='update') as stage:
+            if self.model_name == 'xgboost':
+                booster = self.model.get_booster()
+                if getattr(self.model, 'early_stopping_rounds', None):
+                    # Continue from the rounds predict uses, not the ones after the best iteration
+                    booster = booster[:self.model.best_iteration + 1]
+                current = booster.num_boosted_rounds()
+                rounds = n_estimators or max(1, round(current * self.UPDATE_FRACTION))
+                self.model.set_params(n_estimators=rounds, early_stopping_rounds=None)
+                self.model.fit(X_new, y_new, xgb_model=booster, verbose=False)
+                self.model.set_params(n_estimators=current + rounds)
+            elif self.model_name == 'catboost':
+                current = self.model.tree_count_
+                rounds = n_estimators or max(1, round(current * self.UPDATE_FRACTION))
+                # A fitted CatBoost model's parameters are frozen; the new rounds go into a fresh one
+                updated = type(self.model)(**{**self.model.get_params(), 'iterations': rounds})
+                updated.fit(X_new, y_new, init_model=self.model)
+                self.model = updated
+            elif self.model_name == 'random_forest':
+                if len(np.unique(y_new)) < len(self.model.classes_):
+                    raise ValueError("The new rows must contain every class to add random forest trees fitted on them.")
+                current = len(self.model.estimators_)
+                rounds = n_estimators or max(1, round(current * self.UPDATE_FRACTION))
+                self.model.set_params(warm_start=True, n_estimators=current + rounds)
+                self.model.fit(X_new, y_new)
+                self.model.set_params(warm_start=False)
+            elif self.model_name == 'svm_approx':
+                self.model.partial_fit(X_new, y_new, classes=self.model.classes_)
+            elif self.model_name == 'svm':
+                # dual_coef_ holds alpha * y with y = +1 for classes_[1]
+                support_labels = self.model.classes_[(self.model.dual_coef_[0] > 0).astype(int)]
+                if self.model.gamma in ('scale', 'auto'):
+                    # Keep the kernel the model was trained with instead of re-deriving it from fewer rows
+                    self.model.set_params(gamma=self.model._gamma)
+                self.model.fit(np.concatenate([self.model.support_vectors_, np.asarray(X_new, dtype='float64')]),
+                               np.concatenate([support_labels, np.asarray(y_new)]))
+            else:
+                raise ValueError(f"Model '{self.model_name}' cannot be updated. Available options: 'random_forest', 'xgboost', 'svm', 'catboost', 'svm_approx'.")
+            stage.add(rows=len(X_new))
+
+    def best_iteration(self):
+        """
+        Number of boosting rounds kept by early stopping, or None if the model was not early-stopped.
+        """
+        if self.model_name == 'xgboost' and getattr(self.model, 'early_stopping_rounds', None):
+            return self.model.best_iteration + 1
+        elif self.model_name == 'catboost' and self.model.get_best_iteration() is not None:
+            return self.model.get_best_iteration() + 1
+        return None
 
     def predict(self, X_test):
         """
@@ -45,8 +223,40 @@ class MLModel:
         :param X_test: Features for prediction.
         :return: Predicted values.
         """
-        return self.model.predict(X_test)
+        with instrumentation.span('predict', model=self.model_name) as stage:
+            stage.add(rows=len(X_test))
+            if self._use_compiled(X_test):
+                return self.compiled.predict(X_test)
+            return self.model.predict(X_test)
+
+    def predict_proba(self, X_test):
+        """
+        Returns the probability of the positive class, if the model can estimate it.
 
+        :param X_test: Features for prediction.
+        :return: Positive-class probabilities, or None for models without predict_proba (e.g. SVC()).
+        """
+        if not hasattr(self.model, 'predict_proba'):
+            return None
+        with instrumentation.span('predict', model=self.model_name) as stage:
+            stage.add(rows=len(X_test))
+            if self._use_compiled(X_test):
+                return self.compiled.predict_proba(X_test)
+            return self.model.predict_proba(X_test)[:, 1]
+
+    def decision_scores(self, X_test):
+        """
+        Continuous scores for ranking metrics such as ROC-AUC.
+
+        :param X_test: Features for prediction.
+        :return: Positive-class probabilities, or the decision function for models without predict_proba.
+        """
+        probability = self.predict_proba(X_test)
+        if probability is None:
+            with instrumentation.span('predict', model=self.model_name) as stage:
+                stage.add(rows=len(X_test))
+                return self.model.decision_function(X_test)
+        return probability
 
     def get_model(self):
         """
@@ -56,6 +266,23 @@ class MLModel:
         """
         return self.model
 
+    def compile(self):
+        """
+        Flattens a trained random forest or XGBoost model into NumPy node arrays (see compiledTrees);
+        predict and predict_proba then use them for batches of up to COMPILED_MAX_ROWS[model_name] rows.
+
+        :return: The compiledTrees.TreeEnsemble, or None for backends that cannot be compiled.
+        """
+        if self.model_name not in self.COMPILED_MAX_ROWS:
+            return None
+        from ProAndTrain import compiledTrees
+
+        self.compiled = compiledTrees.compile_model(self.model)
+        return self.compiled
+
+    def _use_compiled(self, X_test):
+        return self.compiled is not None and len(X_test) <= self.COMPILED_MAX_ROWS.get(self.model_name, 0)
+
     def get_score(self, X_test, y_test):
         """
         Returns the accuracy score of the model on the provided test data.
@@ -65,3 +292,14 @@ class MLModel:
         :return: Accuracy score.
         """
         return self.model.score(X_test, y_test)
+
+    def evaluate(self, X_test, y_test):
+        """
+        Returns accuracy, precision, recall, F1 and ROC-AUC of the model on the provided test data.
+        
+        :param X_test: Features for testing.
+        :param y_test: Target values for testing.
+        :return: Dict of metric name -> value.
+        """
+        from ProAndTrain.evaluation import binary_metrics
+        return binary_metrics(y_test, self.predict(X_test), self.decision_scores(X_test))
@@ -0,0 +1,211 @@
+"""
+Memory-mappable model artifacts: <name>.model next to the <name>.pkl of a ModelRegistry.
+
+A pickle is deserialized into every process's private heap. A .model file holds the
+arrays a model predicts from (tree nodes from compiledTrees, SVM support vectors and
+dual coefficients) uncompressed, at page-aligned offsets, so load() maps them
+read-only: every process scoring with the same artifact shares one physical copy
+through the page cache, and loading costs about the same for any model size.
+
+Layout (format version 1):
+
+    offset 0   MAGIC (8 bytes), format version (uint32 LE), header length (uint32 LE)
+    offset 16  JSON header: predictor class, its scalar params, model name, metadata
+               and, per array, dtype, shape and byte offset
+    ...        every array starts on an ALIGNMENT boundary
+
+The pickle stays the artifact for SHAP and retraining; the .model file is what the
+scoring paths load.
+"""
+
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from ProAndTrain import compiledTrees
+
+
+MAGIC = b'CCRMODEL'
+FORMAT_VERSION = 1
+EXTENSION = '.model'
+
+# Array offsets are multiples of the mapping granularity (the page size on Linux)
+ALIGNMENT = max(mmap.ALLOCATIONGRANULARITY, 4096)
+
+_PREAMBLE = struct.Struct('<8sII')
+
+
+class SupportVectorModel:
+    def __init__(self, arrays, kernel='rbf', gamma=1.0, coef0=0.0, degree=3):
+        """
+        Decision function of a binary SVC from its support vectors.
+
+        :param arrays: Dict with 'support_vectors' (n_SV x features), 'dual_coef' (n_SV) and 'intercept' (1).
+        :param kernel: 'rbf', 'linear', 'poly' or 'sigmoid'.
+        :param gamma: Kernel coefficient (the SVC's resolved _gamma).
+        :param coef0: Independent term of 'poly' and 'sigmoid'.
+        :param degree: Degree of 'poly'.
+        """
+        if kernel not in ('rbf', 'linear', 'poly', 'sigmoid'):
+            raise ValueError(f"Kernel '{kernel}' is not recognized. Available options: 'rbf', 'linear', 'poly', 'sigmoid'.")
+        self.arrays = arrays
+        self.kernel = kernel
+        self.gamma = float(gamma)
+        self.coef0 = float(coef0)
+        self.degree = int(degree)
+
+    @property
+    def params(self):
+        return {'kernel': self.kernel, 'gamma': self.gamma, 'coef0': self.coef0, 'degree': self.degree}
+
+    def decision_function(self, X):
+        """
+        :param X: 2-D array of model inputs (or one 1-D row).
+        :return: Signed distance to the separating surface (positive: class 1), like SVC.decision_function.
+        """
+        X = np.asarray(X, dtype='float64')
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        support_vectors = self.arrays['support_vectors']
+        dot = X @ support_vectors.T
+        if self.kernel == 'rbf':
+            distances = (X ** 2).sum(axis=1)[:, None] + (support_vectors ** 2).sum(axis=1)[None, :] - 2 * dot
+            kernel = np.exp(-self.gamma * np.maximum(distances, 0))
+        elif self.kernel == 'linear':
+            kernel = dot
+        elif self.kernel == 'poly':
+            kernel = (self.gamma * dot + self.coef0) ** self.degree
+        else:
+            kernel = np.tanh(self.gamma * dot + self.coef0)
+        return kernel @ self.arrays['dual_coef'] + self.arrays['intercept'][0]
+
+    def predict_proba(self, X):
+        """
+        :return: None, like MLModel.predict_proba for an SVC without probability estimates.
+        """
+        return None
+
+    def predict(self, X):
+        """
+        :param X: 2-D array of model inputs (or one 1-D row).
+        :return: 0/1 class predictions.
+        """
+        return (self.decision_function(X) > 0).astype('int64')
+
+
+PREDICTORS = {
+    'TreeEnsemble': compiledTrees.TreeEnsemble,
+    'ObliviousEnsemble': compiledTrees.ObliviousEnsemble,
+    'SupportVectorModel': SupportVectorModel,
+}
+
+
+def export_model(model):
+    """
+    Array predictor of a trained model
+
+    Parameters:
+    model: Trained RandomForestClassifier, XGBClassifier, CatBoostClassifier or SVC (binary)
+
+    Returns:
+    Predictor with `arrays` and `params`: a compiledTrees ensemble or a SupportVectorModel
+    """
+    if type(model).__name__ != 'SVC':
+        return compiledTrees.compile_model(model)
+    if len(model.classes_) != 2:
+        raise ValueError("Only binary SVC models can be exported.")
+    arrays = {'support_vectors': np.asarray(model.support_vectors_, dtype='float64'),
+              'dual_coef': np.asarray(model.dual_coef_[0], dtype='float64'),
+              'intercept': np.asarray(model.intercept_, dtype='float64')}
+    return SupportVectorModel(arrays, kernel=model.kernel, gamma=model._gamma, coef0=model.coef0, degree=model.degree)
+
+
+def save(path, predictor, model_name, metadata=None):
+    """
+    Writes a predictor as a .model file (atomically, through a temporary file)
+
+    Parameters:
+    path (str): Output path, usually <registry>/<name>.model
+    predictor: Object from export_model
+    model_name (str): Registry name of the model
+    metadata (dict, optional): JSON-serializable extras stored in the header
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in predictor.arrays.items()}
+    table, offset = {}, 0
+    for name, array in arrays.items():
+        table[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header = {'format_version': FORMAT_VERSION, 'predictor': type(predictor).__name__, 'params': predictor.params,
+              'model_name': model_name, 'metadata': metadata or {}, 'arrays': table}
+    header_bytes = json.dumps(header).encode()
+    # Array offsets in the header are relative to the first page after it
+    data_start = -(-(_PREAMBLE.size + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + table[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    """
+    Header of a .model file
+
+    Returns:
+    tuple: (header dict, byte offset of the array data)
+    """
+    with open(path, 'rb') as f:
+        magic, version, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a model artifact.")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Model artifact format {version} is not supported. Available options: {FORMAT_VERSION}.")
+        header = json.loads(f.read(header_length))
+    return header, -(-(_PREAMBLE.size + header_length) // ALIGNMENT) * ALIGNMENT
+
+
+def load(path, mmap_mode='r'):
+    """
+    Predictor of a .model file, with its arrays mapped read-only (shared between processes)
+
+    Parameters:
+    path (str): .model file
+    mmap_mode (str, optional): 'r' to map the arrays, None to read them into private memory
+
+    Returns:
+    Predictor (see PREDICTORS); its `header` attribute holds the file header
+    """
+    header, data_start = read_header(path)
+    if header['predictor'] not in PREDICTORS:
+        raise ValueError(f"Predictor '{header['predictor']}' is not recognized. Available options: {', '.join(PREDICTORS)}.")
+
+    with open(path, 'rb') as f:
+        if mmap_mode == 'r':
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        elif mmap_mode is None:
+            buffer = f.read()
+        else:
+            raise ValueError(f"mmap_mode '{mmap_mode}' is not recognized. Available options: 'r', None.")
+
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        dtype = np.dtype(entry['dtype'])
+        count = int(np.prod(entry['shape']))
+        if count == 0:
+            arrays[name] = np.empty(entry['shape'], dtype=dtype)
+            continue
+        # The views keep the mapping alive; it is unmapped once the predictor is gone
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + entry['offset']).reshape(entry['shape'])
+
+    predictor = PREDICTORS[header['predictor']](arrays, **header['params'])
+    predictor.header = header
+    return predictor
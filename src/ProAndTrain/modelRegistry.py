@@ -0,0 +1,195 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+
+from ProAndTrain import model, modelArtifact
+
+
+# Display names of the MLModel backends, in the order the app lists them
+MODEL_LABELS = {
+    'random_forest': 'Random Forest Classifier',
+    'xgboost': 'GBoost Classifier',
+    'svm': 'SVM',
+    'catboost': 'CatBoost Classifier',
+    'svm_approx': 'SVM (kernel approximation)',
+}
+
+
+class ModelRegistry:
+    def __init__(self, directory, max_models=4):
+        """
+        Trained model artifacts of a directory (<name>.pkl plus a <name>.json metadata file,
+        and a memory-mappable <name>.model for scoring).
+
+        Loaded models are kept in a process-wide LRU cache of at most max_models entries,
+        and reloaded only when the artifact's modification time changes.
+
+        :param directory: Directory holding the artifacts, e.g. 'genModels'.
+        :param max_models: Number of deserialized models kept in memory.
+        """
+        self.directory = directory
+        self.max_models = max_models
+        self._models = OrderedDict()
+        self._predictors = {}
+        self._metadata = {}
+        self._lock = threading.Lock()
+
+    def _path(self, name, extension):
+        return os.path.join(self.directory, name + extension)
+
+    def available(self):
+        """
+        Names of the models that have an artifact, known backends first.
+
+        :return: List of model names.
+        """
+        names = {os.path.splitext(file)[0] for file in os.listdir(self.directory)
+                 if file.endswith(('.pkl', modelArtifact.EXTENSION))}
+        order = list(MODEL_LABELS)
+        return sorted(names, key=lambda name: (order.index(name) if name in order else len(order), name))
+
+    def metadata(self, name):
+        """
+        Metadata of a model: feature order, scaler, training data hash and metrics.
+
+        Artifacts saved without a metadata file get an entry with only the model name.
+
+        :param name: Model name, e.g. 'random_forest'.
+        :return: Metadata dict.
+        """
+        path = self._path(name, '.json')
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {'model_name': name}
+
+        with self._lock:
+            cached = self._metadata.get(name)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+        with open(path) as f:
+            metadata = json.load(f)
+        with self._lock:
+            self._metadata[name] = (mtime, metadata)
+        return metadata
+
+    def load(self, name):
+        """
+        Returns the model, deserializing it only on first use or after the artifact changed.
+
+        :param name: Model name, e.g. 'random_forest'.
+        :return: The trained model.
+        """
+        path = self._path(name, '.pkl')
+        mtime = os.stat(path).st_mtime_ns
+
+        with self._lock:
+            cached = self._models.get(name)
+            if cached is not None and cached[0] == mtime:
+                self._models.move_to_end(name)
+                return cached[1]
+
+        model = joblib.load(path)
+
+        with self._lock:
+            self._models[name] = (mtime, model)
+            self._models.move_to_end(name)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+        return model
+
+    def load_predictor(self, name):
+        """
+        Array predictor of a model, mapped read-only from <name>.model (see modelArtifact), so
+        every process scoring with it shares one copy. Artifacts saved before .model files
+        existed fall back to compiling the pickle (tree ensembles only).
+
+        :param name: Model name, e.g. 'xgboost'.
+        :return: Predictor with predict / predict_proba, or None if there is none for this model.
+        """
+        path = self._path(name, modelArtifact.EXTENSION)
+        if not os.path.exists(path):
+            path = self._path(name, '.pkl')
+        mtime = os.stat(path).st_mtime_ns
+
+        with self._lock:
+            cached = self._predictors.get(name)
+            if cached is not None and cached[:2] == (path, mtime):
+                return cached[2]
+
+        if path.endswith(modelArtifact.EXTENSION):
+            predictor = modelArtifact.load(path)
+        else:
+            predictor = model.MLModel.from_model(name, self.load(name)).compile()
+
+        with self._lock:
+            self._predictors[name] = (path, mtime, predictor)
+        return predictor
+
+    def scale(self, name, X):
+        """
+        Applies the scaler the model was trained with (if its metadata has one).
+
+        :param name: Model name.
+        :param X: 2-D array of features in the model's feature order.
+        :return: Scaled float32 array.
+        """
+        X = np.asarray(X, dtype='float32')
+        scaler = self.metadata(name).get('scaler')
+        if scaler is None:
+            return X
+        return ((X - np.asarray(scaler['mean'], dtype='float32')) / np.asarray(scaler['scale'], dtype='float32')).astype('float32')
+
+    def save(self, name, model, feature_names, scaler=None, data_sha256=None, metrics=None, resampler=None):
+        """
+        Writes <name>.pkl, <name>.model (when the backend can be exported) and the metadata file.
+
+        :param name: Model name, e.g. 'xgboost'.
+        :param model: Trained model.
+        :param feature_names: Feature order the model was trained with.
+        :param scaler: Fitted StandardScaler applied before training (or its {'mean', 'scale'} dict from metadata), if any.
+        :param data_sha256: Hash of the training CSV.
+        :param metrics: Dict of evaluation metrics.
+        :param resampler: Class-imbalance strategy of the training rows (one of resampling.RESAMPLERS), if known.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        joblib.dump(model, self._path(name, '.pkl'))
+        try:
+            modelArtifact.save(self._path(name, modelArtifact.EXTENSION), modelArtifact.export_model(model), name,
+                               metadata={'feature_names': list(feature_names)})
+        except ValueError:
+            # Not exportable (e.g. a multi-class model): scoring falls back to the pickle, never to a stale .model
+            if os.path.exists(self._path(name, modelArtifact.EXTENSION)):
+                os.remove(self._path(name, modelArtifact.EXTENSION))
+
+        metadata = {
+            'model_name': name,
+            'model_class': type(model).__name__,
+            'feature_names': list(feature_names),
+            'scaler': scaler if scaler is None or isinstance(scaler, dict) else {'mean': scaler.mean_.tolist(), 'scale': scaler.scale_.tolist()},
+            'data_sha256': data_sha256,
+            'resampler': resampler,
+            'metrics': metrics or {},
+        }
+        with open(self._path(name, '.json'), 'w') as f:
+            json.dump(metadata, f, indent=2)
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(directory, max_models=4):
+    """
+    Process-wide registry of a directory, so every caller (and every Streamlit rerun) shares one cache.
+    """
+    key = os.path.abspath(directory)
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = ModelRegistry(directory, max_models)
+        return _registries[key]
@@ -1,25 +1,133 @@
+import numpy as np
 import pandas as pd
 
-def optimize_memory_usage(df):
+# Declared dtypes of the 22 model columns, all nullable since any field of a real extract
+# can be missing ('?'). They are storage types, not parse types: read_csv_with_schema parses
+# float64 and the frames are narrowed once imputed (narrow_to_schema, optimize_memory_usage),
+# falling back to Float32 for a column whose values are fractional or outside the type's
+# range, so no value wraps around or fails the read.
+MODEL_SCHEMA = {
+    'Age': 'UInt8',
+    'Number of sexual partners': 'UInt8',
+    'First sexual intercourse': 'UInt8',
+    'Num of pregnancies': 'UInt8',
+    'Smokes': 'UInt8',
+    'Smokes (years)': 'Float32',
+    'Smokes (packs/year)': 'Float32',
+    'Hormonal Contraceptives': 'UInt8',
+    'Hormonal Contraceptives (years)': 'Float32',
+    'IUD': 'UInt8',
+    'IUD (years)': 'Float32',
+    'STDs': 'UInt8',
+    'STDs (number)': 'UInt8',
+    'STDs: Number of diagnosis': 'UInt8',
+    'Dx:Cancer': 'UInt8',
+    'Dx:CIN': 'UInt8',
+    'Dx:HPV': 'UInt8',
+    'Dx': 'UInt8',
+    'Hinselmann': 'UInt8',
+    'Schiller': 'UInt8',
+    'Citology': 'UInt8',
+    'Biopsy': 'UInt8',
+}
+
+
+def narrow_to_schema(df, schema=MODEL_SCHEMA):
+    """
+    Casts the schema columns of a numeric frame to their declared dtypes where the values allow it.
+
+    A column declared as an integer type is cast only if every present value is a whole
+    number within the type's range; otherwise it becomes Float32 and keeps its values
+    (e.g. an Age of 300 or 34.5), so the range check happens here instead of in a cast.
+
+    Parameters:
+    df (pd.DataFrame): Frame with numeric schema columns
+    schema (dict): Column name to dtype
+
+    Returns:
+    pd.DataFrame: The frame with the schema columns cast
+    """
+    dtypes = {}
+    for column, declared in schema.items():
+        if column not in df.columns:
+            continue
+        dtype = pd.api.types.pandas_dtype(declared)
+        if dtype.kind in 'iu':
+            values = df[column].to_numpy(dtype='float64', na_value=np.nan)
+            values = values[~np.isnan(values)]
+            info = np.iinfo(dtype.numpy_dtype)
+            if not ((values == np.floor(values)).all() and (values >= info.min).all() and (values <= info.max).all()):
+                dtype = pd.Float32Dtype()
+        if df[column].dtype != dtype:
+            dtypes[column] = dtype
+    return df.astype(dtypes) if dtypes else df
+
+
+def read_csv_with_schema(path, schema=MODEL_SCHEMA, **kwargs):
     """
-    Iterates over all columns in the DataFrame and optimizes memory usage 
+    Reads the schema columns of a CSV as numbers, ready for the preprocessing.
+
+    Only the schema columns are parsed, straight to float64 ('?' is turned into NaN by
+    the parser itself), so no object frame is built and the values are the ones
+    process_data sees. The frame is not narrowed here: the group means must be computed
+    from the float64 values, so narrow_to_schema is applied only once the frame is
+    imputed. Extra keyword arguments (e.g. chunksize) are passed to pd.read_csv.
+
+    Parameters:
+    path (str): CSV in the raw or processed layout
+    schema (dict): Column name to dtype
+
+    Returns:
+    pd.DataFrame: The float64 frame (or a chunk iterator when chunksize is given)
+    """
+    return pd.read_csv(path, usecols=lambda column: column in schema, dtype={column: 'float64' for column in schema},
+                       na_values=['?'], **kwargs)
+
+
+def optimize_memory_usage(df, schema=MODEL_SCHEMA):
+    """
+    Iterates over all columns in the DataFrame and optimizes memory usage
     by downcasting numerical columns (float64 and int64) to more efficient types.
-    
+
+    Columns declared in the schema are cast to their declared dtype where their values
+    allow it (see narrow_to_schema); the other columns are downcast as small as their values allow.
+
     Parameters:
     df (pd.DataFrame): The DataFrame to optimize.
+    schema (dict): Column name to dtype for the known model columns.
 
     Returns:
     pd.DataFrame: The DataFrame with optimized memory usage.
     """
+    df = narrow_to_schema(df, schema)
+
     for col in df.columns:
+        if col in schema:
+            continue
+
         col_type = df[col].dtype
-        
+
         if col_type == 'float64':
             # Try to downcast float64 to float32 or smaller if possible
             df[col] = pd.to_numeric(df[col], downcast='float')
-        
+
         elif col_type == 'int64':
             # Try to downcast int64 to int32, int16, or int8 if possible
             df[col] = pd.to_numeric(df[col], downcast='integer')
-    
-    return df
\ No newline at end of file
+
+    return df
+
+
+def memory_report(frames):
+    """
+    Compares the deep memory footprint of several versions of the same frame.
+
+    Parameters:
+    frames (dict): Label to DataFrame, e.g. {'before': raw, 'after': typed}
+
+    Returns:
+    pd.DataFrame: Bytes per column (plus a 'TOTAL' row), one column per label
+    """
+    report = pd.DataFrame({label: df.memory_usage(deep=True, index=False) for label, df in frames.items()})
+    report.loc['TOTAL'] = report.sum()
+    return report
@@ -0,0 +1,175 @@
+"""
+Out-of-core XGBoost training: the training rows are read a chunk at a time through an xgboost.DataIter.
+
+MLModel.train needs the whole training matrix in memory, plus the copy XGBoost builds
+from it. XGBoost's 'hist' trees only look at the histogram bin of each value, so
+QuantileDMatrix pulls the chunks through a DataIter, sketches the bin boundaries and
+keeps only the quantized matrix (about one byte per value instead of four, and no
+float copy). ExtMemQuantileDMatrix (xgboost 3.0+) also writes the quantized pages to
+a disk cache and streams them through every boosting round, so memory no longer grows
+with the row count. The trained booster is loaded into the MLModel's XGBClassifier, so predict,
+predict_proba, get_score, compile and the registry work as after MLModel.train.
+
+A chunk source is a callable returning a new iterable of (X, y) chunks each time it is
+called: the data is read once to sketch the bins and once more to quantize it.
+"""
+
+import os
+import tempfile
+from contextlib import nullcontext
+
+import numpy as np
+import xgboost as xgb
+
+from ProAndTrain import instrumentation
+
+
+# Rows per chunk: 64k rows of the processed data are a few MB of float32
+CHUNK_ROWS = 65536
+
+
+class ChunkIterator(xgb.DataIter):
+    def __init__(self, chunks, cache_prefix=None):
+        """
+        :param chunks: Chunk source, a callable returning a new iterable of (X, y) chunks on every call.
+        :param cache_prefix: Path prefix of the external-memory page cache (None: the pages stay in memory).
+        """
+        self.chunks = chunks
+        self.rows = 0
+        self.n_chunks = 0
+        self._iterator = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        """
+        Passes the next chunk to XGBoost; False once the source is exhausted.
+        """
+        if self._iterator is None:
+            self._iterator = iter(self.chunks())
+            self.rows, self.n_chunks = 0, 0
+        chunk = next(self._iterator, None)
+        if chunk is None:
+            return False
+        X, y = chunk
+        input_data(data=np.ascontiguousarray(X, dtype='float32'), label=np.asarray(y, dtype='float32'))
+        self.rows += len(y)
+        self.n_chunks += 1
+        return True
+
+    def reset(self):
+        self._iterator = None
+
+
+def array_chunks(X, y, rows=None, chunk_rows=CHUNK_ROWS, transform=None):
+    """
+    Chunk source over (a subset of the rows of) two arrays, e.g. the memmaps of dataCache.load_processed
+
+    Parameters:
+    X (array): Features (an array or a memmap; only one chunk's rows are read at a time)
+    y (array): Labels
+    rows (array, optional): Row indices to read, in this order (default: every row)
+    chunk_rows (int): Rows per chunk
+    transform (callable, optional): Applied to every feature chunk, e.g. a fitted scaler's transform
+
+    Returns:
+    callable: Chunk source yielding float32 (X, y) chunks
+    """
+    def chunks():
+        n_rows = len(y) if rows is None else len(rows)
+        for start in range(0, n_rows, chunk_rows):
+            index = slice(start, start + chunk_rows) if rows is None else rows[start:start + chunk_rows]
+            X_chunk = X[index] if transform is None else transform(X[index])
+            yield np.asarray(X_chunk, dtype='float32'), np.asarray(y[index], dtype='float32')
+    return chunks
+
+
+def npy_chunks(features_path, target_path, chunk_rows=CHUNK_ROWS):
+    """
+    Chunk source reading two .npy files (e.g. the data cache's features.npy and target.npy) with plain file reads
+
+    Unlike a memmap, whose pages stay mapped into the process once read, only the
+    current chunk is ever resident.
+
+    Parameters:
+    features_path (str): 2-D C-ordered .npy file of features
+    target_path (str): 1-D .npy file of labels, one per feature row
+    chunk_rows (int): Rows per chunk
+
+    Returns:
+    callable: Chunk source yielding float32 (X, y) chunks
+    """
+    def open_npy(path):
+        f = open(path, 'rb')
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(f)
+        if fortran_order:
+            f.close()
+            raise ValueError(f"{path} is Fortran-ordered; only C-ordered arrays can be read in row chunks.")
+        return f, shape, dtype
+
+    def chunks():
+        features, shape, features_dtype = open_npy(features_path)
+        target, _, target_dtype = open_npy(target_path)
+        with features, target:
+            width = int(np.prod(shape[1:]))
+            for start in range(0, shape[0], chunk_rows):
+                n_rows = min(chunk_rows, shape[0] - start)
+                X = np.fromfile(features, dtype=features_dtype, count=n_rows * width).reshape(n_rows, *shape[1:])
+                y = np.fromfile(target, dtype=target_dtype, count=n_rows)
+                yield X.astype('float32', copy=False), y.astype('float32', copy=False)
+    return chunks
+
+
+def chain_chunks(*sources):
+    """
+    Chunk source reading the given sources one after the other
+    """
+    def chunks():
+        for source in sources:
+            yield from source()
+    return chunks
+
+
+def train_classifier(classifier, chunks, eval_set=None, early_stopping_rounds=None, external_memory=False, cache_dir=None):
+    """
+    Trains an XGBClassifier from a chunk source with its own parameters, as XGBClassifier.fit would
+
+    Parameters:
+    classifier (XGBClassifier): Untrained or trained classifier; its booster is replaced
+    chunks (callable): Chunk source of the training rows
+    eval_set (tuple, optional): In-memory (X_val, y_val) validation split for early stopping
+    early_stopping_rounds (int, optional): Stop once the validation loss has not improved for this many rounds
+    external_memory (bool): Keep the quantized pages in a disk cache instead of in memory
+    cache_dir (str, optional): Directory of the disk cache (default: the system's temporary directory)
+
+    Returns:
+    ChunkIterator: The training iterator, with the number of rows and chunks of its last pass
+    """
+    if external_memory and not hasattr(xgb, 'ExtMemQuantileDMatrix'):
+        raise ValueError(f"External-memory training needs xgboost 3.0 or later (installed: {xgb.__version__}); "
+                         "train without external_memory or upgrade xgboost.")
+    params = classifier.get_xgb_params()
+    if external_memory and cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # The cache pages are deleted with the matrix; the directory is removed afterwards
+    with tempfile.TemporaryDirectory(prefix='xgb-pages-', dir=cache_dir) if external_memory else nullcontext() as pages:
+        iterator = ChunkIterator(chunks, cache_prefix=os.path.join(pages, 'train') if pages else None)
+        Matrix = xgb.ExtMemQuantileDMatrix if external_memory else xgb.QuantileDMatrix
+        with instrumentation.span('load', source='chunks') as stage:
+            train = Matrix(iterator, max_bin=params.get('max_bin'), nthread=params.get('n_jobs'))
+            stage.add(rows=iterator.rows, chunks=iterator.n_chunks)
+
+        evals = []
+        if eval_set is not None:
+            X_val, y_val = eval_set
+            evals = [(xgb.QuantileDMatrix(X_val, y_val, ref=train, nthread=params.get('n_jobs')), 'validation_0')]
+        booster = xgb.train(params, train, classifier.get_num_boosting_rounds(), evals=evals,
+                            early_stopping_rounds=early_stopping_rounds if evals else None, verbose_eval=False)
+        del train, evals
+
+    classifier.load_model(bytearray(booster.save_raw('ubj')))
+    # best_iteration() and predict use the early-stopped rounds, as after fit with early_stopping_rounds
+    classifier.set_params(early_stopping_rounds=early_stopping_rounds if eval_set is not None else None)
+    return iterator
@@ -0,0 +1,134 @@
+import numpy as np
+
+from ProAndTrain import instrumentation
+
+
+# Class-imbalance strategies of the training folds:
+#   'smote'        synthetic minority rows interpolated between neighbours (kdtree_smote)
+#   'class_weight' no extra rows; the backend weights the minority class (class_weight_params)
+#   'undersample'  random subset of the majority class, as large as the minority class
+#   'none'         the training rows as they are
+RESAMPLERS = ['smote', 'class_weight', 'undersample', 'none']
+
+
+def _minority(y):
+    labels, counts = np.unique(y, return_counts=True)
+    return labels[np.argmin(counts)], counts.min(), counts.max()
+
+
+def kdtree_smote(X, y, k_neighbors=5, batch_size=8192, seed=42, algorithm='kd_tree'):
+    """
+    SMOTE synthetic rows, with the neighbour index built over the minority rows only.
+
+    The k nearest minority neighbours of every minority row are queried once from a
+    KD-tree (or ball tree); the synthetic rows are then interpolated batch by batch into
+    a preallocated float32 array. Only the new rows are returned, so the original
+    training matrix is never copied.
+
+    Parameters:
+    X (array): Training rows (any float dtype, may be a memmap)
+    y (array): Training labels (binary)
+    k_neighbors (int): Neighbours to interpolate towards
+    batch_size (int): Synthetic rows generated at a time
+    seed (int): Random seed
+    algorithm (str): 'kd_tree' or 'ball_tree'
+
+    Returns:
+    tuple: (X_synthetic float32, y_synthetic) with enough minority rows to balance the classes
+    """
+    from sklearn.neighbors import BallTree, KDTree
+
+    y = np.asarray(y)
+    label, n_minority, n_majority = _minority(y)
+    n_new = n_majority - n_minority
+    if n_new == 0 or n_minority < 2:
+        return np.empty((0, X.shape[1]), dtype='float32'), np.empty(0, dtype=y.dtype)
+
+    X_minority = np.asarray(X[y == label], dtype='float64')
+    if algorithm == 'kd_tree':
+        tree = KDTree(X_minority)
+    elif algorithm == 'ball_tree':
+        tree = BallTree(X_minority)
+    else:
+        raise ValueError(f"Neighbour index '{algorithm}' is not recognized. Available options: 'kd_tree', 'ball_tree'.")
+
+    k = min(k_neighbors, n_minority - 1)
+    # Column 0 is the row itself
+    neighbors = tree.query(X_minority, k=k + 1, return_distance=False)[:, 1:]
+
+    rng = np.random.default_rng(seed)
+    X_synthetic = np.empty((n_new, X.shape[1]), dtype='float32')
+    for start in range(0, n_new, batch_size):
+        stop = min(start + batch_size, n_new)
+        base = rng.integers(n_minority, size=stop - start)
+        towards = neighbors[base, rng.integers(k, size=stop - start)]
+        gap = rng.random((stop - start, 1))
+        X_synthetic[start:stop] = X_minority[base] + gap * (X_minority[towards] - X_minority[base])
+
+    return X_synthetic, np.full(n_new, label, dtype=y.dtype)
+
+
+def random_undersample(y, seed=42):
+    """
+    Row indices of a class-balanced subset: all minority rows plus as many random majority rows.
+
+    Parameters:
+    y (array): Training labels (binary)
+    seed (int): Random seed
+
+    Returns:
+    array: Sorted int32 row indices
+    """
+    y = np.asarray(y)
+    label, n_minority, _ = _minority(y)
+    majority = np.flatnonzero(y != label)
+    kept = np.random.default_rng(seed).choice(majority, size=n_minority, replace=False)
+    return np.sort(np.concatenate([np.flatnonzero(y == label), kept])).astype('int32')
+
+
+def resample(strategy, X, y, seed=42):
+    """
+    Applies a class-imbalance strategy to training rows without copying them
+
+    Parameters:
+    strategy (str): One of RESAMPLERS
+    X (array): Training rows
+    y (array): Training labels
+    seed (int): Random seed
+
+    Returns:
+    tuple: (rows, X_synthetic, y_synthetic): indices of the rows to keep, and rows to append
+    """
+    if strategy not in RESAMPLERS:
+        raise ValueError(f"Resampler '{strategy}' is not recognized. Available options: {', '.join(RESAMPLERS)}.")
+
+    with instrumentation.span('resample', strategy=strategy) as stage:
+        rows = np.arange(len(y), dtype='int32')
+        if strategy == 'smote':
+            X_synthetic, y_synthetic = kdtree_smote(X, y, seed=seed)
+        else:
+            if strategy == 'undersample':
+                rows = random_undersample(y, seed)
+            X_synthetic, y_synthetic = np.empty((0, X.shape[1]), dtype='float32'), np.empty(0, dtype=np.asarray(y).dtype)
+        stage.add(rows=len(y), kept_rows=len(rows), synthetic_rows=len(y_synthetic))
+    return rows, X_synthetic, y_synthetic
+
+
+def class_weight_params(model_name, y):
+    """
+    Backend parameters that weight the classes instead of resampling them
+
+    Parameters:
+    model_name (str): MLModel backend
+    y (array): Training labels (binary)
+
+    Returns:
+    dict: scale_pos_weight (XGBoost), auto_class_weights (CatBoost) or class_weight (random forest, SVC)
+    """
+    y = np.asarray(y)
+    if model_name == 'xgboost':
+        n_positive = int((y == 1).sum())
+        return {'scale_pos_weight': (len(y) - n_positive) / max(1, n_positive)}
+    elif model_name == 'catboost':
+        return {'auto_class_weights': 'Balanced'}
+    return {'class_weight': 'balanced'}
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from ProAndTrain import instrumentation
+
+
+# Output settings: 'publication' matches the original 300 dpi PNGs, 'draft' is for quick looks
+PLOT_MODES = {
+    'publication': {'dpi': 300, 'format': 'png'},
+    'draft': {'dpi': 72, 'format': 'jpg'},
+}
+
+MANIFEST_FILE = 'render_manifest.json'
+
+# Kinds shap can only draw on pyplot's current figure (the legacy summary plot, force and decision
+# plots take no axes); they are rendered in the calling process, and only the others (drawn on
+# their own Figure) go to the worker processes
+PYPLOT_KINDS = ['summary', 'bar', 'force', 'decision']
+
+# Even dependence plots touch pyplot (shap adds their colorbar through plt.colorbar), so the
+# threads of one process (e.g. Streamlit sessions) render one plot at a time
+_pyplot_lock = threading.Lock()
+
+
+def positive_class(shap_values, expected_value):
+    """
+    SHAP values and expected value of the positive class, for per-class lists or (rows, features, classes) arrays
+
+    Returns:
+    tuple: (values 2-D array, expected value, title suffix)
+    """
+    class_index = 1  # Usually 1 is the positive class (adjust if needed)
+    if isinstance(shap_values, list):
+        shap_values = shap_values[class_index]
+    elif np.ndim(shap_values) == 3:
+        shap_values = np.asarray(shap_values)[..., class_index]
+    else:
+        return np.asarray(shap_values), expected_value, ""
+
+    if np.ndim(expected_value) == 1:
+        expected_value = np.asarray(expected_value)[class_index]
+    return np.asarray(shap_values), expected_value, f" (Class {class_index})"
+
+
+def plot_jobs(values, feature_names, n_rows, n_dependence=5, n_force=3, n_decision=10):
+    """
+    The plots of a SHAP report: summary, bar, dependence plots of the top features,
+    force plots of the first rows and one decision plot
+
+    Returns:
+    list: Job dicts with 'kind', 'name' (file name without extension) and the plot's own arguments
+    """
+    mean_abs_shap = np.mean(np.abs(values), axis=0)
+    top_features = [feature_names[i] for i in np.argsort(-mean_abs_shap, kind='stable')[:n_dependence]]
+
+    jobs = [{'kind': 'summary', 'name': 'shap_summary_plot'}, {'kind': 'bar', 'name': 'shap_bar_plot'}]
+    jobs += [{'kind': 'dependence', 'name': f"shap_dependence_{feature.replace(' ', '_')}", 'feature': feature}
+             for feature in top_features]
+    jobs += [{'kind': 'force', 'name': f"shap_force_plot_example_{i + 1}", 'row': i} for i in range(min(n_force, n_rows))]
+    jobs.append({'kind': 'decision', 'name': 'shap_decision_plot', 'rows': min(n_decision, n_rows)})
+    return jobs
+
+
+def inputs_hash(values, X_sample, feature_names, expected_value):
+    """
+    SHA-256 of everything a plot is drawn from
+    """
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(values, dtype='float64').tobytes())
+    digest.update(np.ascontiguousarray(np.asarray(X_sample, dtype='float64')).tobytes())
+    digest.update(json.dumps([list(feature_names), np.asarray(expected_value).tolist()]).encode())
+    return digest.hexdigest()
+
+
+_worker_data = None
+
+
+def _init_worker(values, X_sample, feature_names, expected_value, headless=True):
+    global _worker_data
+    if headless:
+        import matplotlib
+        matplotlib.use('Agg')
+    _worker_data = (values, X_sample, feature_names, expected_value)
+
+
+def _draw(job, title_suffix):
+    """
+    Draws one job and returns its figure; dependence plots use a pyplot-free Figure,
+    the PYPLOT_KINDS draw on pyplot's current figure (see render_job).
+    """
+    import matplotlib.pyplot as plt
+    import shap
+
+    values, X_sample, feature_names, expected_value = _worker_data
+    kind = job['kind']
+
+    if kind == 'dependence':
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(12, 8))
+        ax = fig.subplots()
+        shap.dependence_plot(feature_names.index(job['feature']), values, X_sample, feature_names=feature_names,
+                             ax=ax, show=False)
+        ax.set_title(f"SHAP Dependence Plot for {job['feature']}{title_suffix}")
+        return fig
+
+    if kind in ('summary', 'bar'):
+        plt.figure(figsize=(12, 8))
+        shap.summary_plot(values, X_sample, feature_names=feature_names, show=False,
+                          **({'plot_type': 'bar'} if kind == 'bar' else {}))
+        plt.title(f"SHAP Feature Importance{' (Bar Plot)' if kind == 'bar' else ''}{title_suffix}")
+    elif kind == 'force':
+        plt.figure(figsize=(20, 3))
+        shap.force_plot(expected_value, values[job['row'], :], X_sample.iloc[job['row'], :],
+                        feature_names=feature_names, matplotlib=True, show=False)
+        plt.title(f"SHAP Force Plot for Example {job['row'] + 1}")
+    elif kind == 'decision':
+        plt.figure(figsize=(12, 10))
+        shap.decision_plot(expected_value, values[:job['rows']], X_sample.iloc[:job['rows']],
+                           feature_names=feature_names, show=False)
+        plt.title(f"SHAP Decision Plot{title_suffix}")
+    else:
+        raise ValueError(f"Plot kind '{kind}' is not recognized. Available options: 'summary', 'bar', 'dependence', 'force', 'decision'.")
+    return plt.gcf()
+
+
+def render_job(job, path, dpi, title_suffix=""):
+    """
+    Renders one plot to path (in a worker process, or in the calling process for the PYPLOT_KINDS).
+
+    Returns:
+    tuple: (path, error message or None)
+    """
+    import matplotlib.pyplot as plt
+
+    with _pyplot_lock:
+        try:
+            fig = _draw(job, title_suffix)
+            fig.tight_layout()
+            options = {'pil_kwargs': {'quality': 85}} if path.endswith(('.jpg', '.webp')) else {}
+            fig.savefig(path, dpi=dpi, bbox_inches='tight', **options)
+            return path, None
+        except Exception as e:
+            return path, f"Error creating {job['kind']} plot {job['name']}: {e}"
+        finally:
+            # The job's pyplot figures, including the empty current figure plt.colorbar may have created
+            plt.close('all')
+
+
+def render_plots(shap_values, X_sample, feature_names, output_dir, expected_value, mode='publication',
+                 image_format=None, jobs=1, force=False):
+    """
+    Renders the SHAP report plots; with jobs > 1 the dependence plots are drawn in worker
+    processes while this process draws the PYPLOT_KINDS.
+
+    A plot is skipped when its file exists and was rendered from the same SHAP values,
+    rows, plot arguments and output settings (tracked in render_manifest.json).
+
+    Parameters:
+    shap_values: SHAP values (array or per-class list)
+    X_sample (DataFrame): Rows the values explain
+    feature_names (list): Feature names
+    output_dir (str): Directory to save plots
+    expected_value: The explainer's expected value
+    mode (str): 'publication' or 'draft', see PLOT_MODES
+    image_format (str, optional): 'png', 'jpg' or 'webp' instead of the mode's format
+    jobs (int): Number of worker processes
+    force (bool): Render every plot, even unchanged ones
+
+    Returns:
+    dict: 'rendered' and 'skipped' lists of paths, and 'errors'
+    """
+    if mode not in PLOT_MODES:
+        raise ValueError(f"Plot mode '{mode}' is not recognized. Available options: {', '.join(PLOT_MODES)}.")
+    settings = dict(PLOT_MODES[mode], **({'format': image_format} if image_format else {}))
+
+    values, expected_value, title_suffix = positive_class(shap_values, expected_value)
+    if not isinstance(X_sample, pd.DataFrame):
+        X_sample = pd.DataFrame(X_sample, columns=feature_names)
+    feature_names = list(feature_names)
+
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    data_hash = inputs_hash(values, X_sample, feature_names, expected_value)
+    pending, skipped = [], []
+    for job in plot_jobs(values, feature_names, len(X_sample)):
+        path = os.path.join(output_dir, f"{job['name']}.{settings['format']}")
+        key = hashlib.sha256(json.dumps([data_hash, job, settings, title_suffix], sort_keys=True).encode()).hexdigest()
+        if not force and manifest.get(os.path.basename(path)) == key and os.path.exists(path):
+            skipped.append(path)
+        else:
+            pending.append((job, path, key))
+
+    results = []
+    with instrumentation.span('plot', mode=mode, jobs=jobs) as stage:
+        stage.add(plots=len(pending), skipped_plots=len(skipped))
+        pooled = [pending_job for pending_job in pending if pending_job[0]['kind'] not in PYPLOT_KINDS]
+        if jobs <= 1 or len(pooled) <= 1:
+            pooled = []
+        local = [pending_job for pending_job in pending if pending_job not in pooled]
+
+        _init_worker(values, X_sample, feature_names, expected_value, headless=False)
+        if not pooled:
+            results = [(render_job(job, path, settings['dpi'], title_suffix), key) for job, path, key in local]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                     initargs=(values, X_sample, feature_names, expected_value)) as pool:
+                futures = {pool.submit(render_job, job, path, settings['dpi'], title_suffix): key for job, path, key in pooled}
+                results = [(render_job(job, path, settings['dpi'], title_suffix), key) for job, path, key in local]
+                results += [(future.result(), futures[future]) for future in as_completed(futures)]
+
+    rendered, errors = [], []
+    for (path, error), key in results:
+        if error is None:
+            rendered.append(path)
+            manifest[os.path.basename(path)] = key
+        else:
+            errors.append(error)
+            manifest.pop(os.path.basename(path), None)
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return {'rendered': rendered, 'skipped': skipped, 'errors': errors}
+
+
+def patient_figure(values, expected_value, x_row, feature_names, max_display=10):
+    """
+    Horizontal bar chart of one patient's largest SHAP contributions.
+
+    Drawn on a pyplot-free Figure, so concurrent Streamlit sessions do not share plotting state.
+
+    Parameters:
+    values (array): The patient's SHAP values (positive class)
+    expected_value (float): The explainer's expected value
+    x_row (array): The patient's feature values, shown next to the feature names
+    feature_names (list): Feature names
+    max_display (int): Number of features shown
+
+    Returns:
+    matplotlib.figure.Figure: The chart
+    """
+    from matplotlib.figure import Figure
+
+    order = np.argsort(-np.abs(values), kind='stable')[:max_display][::-1]
+    labels = [f"{feature_names[i]} = {x_row[i]:g}" for i in order]
+
+    fig = Figure(figsize=(10, 0.45 * len(order) + 1.5))
+    ax = fig.subplots()
+    ax.barh(labels, values[order], color=['#ff0051' if values[i] > 0 else '#008bfb' for i in order])
+    ax.axvline(0, color='#999999', linewidth=0.8)
+    ax.set_xlabel("SHAP value (impact on the model output)")
+    ax.set_title(f"Contributions to this assessment (base value {expected_value:.3f}, "
+                 f"output {expected_value + values.sum():.3f})")
+    fig.tight_layout()
+    return fig
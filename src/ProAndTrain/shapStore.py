@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+VALUES_FILE = 'values.npy'
+ROWS_FILE = 'rows.npy'
+META_FILE = 'meta.json'
+
+
+def row_hashes(X):
+    """
+    64-bit content hash of every row of a feature matrix
+
+    Parameters:
+    X (DataFrame or array): Feature rows
+
+    Returns:
+    array: uint64 hash per row (equal rows get equal hashes, wherever they are in the file)
+    """
+    frame = X if isinstance(X, pd.DataFrame) else pd.DataFrame(np.asarray(X))
+    return pd.util.hash_pandas_object(frame.astype('float64'), index=False).to_numpy()
+
+
+def data_hash(X):
+    """
+    SHA-256 of a whole feature matrix, in row order (e.g. of an explainer's background data)
+
+    Parameters:
+    X (DataFrame or array): Feature rows
+
+    Returns:
+    str: Hex digest
+    """
+    return hashlib.sha256(row_hashes(X).tobytes()).hexdigest()
+
+
+class ShapStore:
+    def __init__(self, directory, model_sha256, feature_names, settings=None):
+        """
+        On-disk SHAP values of one model artifact, keyed by row content hash.
+
+        The values live in <directory>/<model hash>/ as values.npy (one row per stored
+        patient row) and rows.npy (their row hashes), with meta.json holding the feature
+        order, the explainer settings and the expected value. A different model artifact
+        or different settings start a new, empty store, so the settings must include
+        everything the values and the expected value depend on, such as a hash of the
+        explainer's background data.
+
+        :param directory: Root directory of the stores, e.g. 'shap_results/shap_store'.
+        :param model_sha256: Hash of the model artifact.
+        :param feature_names: Feature order of the values.
+        :param settings: JSON-serializable explainer settings the values depend on (e.g. nsamples, background hash).
+        """
+        self.directory = os.path.join(directory, model_sha256[:16])
+        self.meta = {'model_sha256': model_sha256, 'feature_names': list(feature_names),
+                     'settings': settings or {}, 'expected_value': None}
+        self.rows = np.empty(0, dtype='uint64')
+        self.values = None
+
+        stored = self._read_meta()
+        if stored is not None and all(stored[key] == self.meta[key] for key in ('model_sha256', 'feature_names', 'settings')):
+            self.meta = stored
+            self.rows = np.load(os.path.join(self.directory, ROWS_FILE))
+            self.values = np.load(os.path.join(self.directory, VALUES_FILE))
+
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.directory, META_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def expected_value(self):
+        return self.meta['expected_value']
+
+    def missing(self, hashes):
+        """
+        :param hashes: Row hashes (see row_hashes).
+        :return: Boolean mask of the rows that have no stored values.
+        """
+        return pd.Index(self.rows).get_indexer(hashes) < 0
+
+    def add(self, hashes, values, expected_value=None):
+        """
+        Stores the SHAP values of new rows; rows already stored (or repeated) are kept once.
+
+        :param hashes: Row hashes of the new rows.
+        :param values: Their SHAP values, one row per hash (an array, or a per-class list of arrays).
+        :param expected_value: The explainer's expected value, stored with the first values (it is fixed by the settings).
+        """
+        if isinstance(values, list):
+            values = np.stack(values, axis=-1)
+        new = self.missing(hashes) & ~pd.Index(hashes).duplicated()
+        rows = np.concatenate([self.rows, np.asarray(hashes, dtype='uint64')[new]])
+        values = np.asarray(values)[new] if self.values is None else np.concatenate([self.values, np.asarray(values)[new]])
+
+        if self.meta['expected_value'] is None and expected_value is not None:
+            self.meta['expected_value'] = np.asarray(expected_value).tolist()
+        self._write(rows, values)
+        self.rows, self.values = rows, values
+
+    def _write(self, rows, values):
+        os.makedirs(self.directory, exist_ok=True)
+        # Meta is removed first and written last, so a store cut short mid-write is seen as empty, not corrupt
+        meta_path = os.path.join(self.directory, META_FILE)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for name, array in ((ROWS_FILE, rows), (VALUES_FILE, values)):
+            tmp_path = os.path.join(self.directory, name + '.tmp.npy')
+            np.save(tmp_path, array)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        with open(meta_path, 'w') as f:
+            json.dump(self.meta, f, indent=2)
+
+    def get(self, hashes):
+        """
+        :param hashes: Row hashes, all of them stored.
+        :return: Their SHAP values, in the order of hashes.
+        """
+        positions = pd.Index(self.rows).get_indexer(hashes)
+        if (positions < 0).any():
+            raise KeyError(f"{int((positions < 0).sum())} rows have no stored SHAP values")
+        return self.values[positions]
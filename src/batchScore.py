@@ -0,0 +1,135 @@
+"""
+Batch scoring of whole patient files with a trained model from genModels/.
+
+Run from src/:
+    python batchScore.py --input ../data/risk_factors_cervical_cancer.csv --output ../data/scores.csv --model xgboost --jobs 4
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ProAndTrain import dataProcessing, instrumentation, model, modelRegistry, momory_opt
+
+
+class BatchScorer:
+    def __init__(self, models_dir, model_name, threads=None):
+        """
+        Scores preprocessed blocks with a registry model, wrapped in MLModel.
+
+        :param models_dir: Directory of the model artifacts and preprocessor.npz.
+        :param model_name: Model name in the registry, e.g. 'xgboost'.
+        :param threads: Threads the model may use (set to 1 inside worker processes).
+        """
+        self.registry = modelRegistry.get_registry(models_dir)
+        self.model_name = model_name
+        self.preprocessor = dataProcessing.Preprocessor.load(os.path.join(models_dir, 'preprocessor.npz'))
+
+        estimator = self.registry.load(model_name)
+        if threads is not None and 'n_jobs' in estimator.get_params():
+            estimator.set_params(n_jobs=threads)
+        self.model = model.MLModel.from_model(model_name, estimator)
+
+    def score(self, chunk):
+        """
+        Imputes, scales and scores one chunk of raw rows.
+
+        :param chunk: Raw rows in the risk_factors_cervical_cancer.csv layout ('Biopsy' optional).
+        :return: DataFrame with 'row', 'prediction' and 'probability' (NaN if the model has no predict_proba).
+        """
+        with instrumentation.span('process_data', fitted=True) as stage:
+            X = self.preprocessor.transform(chunk)[self.preprocessor.feature_names].to_numpy(dtype='float32')
+            stage.add(rows=len(X), bytes=X.nbytes)
+        with instrumentation.span('scale'):
+            X = self.registry.scale(self.model_name, X)
+
+        probability = self.model.predict_proba(X)
+        return pd.DataFrame({
+            'row': chunk.index.to_numpy(),
+            'prediction': self.model.predict(X).astype('int64'),
+            'probability': np.full(len(X), np.nan) if probability is None else probability,
+        })
+
+
+_worker_scorer = None
+
+
+def _init_worker(models_dir, model_name):
+    global _worker_scorer
+    # One model per worker, single-threaded so the processes do not oversubscribe the cores
+    _worker_scorer = BatchScorer(models_dir, model_name, threads=1)
+
+
+def _score_in_worker(chunk):
+    return _worker_scorer.score(chunk)
+
+
+def score_file(input_path, output_path, models_dir, model_name, chunksize=50000, jobs=1):
+    """
+    Streams a CSV through the scorer chunk by chunk and writes the scores as they come.
+
+    With jobs > 1 the chunks are scored in worker processes; at most 2 * jobs chunks
+    are in flight, so memory stays bounded by the chunk size.
+
+    Parameters:
+    input_path (str): CSV to score
+    output_path (str): CSV to write ('row', 'prediction', 'probability')
+    models_dir (str): Directory of the model artifacts
+    model_name (str): Model name in the registry
+    chunksize (int): Rows per chunk
+    jobs (int): Number of worker processes
+
+    Returns:
+    int: Number of scored rows
+    """
+    chunks = momory_opt.read_csv_with_schema(input_path, chunksize=chunksize)
+    n_rows = 0
+
+    def write(scores):
+        nonlocal n_rows
+        scores.to_csv(output_path, mode='w' if n_rows == 0 else 'a', header=n_rows == 0, index=False)
+        n_rows += len(scores)
+
+    if jobs <= 1:
+        scorer = BatchScorer(models_dir, model_name)
+        for chunk in chunks:
+            write(scorer.score(chunk))
+        return n_rows
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(models_dir, model_name)) as pool:
+        pending = []
+        for chunk in chunks:
+            pending.append(pool.submit(_score_in_worker, chunk))
+            if len(pending) >= 2 * jobs:
+                write(pending.pop(0).result())
+        for future in pending:
+            write(future.result())
+
+    return n_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a patient CSV file with a trained model.')
+    parser.add_argument('--input', type=str, required=True, help='CSV file to score (raw risk_factors_cervical_cancer.csv layout)')
+    parser.add_argument('--output', type=str, required=True, help='CSV file to write the scores to')
+    parser.add_argument('--model', type=str, default='xgboost', help='Model name in the models directory')
+    parser.add_argument('--models-dir', type=str, default='../genModels', help='Directory of the trained models')
+    parser.add_argument('--chunksize', type=int, default=50000, help='Rows per chunk')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.enable_from_args(args)
+
+    start = time.perf_counter()
+    n_rows = score_file(args.input, args.output, args.models_dir, args.model, args.chunksize, args.jobs)
+    elapsed = time.perf_counter() - start
+
+    print(f"Scored {n_rows} rows in {elapsed:.2f} s ({n_rows / elapsed:,.0f} rows/sec), written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
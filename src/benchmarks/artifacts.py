@@ -0,0 +1,107 @@
+"""
+Load time and per-process memory of the pickled models against the memory-mapped .model artifacts.
+
+Random forests of growing size are saved both ways. Load time is the best of --repeat
+loads (page cache warm). Then --processes processes load the same artifact and score
+one row; each reports the growth of its proportional (PSS) and private (USS) memory
+from /proc/self/smaps_rollup, so the mapped pages shared through the page cache show up
+as PSS split between the processes and no private memory (Linux only).
+
+Run from src/:  python -m benchmarks.artifacts --trees 100 400 1600 --processes 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import joblib
+
+from ProAndTrain import model, modelArtifact
+from benchmarks.suite import processed_rows
+from benchmarks.synthetic import RAW_DATA_PATH
+
+
+def memory_mb():
+    """
+    (PSS, USS) of this process in MB, from /proc/self/smaps_rollup
+    """
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields['Pss'] / 1024, (fields['Private_Clean'] + fields['Private_Dirty']) / 1024
+
+
+def load(path):
+    return modelArtifact.load(path) if path.endswith(modelArtifact.EXTENSION) else joblib.load(path)
+
+
+def _process(path, row, barrier, results):
+    import sklearn.ensemble  # noqa: F401  (imported before the baseline, like in a running service)
+
+    pss, uss = memory_mb()
+    predictor = load(path)
+    predictor.predict_proba(row)
+    # Every process holds its model while the others measure
+    barrier.wait()
+    pss_after, uss_after = memory_mb()
+    results.put((pss_after - pss, uss_after - uss))
+    barrier.wait()
+
+
+def shared_memory(path, row, processes):
+    """
+    Summed PSS and USS growth (MB) of `processes` processes holding the model at the same time
+    """
+    context = multiprocessing.get_context('spawn')
+    barrier, results = context.Barrier(processes), context.Queue()
+    workers = [context.Process(target=_process, args=(path, row, barrier, results)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    measured = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return sum(pss for pss, _ in measured), sum(uss for _, uss in measured)
+
+
+def best_load_ms(path, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load(path)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare pickled and memory-mapped model artifacts.')
+    parser.add_argument('--trees', type=int, nargs='+', default=[100, 400, 1600], help='Random forest sizes')
+    parser.add_argument('--processes', type=int, default=4, help='Processes holding the model at once')
+    parser.add_argument('--repeat', type=int, default=5, help='Loads per artifact (the fastest counts)')
+    parser.add_argument('--scale', type=int, default=10, help='Row multiplier of the original CSV for training')
+    parser.add_argument('--data', type=str, default=RAW_DATA_PATH, help='Path to the raw CSV data file')
+    args = parser.parse_args()
+
+    X, y = processed_rows(args.scale, args.data)
+    print(f"{'trees':>6} {'format':>7} {'file (MB)':>10} {'load (ms)':>10} "
+          f"{f'PSS x{args.processes} (MB)':>16} {f'USS x{args.processes} (MB)':>16}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_trees in args.trees:
+            Model = model.MLModel('random_forest', params={'n_estimators': n_trees})
+            Model.train(X, y)
+            paths = {'pickle': os.path.join(tmp, f'rf{n_trees}.pkl'), 'mmap': os.path.join(tmp, f'rf{n_trees}.model')}
+            joblib.dump(Model.get_model(), paths['pickle'])
+            modelArtifact.save(paths['mmap'], modelArtifact.export_model(Model.get_model()), 'random_forest')
+
+            for label, path in paths.items():
+                pss, uss = shared_memory(path, X[:1], args.processes)
+                print(f"{n_trees:>6} {label:>7} {os.path.getsize(path) / 2 ** 20:>10.1f} {best_load_ms(path, args.repeat):>10.2f} "
+                      f"{pss:>16.1f} {uss:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Latency of the compiled tree ensembles (ProAndTrain.compiledTrees) against the estimators' own predict_proba.
+
+Both backends are trained on the processed CSV, compiled, checked for equal outputs
+(within --tolerance) and timed at several batch sizes; p50/p99 are over --calls calls.
+
+Run from src/:  python -m benchmarks.compiled --batch-sizes 1 10 64 1000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ProAndTrain import compiledTrees, model
+from benchmarks.suite import processed_rows
+from benchmarks.synthetic import RAW_DATA_PATH
+
+
+def latencies(fn, X, batch_size, calls):
+    """
+    Milliseconds of each of `calls` calls of fn on consecutive batches of X
+    """
+    times = []
+    for i in range(calls):
+        start_row = (i * batch_size) % max(1, len(X) - batch_size)
+        batch = X[start_row:start_row + batch_size]
+        start = time.perf_counter()
+        fn(batch)
+        times.append(time.perf_counter() - start)
+    return np.array(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare compiled and native tree-ensemble prediction latency.')
+    parser.add_argument('--models', type=str, nargs='+', default=list(model.MLModel.COMPILED_MAX_ROWS), help='Backends to compile')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 64, 1000], help='Rows per call')
+    parser.add_argument('--calls', type=int, default=300, help='Timed calls per batch size')
+    parser.add_argument('--scale', type=int, default=2, help='Row multiplier of the original CSV (rows to score)')
+    parser.add_argument('--tolerance', type=float, default=1e-6, help='Largest allowed probability difference')
+    parser.add_argument('--data', type=str, default=RAW_DATA_PATH, help='Path to the raw CSV data file')
+    args = parser.parse_args()
+
+    X_train, y_train = processed_rows(1, args.data)
+    X, _ = processed_rows(args.scale, args.data)
+
+    print(f"{'model':<14} {'batch':>6} {'native p50':>11} {'compiled p50':>13} {'native p99':>11} {'compiled p99':>13} {'speedup':>8}")
+    for name in args.models:
+        # One thread, as in the app and the inference service's scorers
+        Model = model.MLModel(name, n_threads=1)
+        Model.train(X_train, y_train)
+        start = time.perf_counter()
+        ensemble = compiledTrees.compile_model(Model.get_model())
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        difference = np.abs(Model.get_model().predict_proba(X)[:, 1] - ensemble.predict_proba(X)).max()
+        if difference > args.tolerance:
+            raise SystemExit(f"{name}: compiled probabilities differ by {difference:.2e} (tolerance {args.tolerance:.0e})")
+        print(f"{name}: {ensemble.n_trees} trees, {ensemble.n_nodes} nodes, depth {ensemble.max_depth}, "
+              f"compiled in {compile_ms:.1f} ms, max |difference| {difference:.1e}")
+
+        native_fn = lambda batch: Model.get_model().predict_proba(batch)
+        for batch_size in args.batch_sizes:
+            native_fn(X[:batch_size]), ensemble.predict_proba(X[:batch_size])  # warm-up
+            native = latencies(native_fn, X, batch_size, args.calls)
+            compiled = latencies(ensemble.predict_proba, X, batch_size, args.calls)
+            print(f"{name:<14} {batch_size:>6} {np.percentile(native, 50):>11.3f} {np.percentile(compiled, 50):>13.3f} "
+                  f"{np.percentile(native, 99):>11.3f} {np.percentile(compiled, 99):>13.3f} "
+                  f"{np.percentile(native, 50) / np.percentile(compiled, 50):>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
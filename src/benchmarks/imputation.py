@@ -0,0 +1,84 @@
+"""
+Scaling benchmark for the group-mean imputation in dataProcessing.process_data.
+
+Run from src/:  python -m benchmarks.imputation --scales 1 10 100 1000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from ProAndTrain import dataProcessing
+from benchmarks.synthetic import scaled_raw_frame, RAW_DATA_PATH
+
+
+def legacy_impute(df):
+    """
+    Row-wise imputation exactly as process_data did it before the vectorized stage.
+    """
+    age_counts = df['Age'].value_counts()
+    valid_ages = age_counts[age_counts > 1].index
+    df_filtered = df[df['Age'].isin(valid_ages)].copy()
+
+    for column in dataProcessing.MEAN_IMPUTED_COLUMNS:
+        df_filtered[column] = df_filtered.apply(
+            lambda row: dataProcessing.fill_nan_with_group_mean(row, df_filtered, column), axis=1)
+
+    df.update(df_filtered)
+    return df
+
+
+def vectorized_impute(df):
+    means = dataProcessing.compute_group_means(df)
+    return dataProcessing.impute_group_means(df, means)
+
+
+def timed(fn, df):
+    start = time.perf_counter()
+    result = fn(df)
+    return result, time.perf_counter() - start
+
+
+def check_reference_output(data_path, reference_path):
+    """
+    Run the full process_data on the real file and compare it byte for byte with output.csv.
+    """
+    processed = dataProcessing.process_data(pd.read_csv(data_path), output_path=None)
+    with open(reference_path, newline='') as f:
+        return processed.to_csv(index=False) == f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark row-wise vs vectorized group-mean imputation.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100, 1000], help='Row multipliers of the original CSV')
+    parser.add_argument('--legacy-max-rows', type=int, default=10000, help='Skip the row-wise version above this many rows')
+    parser.add_argument('--data', type=str, default=RAW_DATA_PATH, help='Path to the raw CSV data file')
+    parser.add_argument('--reference', type=str, default='../data/output.csv', help='Processed CSV to compare against')
+    args = parser.parse_args()
+
+    identical = check_reference_output(args.data, args.reference)
+    print(f"process_data output identical to {args.reference}: {identical}")
+
+    print(f"{'scale':>6} {'rows':>9} {'vectorized (s)':>15} {'row-wise (s)':>13} {'speedup':>8} {'identical':>10}")
+    for scale in args.scales:
+        df = dataProcessing.select_model_columns(scaled_raw_frame(scale, args.data))
+
+        new, new_time = timed(vectorized_impute, df.copy())
+
+        if len(df) <= args.legacy_max_rows:
+            old, old_time = timed(legacy_impute, df.copy())
+            columns = dataProcessing.MEAN_IMPUTED_COLUMNS
+            same = np.array_equal(old[columns].to_numpy(), new[columns].to_numpy(), equal_nan=True)
+            identical = identical and same
+            print(f"{scale:>6} {len(df):>9} {new_time:>15.4f} {old_time:>13.4f} {old_time / new_time:>7.1f}x {str(same):>10}")
+        else:
+            print(f"{scale:>6} {len(df):>9} {new_time:>15.4f} {'-':>13} {'-':>8} {'-':>10}")
+
+    if not identical:
+        raise SystemExit("Vectorized imputation differs from the row-wise reference")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Memory footprint of the default CSV parse vs the declared schema (momory_opt.MODEL_SCHEMA).
+
+Run from src/:  python -m benchmarks.memory --scale 100
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from ProAndTrain import dataProcessing, momory_opt
+from benchmarks.synthetic import scaled_raw_frame, RAW_DATA_PATH
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report the before/after memory footprint of the dtype schema.')
+    parser.add_argument('--scale', type=int, default=1, help='Row multiplier of the original CSV')
+    parser.add_argument('--data', type=str, default=RAW_DATA_PATH, help='Path to the raw CSV data file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_path = os.path.join(tmp, 'raw.csv')
+        scaled_raw_frame(args.scale, args.data).to_csv(raw_path, index=False)
+
+        start = time.perf_counter()
+        default = pd.read_csv(raw_path)
+        default_processed = dataProcessing.process_data(default.copy(), output_path=None)
+        default_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        typed = momory_opt.read_csv_with_schema(raw_path)
+        # Narrowed once imputed, as the cache and updateModels do
+        typed_processed = momory_opt.narrow_to_schema(dataProcessing.process_data(typed.copy(), output_path=None))
+        typed_time = time.perf_counter() - start
+
+    print(f"Rows: {len(default)}")
+    print(f"Load + process_data: default {default_time:.2f} s, schema {typed_time:.2f} s\n")
+
+    print("Loaded frame (bytes):")
+    print(momory_opt.memory_report({'default': default, 'schema': typed}).fillna(0).astype('int64').to_string())
+
+    print("\nProcessed frame (bytes):")
+    print(momory_opt.memory_report({'default': default_processed, 'schema': typed_processed}).astype('int64').to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Peak memory and training time of XGBoost trained in memory against the out-of-core paths (ProAndTrain.outOfCore).
+
+The processed rows at each scale are written to a .npy file first, as in the data cache.
+Every (scale, option) pair then trains in a fresh spawned process, so each peak RSS
+belongs to one run:
+
+    in_memory  the file is read into an array and passed to MLModel.train
+    quantile   chunks read from the file feed a QuantileDMatrix (MLModel.train_chunks)
+    external   the same, with the quantized pages in a disk cache (external_memory=True)
+
+Training accuracy of each model is reported as a check that the paths agree.
+
+Run from src/:  python -m benchmarks.outofcore --scales 10 100 1000 --chunk-rows 65536
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ProAndTrain import model, outOfCore
+from benchmarks.suite import processed_rows
+from benchmarks.synthetic import RAW_DATA_PATH
+
+
+OPTIONS = ['in_memory', 'quantile', 'external']
+
+
+def peak_rss_mb():
+    """
+    High-water mark of this process's RSS in MB, from /proc/self/status (Linux only)
+
+    Unlike ru_maxrss, VmHWM starts over at exec, so a spawned worker does not report the
+    peak of the parent that wrote the data.
+    """
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+
+
+def run_option(option, features_path, target_path, chunk_rows, n_estimators):
+    X = np.load(features_path, mmap_mode='r')
+    y = np.load(target_path, mmap_mode='r')
+    baseline_mb = peak_rss_mb()
+
+    Model = model.MLModel('xgboost', n_threads=1, params={'n_estimators': n_estimators})
+    start = time.perf_counter()
+    if option == 'in_memory':
+        Model.train(np.array(X), np.array(y))
+    else:
+        Model.train_chunks(outOfCore.npy_chunks(features_path, target_path, chunk_rows), external_memory=option == 'external',
+                           cache_dir=os.path.dirname(features_path))
+    train_seconds = time.perf_counter() - start
+
+    sample = slice(0, min(len(y), 100000))
+    return {'train_seconds': train_seconds, 'peak_rss_mb': peak_rss_mb(), 'baseline_mb': baseline_mb,
+            'accuracy': Model.get_score(X[sample], y[sample])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare in-memory and out-of-core XGBoost training.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[10, 100, 1000], help='Row multipliers of the original CSV')
+    parser.add_argument('--options', type=str, nargs='+', default=OPTIONS, choices=OPTIONS, help='Training paths to compare')
+    parser.add_argument('--chunk-rows', type=int, default=outOfCore.CHUNK_ROWS, help='Rows per chunk of the out-of-core paths')
+    parser.add_argument('--n-estimators', type=int, default=100, help='Boosting rounds')
+    parser.add_argument('--data', type=str, default=RAW_DATA_PATH, help='Path to the raw CSV data file')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    print(f"{'scale':>6} {'rows':>9} {'data (MB)':>10} {'option':>10} {'train (s)':>10} {'peak RSS (MB)':>14} "
+          f"{'above start (MB)':>17} {'accuracy':>9}")
+    for scale in args.scales:
+        with tempfile.TemporaryDirectory() as tmp:
+            X, y = processed_rows(scale, args.data)
+            features_path, target_path = os.path.join(tmp, 'features.npy'), os.path.join(tmp, 'target.npy')
+            np.save(features_path, np.ascontiguousarray(X))
+            np.save(target_path, y)
+            n_rows, data_mb = len(y), X.nbytes / 2 ** 20
+            del X, y
+
+            for option in args.options:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    r = pool.submit(run_option, option, features_path, target_path, args.chunk_rows, args.n_estimators).result()
+                print(f"{scale:>6} {n_rows:>9} {data_mb:>10.1f} {option:>10} {r['train_seconds']:>10.2f} {r['peak_rss_mb']:>14.1f} "
+                      f"{r['peak_rss_mb'] - r['baseline_mb']:>17.1f} {r['accuracy']:>9.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Time, peak memory and recall of the class-imbalance strategies (ProAndTrain.resampling).
+
+imblearn's whole-matrix SMOTE is the baseline; the others are the options of
+genModels.py --resampler. Recall is measured on a stratified 1/4 holdout; above scale 1
+the tiled rows repeat across the split, so only the scale-1 recall is a fair comparison.
+The pluggable options are timed including the concatenation into one training matrix.
+
+Run from src/:  python -m benchmarks.resampling --scales 1 10 100 --model xgboost
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from imblearn.over_sampling import SMOTE
+
+from ProAndTrain import dataProcessing, evaluation, model, resampling
+from benchmarks.synthetic import scaled_raw_frame, RAW_DATA_PATH
+
+
+def imblearn_smote(X, y, seed):
+    X_resampled, y_resampled = SMOTE(random_state=seed).fit_resample(X, y)
+    return X_resampled, y_resampled
+
+
+def pluggable(strategy):
+    def run(X, y, seed):
+        rows, X_synthetic, y_synthetic = resampling.resample(strategy, X, y, seed)
+        return np.concatenate([X[rows], X_synthetic]), np.concatenate([y[rows], y_synthetic])
+    return run
+
+
+OPTIONS = {'imblearn_smote': imblearn_smote, **{strategy: pluggable(strategy) for strategy in resampling.RESAMPLERS}}
+
+
+def traced(fn, *args):
+    """
+    Run fn and return (result, seconds, peak traced allocation in MB).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the resampling strategies of the training stage.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='Row multipliers of the original CSV')
+    parser.add_argument('--model', type=str, default='xgboost', help='Backend trained to measure recall')
+    parser.add_argument('--data', type=str, default=RAW_DATA_PATH, help='Path to the raw CSV data file')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the split and the resamplers')
+    args = parser.parse_args()
+
+    print(f"{'scale':>6} {'option':>15} {'train rows':>11} {'resample (s)':>13} {'peak (MB)':>10} {'fit (s)':>8} {'recall':>7} {'roc_auc':>8}")
+    for scale in args.scales:
+        processed = dataProcessing.process_data(scaled_raw_frame(scale, args.data), output_path=None)
+        X = processed.drop(columns=['Biopsy']).to_numpy(dtype='float32')
+        y = processed['Biopsy'].to_numpy(dtype='float32')
+        train, test = evaluation.fold_indices(y, 4, args.seed)[0]
+        scaler = evaluation._fit_scaler(X, train)
+        X_train, X_test = scaler.transform(X[train]).astype('float32'), scaler.transform(X[test]).astype('float32')
+
+        for option, fn in OPTIONS.items():
+            (X_fit, y_fit), resample_time, peak = traced(fn, X_train, y[train], args.seed)
+            params = resampling.class_weight_params(args.model, y_fit) if option == 'class_weight' else None
+
+            Model = model.MLModel(args.model, n_threads=1, params=params)
+            start = time.perf_counter()
+            Model.train(X_fit, y_fit)
+            fit_time = time.perf_counter() - start
+            metrics = Model.evaluate(X_test, y[test])
+
+            print(f"{scale:>6} {option:>15} {len(X_fit):>11} {resample_time:>13.3f} {peak:>10.1f} {fit_time:>8.2f} "
+                  f"{metrics['recall']:>7.3f} {metrics['roc_auc']:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Cold-start time of the app and the command line entry points, against a budget.
+
+Each entry point is started for real in a fresh interpreter under `python -X importtime`:
+the command line scripts with --help (argparse exits once the modules are imported and
+the parser is built), the Streamlit app as a bare `python main.py` run of its first
+render. The wall time of the fastest of --repeat runs counts, minus the start of a bare
+interpreter measured the same way, so the numbers are the cost of the project's own
+startup. The heaviest top-level imports come from the importtime report.
+
+Results are written as JSON. The script exits with an error when an entry point is over
+its budget in BUDGETS_MS (times --budget-scale, for slower machines). With --baseline,
+each entry point is also compared against a stored run and counts as a failure when it
+got slower by more than --threshold (as benchmarks.suite does); --save-baseline stores
+the current run.
+
+Run from src/:  python -m benchmarks.startup
+                python -m benchmarks.startup --entry-points main.py genModels.py --budget-scale 1.5
+                python -m benchmarks.startup --baseline benchmarks/startup_baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+
+DEFAULT_RESULTS = 'benchmarks/startup_results.json'
+DEFAULT_BASELINE = 'benchmarks/startup_baseline.json'
+
+# Entry point -> (interpreter arguments, working directory relative to src/)
+ENTRY_POINTS = {
+    'main.py': (['src/main.py'], '..'),
+    'genModels.py': (['genModels.py', '--help'], '.'),
+    'tuneModels.py': (['tuneModels.py', '--help'], '.'),
+    'updateModels.py': (['updateModels.py', '--help'], '.'),
+    'batchScore.py': (['batchScore.py', '--help'], '.'),
+    'inferenceService.py': (['inferenceService.py', '--help'], '.'),
+    'ProAndTrain/SHAPexpls.py': (['-m', 'ProAndTrain.SHAPexpls', '--help'], '.'),
+}
+
+# Startup budgets in milliseconds: the lazy backend/plotting imports measured on a
+# development machine (main.py 2400-2800, the scripts 480-700) plus headroom
+BUDGETS_MS = {
+    'main.py': 3500,
+    'genModels.py': 900,
+    'tuneModels.py': 900,
+    'updateModels.py': 900,
+    'batchScore.py': 900,
+    'inferenceService.py': 900,
+    'ProAndTrain/SHAPexpls.py': 900,
+}
+
+# Differences below this are noise, whatever the relative change
+NOISE_FLOOR_MS = 20.0
+
+
+def start_time(arguments, cwd):
+    """
+    Starts a fresh interpreter with arguments under -X importtime and waits for it to exit.
+
+    Returns:
+    tuple: (wall time in ms, {top-level package: cumulative import ms})
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + arguments, cwd=cwd,
+                            capture_output=True, text=True, check=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        # Outermost imports have a single space of indentation, nested ones two more per level
+        if name[1:2] != ' ':
+            package = name.strip().split('.')[0]
+            packages[package] = packages.get(package, 0) + int(cumulative_us) / 1000
+    return wall_ms, packages
+
+
+def best_start(arguments, cwd, repeat):
+    # The first run also compiles .pyc files; it is a warm-up, not a sample
+    start_time(arguments, cwd)
+    return min((start_time(arguments, cwd) for _ in range(repeat)), key=lambda run: run[0])
+
+
+def regressions(results, baseline, threshold):
+    """
+    Entry points whose startup is more than threshold (relative) above the baseline's
+
+    Returns:
+    list: (entry point, baseline ms, current ms)
+    """
+    found = []
+    for entry_point, measured in results.items():
+        base = baseline.get(entry_point, {}).get('startup_ms')
+        value = measured['startup_ms']
+        if base is not None and value > base * (1 + threshold) and value - base > NOISE_FLOOR_MS:
+            found.append((entry_point, base, value))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the cold start of the entry points against a budget.')
+    parser.add_argument('--entry-points', type=str, nargs='+', default=list(ENTRY_POINTS), choices=list(ENTRY_POINTS),
+                        help='Entry points to measure, relative to src/')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per entry point (the fastest counts)')
+    parser.add_argument('--top', type=int, default=5, help='Heaviest top-level imports listed per entry point')
+    parser.add_argument('--output', type=str, default=DEFAULT_RESULTS, help='Where to write the results JSON')
+    parser.add_argument('--budget-scale', type=float, default=1.0, help='Multiplier of the budgets, for slower machines')
+    parser.add_argument('--baseline', type=str, help='Results JSON to also compare against')
+    parser.add_argument('--save-baseline', action='store_true', help=f"Also write the results to {DEFAULT_BASELINE}")
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative increase reported as a regression')
+    args = parser.parse_args()
+
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    interpreter_ms, _ = best_start(['-c', 'pass'], src_dir, args.repeat)
+    print(f"Bare interpreter start: {interpreter_ms:.0f} ms (subtracted below)")
+
+    results = {}
+    over_budget = []
+    print(f"{'entry point':<28} {'startup (ms)':>13} {'budget (ms)':>12}  heaviest imports")
+    for entry_point in args.entry_points:
+        arguments, cwd = ENTRY_POINTS[entry_point]
+        wall_ms, packages = best_start(arguments, os.path.join(src_dir, cwd), args.repeat)
+        startup_ms = wall_ms - interpreter_ms
+        budget = BUDGETS_MS[entry_point] * args.budget_scale
+        results[entry_point] = {'startup_ms': startup_ms, 'budget_ms': budget, 'imports_ms': packages}
+        heaviest = ', '.join(f"{name} {ms:.0f}" for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:args.top])
+        flag = '' if startup_ms <= budget else '  OVER BUDGET'
+        print(f"{entry_point:<28} {startup_ms:>13.0f} {budget:>12.0f}  {heaviest}{flag}")
+        if startup_ms > budget:
+            over_budget.append(entry_point)
+
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+              'interpreter_ms': interpreter_ms, 'settings': {'repeat': args.repeat, 'budget_scale': args.budget_scale},
+              'results': results}
+    paths = [args.output] + ([DEFAULT_BASELINE] if args.save_baseline else [])
+    for path in paths:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path) or '.', suffix='.tmp', delete=False) as f:
+            json.dump(report, f, indent=2)
+        os.replace(f.name, path)
+    print(f"\nResults saved to {', '.join(paths)}")
+
+    found = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        found = regressions(results, baseline, args.threshold)
+        for entry_point, base, value in found:
+            print(f"REGRESSION {entry_point}: {base:.0f} ms -> {value:.0f} ms (+{value / base - 1:.0%})")
+        if not found:
+            print(f"No regressions above {args.threshold:.0%} against {args.baseline}")
+
+    failures = []
+    if over_budget:
+        failures.append(f"cold start over budget: {', '.join(over_budget)}")
+    if found:
+        failures.append(f"{len(found)} entry points started more than {args.threshold:.0%} slower")
+    if failures:
+        raise SystemExit('; '.join(failures).capitalize())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Peak-memory benchmark for the chunked process_csv_in_chunks against the in-memory process_data.
+
+Run from src/:  python -m benchmarks.streaming --scales 1 10 --chunksize 10000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from ProAndTrain import dataProcessing
+from benchmarks.synthetic import scaled_raw_frame, RAW_DATA_PATH
+
+
+def traced(fn, *args, **kwargs):
+    """
+    Run fn and return (seconds, peak traced allocation in MB).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+
+def in_memory(raw_path, output_path):
+    dataProcessing.process_data(pd.read_csv(raw_path), output_path=output_path)
+
+
+def compare(path_a, path_b):
+    """
+    Byte equality of two CSV files, plus the largest absolute difference when they differ.
+    """
+    with open(path_a, 'rb') as a, open(path_b, 'rb') as b:
+        if a.read() == b.read():
+            return True, 0.0
+    diff = np.abs(pd.read_csv(path_a).to_numpy(dtype='float64') - pd.read_csv(path_b).to_numpy(dtype='float64'))
+    return False, np.nanmax(diff)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare chunked and in-memory preprocessing.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10], help='Row multipliers of the original CSV')
+    parser.add_argument('--chunksize', type=int, default=10000, help='Rows per chunk for the streaming mode')
+    parser.add_argument('--data', type=str, default=RAW_DATA_PATH, help='Path to the raw CSV data file')
+    parser.add_argument('--reference', type=str, default='../data/output.csv', help='Processed CSV to compare against')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        streamed_path = os.path.join(tmp, 'streamed.csv')
+        dataProcessing.process_csv_in_chunks(args.data, streamed_path, chunksize=args.chunksize)
+        identical, _ = compare(streamed_path, args.reference)
+        print(f"Streamed output identical to {args.reference}: {identical}")
+
+        print(f"{'scale':>6} {'rows':>9} {'in-memory (s)':>14} {'peak (MB)':>10} {'chunked (s)':>12} {'peak (MB)':>10} {'identical':>10} {'max diff':>9}")
+        for scale in args.scales:
+            raw_path = os.path.join(tmp, 'raw.csv')
+            scaled_raw_frame(scale, args.data).to_csv(raw_path, index=False)
+            memory_path = os.path.join(tmp, 'in_memory.csv')
+
+            memory_time, memory_peak = traced(in_memory, raw_path, memory_path)
+            stream_time, stream_peak = traced(dataProcessing.process_csv_in_chunks, raw_path, streamed_path,
+                                              chunksize=args.chunksize)
+            same, max_diff = compare(memory_path, streamed_path)
+            print(f"{scale:>6} {scale * 858:>9} {memory_time:>14.2f} {memory_peak:>10.1f} {stream_time:>12.2f} {stream_peak:>10.1f} {str(same):>10} {max_diff:>9.1e}")
+
+    if not identical:
+        raise SystemExit("Streamed output differs from the reference output")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+Benchmark suite of the preprocessing, training, inference and explanation hot paths.
+
+Every case runs in a fresh (spawned) process on synthetic data tiled from the
+risk_factors_cervical_cancer.csv schema (benchmarks.synthetic), so its peak RSS is
+its own. The cases are:
+
+  process_data@<scale>x, optimize_memory_usage@<scale>x   on the raw / processed frame
+  train/<backend>@<scale>x                                 MLModel.train on the processed rows
+  predict/<backend>@<scale>x                               MLModel.decision_scores of a 1x-trained model
+  latency/<backend>                                        single-row and 100-row decision_scores calls
+  shap/xgboost@<scale>x                                    generate_shap_values with a TreeExplainer
+
+Results are written as JSON. With --baseline, each case is compared against a stored
+run and the script exits with an error when one got slower (or bigger) by more than
+--threshold; --save-baseline stores the current run as the new baseline.
+
+Run from src/:  python -m benchmarks.suite --scales 1 10 --save-baseline
+                python -m benchmarks.suite --scales 1 10 --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ProAndTrain import dataProcessing, model, momory_opt
+from benchmarks.synthetic import scaled_raw_frame, RAW_DATA_PATH
+
+
+DEFAULT_RESULTS = 'benchmarks/results.json'
+DEFAULT_BASELINE = 'benchmarks/baseline.json'
+
+# Largest scale a case runs at; kernel SVC training is quadratic or worse in the row count
+MAX_SCALES = {'train/svm': 10, 'shap/xgboost': 100}
+
+# Differences below these are noise, whatever the relative change
+NOISE_FLOOR = {'seconds': 0.005, 'peak_rss_mb': 5.0, 'p50_ms': 0.05, 'p99_ms': 0.2, 'batch_ms': 0.2}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 2 ** 20 if sys.platform == 'darwin' else maxrss / 2 ** 10
+
+
+def best_time(fn, repeat):
+    """
+    Fastest of repeat calls of fn, in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def processed_rows(scale, data_path):
+    """
+    Processed features (float32) and labels of the synthetic frame at a scale
+    """
+    processed = dataProcessing.process_data(scaled_raw_frame(scale, data_path), output_path=None)
+    return processed.drop(columns=['Biopsy']).to_numpy(dtype='float32'), processed['Biopsy'].to_numpy(dtype='float32')
+
+
+def trained_model(backend, data_path, threads):
+    X, y = processed_rows(1, data_path)
+    Model = model.MLModel(backend, n_threads=threads)
+    Model.train(X, y)
+    return Model
+
+
+def run_case(case, scale, data_path, repeat, threads):
+    """
+    Runs one case (in a worker process) and returns its measurements.
+
+    Setup (building data, training the model a prediction case uses) happens before the
+    timed calls; peak_rss_mb is the process high-water mark, so it includes the setup.
+    """
+    kind, _, backend = case.partition('/')
+    result = {}
+
+    if kind == 'process_data':
+        raw = scaled_raw_frame(scale, data_path)
+        result['seconds'] = best_time(lambda: dataProcessing.process_data(raw.copy(), output_path=None), repeat)
+        result['rows'] = len(raw)
+    elif kind == 'optimize_memory_usage':
+        processed = dataProcessing.process_data(scaled_raw_frame(scale, data_path), output_path=None)
+        result['seconds'] = best_time(lambda: momory_opt.optimize_memory_usage(processed.copy()), repeat)
+        result['rows'] = len(processed)
+    elif kind == 'train':
+        X, y = processed_rows(scale, data_path)
+        # A small warm-up fit, so the backend's lazy imports are not timed
+        model.MLModel(backend, n_threads=threads).train(X[:200], y[:200])
+        result['seconds'] = best_time(lambda: model.MLModel(backend, n_threads=threads).train(X, y), repeat)
+        result['rows'] = len(X)
+    elif kind == 'predict':
+        Model = trained_model(backend, data_path, threads)
+        X, _ = processed_rows(scale, data_path)
+        result['seconds'] = best_time(lambda: Model.decision_scores(X), repeat)
+        result['rows'] = len(X)
+    elif kind == 'latency':
+        Model = trained_model(backend, data_path, threads)
+        X, _ = processed_rows(1, data_path)
+        calls = []
+        for i in range(200 * repeat):
+            row = X[i % len(X):i % len(X) + 1]
+            start = time.perf_counter()
+            Model.decision_scores(row)
+            calls.append(time.perf_counter() - start)
+        result['p50_ms'] = float(np.percentile(calls, 50) * 1000)
+        result['p99_ms'] = float(np.percentile(calls, 99) * 1000)
+        result['batch_ms'] = best_time(lambda: Model.decision_scores(X[:100]), repeat * 10) * 1000
+        result['rows'] = 1
+    elif kind == 'shap':
+        from ProAndTrain import SHAPexpls
+
+        X, _ = processed_rows(scale, data_path)
+        # SHAPexpls reports its progress on stdout, which would drown the table
+        with contextlib.redirect_stdout(io.StringIO()):
+            explainer = SHAPexpls.create_shap_explainer(trained_model(backend, data_path, threads).get_model(), None, 'tree')
+            result['seconds'] = best_time(lambda: SHAPexpls.generate_shap_values(explainer, X, n_jobs=1), repeat)
+        result['rows'] = len(X)
+    else:
+        raise ValueError(f"Benchmark case '{case}' is not recognized.")
+
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def cases(scales, backends):
+    """
+    (case id, case, scale) of every case the run covers, skipping those above MAX_SCALES
+    """
+    for scale in scales:
+        yield f"process_data@{scale}x", 'process_data', scale
+        yield f"optimize_memory_usage@{scale}x", 'optimize_memory_usage', scale
+        for backend in backends:
+            yield f"train/{backend}@{scale}x", f"train/{backend}", scale
+            yield f"predict/{backend}@{scale}x", f"predict/{backend}", scale
+        yield f"shap/xgboost@{scale}x", 'shap/xgboost', scale
+    for backend in backends:
+        yield f"latency/{backend}", f"latency/{backend}", 1
+
+
+def regressions(results, baseline, threshold):
+    """
+    Measurements that are more than threshold (relative) above the baseline's
+
+    Returns:
+    list: (case id, measurement, baseline value, current value)
+    """
+    found = []
+    for case_id, measured in results.items():
+        for key, value in measured.items():
+            base = baseline.get(case_id, {}).get(key)
+            if key not in NOISE_FLOOR or base is None:
+                continue
+            if value > base * (1 + threshold) and value - base > NOISE_FLOOR[key]:
+                found.append((case_id, key, base, value))
+    return found
+
+
+def environment():
+    import pandas
+    import sklearn
+    import xgboost
+
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'numpy': np.__version__, 'pandas': pandas.__version__, 'sklearn': sklearn.__version__,
+            'xgboost': xgboost.__version__}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the pipeline hot paths on synthetic data and compare against a baseline.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100, 1000], help='Row multipliers of the original CSV')
+    parser.add_argument('--models', type=str, nargs='+', default=model.MLModel.AVAILABLE_MODELS, help='Backends to benchmark')
+    parser.add_argument('--only', type=str, nargs='+', help='Run only the cases whose id starts with one of these (e.g. train/ shap)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed calls per case (the fastest counts)')
+    parser.add_argument('--threads', type=int, default=1, help='Threads of the model backends')
+    parser.add_argument('--data', type=str, default=RAW_DATA_PATH, help='Path to the raw CSV data file')
+    parser.add_argument('--output', type=str, default=DEFAULT_RESULTS, help='Where to write the results JSON')
+    parser.add_argument('--baseline', type=str, help='Results JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help=f"Also write the results to {DEFAULT_BASELINE}")
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative increase reported as a regression')
+    args = parser.parse_args()
+
+    selected = [(case_id, case, scale) for case_id, case, scale in cases(args.scales, args.models)
+                if (args.only is None or case_id.startswith(tuple(args.only)))
+                and scale <= MAX_SCALES.get(case, scale)]
+
+    # A fresh process per case, started clean (spawn), so each peak RSS belongs to one case
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    print(f"{'case':<34} {'rows':>9} {'seconds':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'peak RSS (MB)':>14}")
+    for case_id, case, scale in selected:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            measured = pool.submit(run_case, case, scale, args.data, args.repeat, args.threads).result()
+        results[case_id] = measured
+        seconds = f"{measured['seconds']:.3f}" if 'seconds' in measured else '-'
+        p50 = f"{measured['p50_ms']:.3f}" if 'p50_ms' in measured else '-'
+        p99 = f"{measured['p99_ms']:.3f}" if 'p99_ms' in measured else '-'
+        print(f"{case_id:<34} {measured['rows']:>9} {seconds:>9} {p50:>9} {p99:>9} {measured['peak_rss_mb']:>14.1f}")
+
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'environment': environment(),
+              'settings': {'repeat': args.repeat, 'threads': args.threads}, 'results': results}
+    paths = [args.output] + ([DEFAULT_BASELINE] if args.save_baseline else [])
+    for path in paths:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path) or '.', suffix='.tmp', delete=False) as f:
+            json.dump(report, f, indent=2)
+        os.replace(f.name, path)
+    print(f"\nResults saved to {', '.join(paths)}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        found = regressions(results, baseline, args.threshold)
+        for case_id, key, base, value in found:
+            print(f"REGRESSION {case_id} {key}: {base:.3f} -> {value:.3f} (+{value / base - 1:.0%})")
+        if found:
+            raise SystemExit(f"{len(found)} measurements regressed by more than {args.threshold:.0%}")
+        print(f"No regressions above {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
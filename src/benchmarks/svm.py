@@ -0,0 +1,78 @@
+"""
+Exact SVC against the kernel-approximated SVM (MLModel 'svm_approx') as the training set grows.
+
+Every (scale, option) pair runs in a fresh spawned process on a stratified 1/4 holdout
+split of the synthetic data, SMOTE-resampled like genModels.py's default. Reported are
+training and prediction time, peak RSS and the holdout metrics (ROC-AUC from the
+decision function). Above scale 1 the tiled rows repeat across the split, so only the
+scale-1 metrics compare the models fairly; the times and memory are what grow.
+
+Run from src/:  python -m benchmarks.svm --scales 1 10 100 --svc-max-scale 10
+"""
+
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ProAndTrain import evaluation, model, resampling
+from benchmarks.suite import peak_rss_mb, processed_rows
+from benchmarks.synthetic import RAW_DATA_PATH
+
+
+OPTIONS = {
+    'svc': ('svm', {}),
+    'nystroem': ('svm_approx', {'approximation': 'nystroem'}),
+    'rff': ('svm_approx', {'approximation': 'rff'}),
+}
+
+
+def run_option(option, scale, data_path, seed):
+    X, y = processed_rows(scale, data_path)
+    train, test = evaluation.fold_indices(y, 4, seed)[0]
+    scaler = evaluation._fit_scaler(X, train)
+    X_train, X_test = scaler.transform(X[train]).astype('float32'), scaler.transform(X[test]).astype('float32')
+    rows, X_synthetic, y_synthetic = resampling.resample('smote', X_train, y[train], seed)
+    X_fit, y_fit = np.concatenate([X_train[rows], X_synthetic]), np.concatenate([y[train][rows], y_synthetic])
+
+    backend, params = OPTIONS[option]
+    Model = model.MLModel(backend, params=params)
+    start = time.perf_counter()
+    Model.train(X_fit, y_fit)
+    train_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    metrics = Model.evaluate(X_test, y[test])
+    predict_seconds = time.perf_counter() - start
+    return {'rows': len(y_fit), 'train_seconds': train_seconds, 'predict_seconds': predict_seconds,
+            'peak_rss_mb': peak_rss_mb(), **metrics}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare exact SVC with the kernel-approximated SVM.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='Row multipliers of the original CSV')
+    parser.add_argument('--svc-max-scale', type=int, default=10, help='Largest scale the exact SVC is trained at')
+    parser.add_argument('--options', type=str, nargs='+', default=list(OPTIONS), choices=list(OPTIONS), help='Models to compare')
+    parser.add_argument('--data', type=str, default=RAW_DATA_PATH, help='Path to the raw CSV data file')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the split and SMOTE')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    print(f"{'scale':>6} {'option':>9} {'fit rows':>9} {'train (s)':>10} {'predict (s)':>12} {'peak RSS (MB)':>14} "
+          f"{'accuracy':>9} {'recall':>7} {'f1':>6} {'roc_auc':>8}")
+    for scale in args.scales:
+        for option in args.options:
+            if option == 'svc' and scale > args.svc_max_scale:
+                print(f"{scale:>6} {option:>9}   skipped (above --svc-max-scale)")
+                continue
+            # A fresh process per run, so each peak RSS belongs to one model
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                r = pool.submit(run_option, option, scale, args.data, args.seed).result()
+            print(f"{scale:>6} {option:>9} {r['rows']:>9} {r['train_seconds']:>10.2f} {r['predict_seconds']:>12.3f} "
+                  f"{r['peak_rss_mb']:>14.1f} {r['accuracy']:>9.3f} {r['recall']:>7.3f} {r['f1']:>6.3f} {r['roc_auc']:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
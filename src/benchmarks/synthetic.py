@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+
+RAW_DATA_PATH = "../data/risk_factors_cervical_cancer.csv"
+
+
+def scaled_raw_frame(scale, data_path=RAW_DATA_PATH, seed=42):
+    """
+    Build a synthetic raw frame with the risk_factors_cervical_cancer.csv schema.
+
+    The original rows are tiled `scale` times and shuffled, so the frame keeps
+    the real value distributions, '?' markers and Age groups at any row count.
+
+    Parameters:
+    scale (int): Number of copies of the original rows
+    data_path (str): Path to the raw CSV file
+    seed (int): Seed for the row shuffle
+
+    Returns:
+    pd.DataFrame: Raw (unprocessed) frame with scale * len(original) rows
+    """
+    raw = pd.read_csv(data_path)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(raw) * scale) % len(raw)
+    return raw.iloc[order].reset_index(drop=True)
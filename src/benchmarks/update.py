@@ -0,0 +1,59 @@
+"""
+Full retraining against MLModel.update as the training history grows and the new data stays the same size.
+
+At each scale, every backend is trained on the history, then (timed) retrained from scratch on
+history + new rows and updated with the new rows only. The delta is --new-rows rows drawn from
+the scale-1 data; a full retrain grows with the history, an update should not.
+
+Run from src/:  python -m benchmarks.update --scales 1 10 100 --new-rows 200
+"""
+
+import argparse
+import copy
+import time
+
+import numpy as np
+
+from ProAndTrain import model
+from benchmarks.suite import processed_rows
+from benchmarks.synthetic import RAW_DATA_PATH
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare full retraining with warm-start updates.')
+    parser.add_argument('--models', type=str, nargs='+', default=model.MLModel.AVAILABLE_MODELS, help='Backends to compare')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='Row multipliers of the original CSV (history)')
+    parser.add_argument('--new-rows', type=int, default=200, help='Rows of new data')
+    parser.add_argument('--svm-max-scale', type=int, default=10, help='Largest history scale the exact SVM is retrained at')
+    parser.add_argument('--data', type=str, default=RAW_DATA_PATH, help='Path to the raw CSV data file')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the new-row sample')
+    args = parser.parse_args()
+
+    X_base, y_base = processed_rows(1, args.data)
+    new = np.random.default_rng(args.seed).choice(len(y_base), size=min(args.new_rows, len(y_base)), replace=False)
+    X_new, y_new = X_base[new], y_base[new]
+
+    print(f"{'scale':>6} {'model':<14} {'history':>9} {'new':>5} {'retrain (s)':>12} {'update (s)':>11} {'speedup':>8}")
+    for scale in args.scales:
+        X, y = processed_rows(scale, args.data)
+        for name in args.models:
+            if name == 'svm' and scale > args.svm_max_scale:
+                print(f"{scale:>6} {name:<14}   skipped (above --svm-max-scale)")
+                continue
+            Model = model.MLModel(name, n_threads=1)
+            Model.train(X, y)
+
+            start = time.perf_counter()
+            model.MLModel(name, n_threads=1).train(np.concatenate([X, X_new]), np.concatenate([y, y_new]))
+            retrain_seconds = time.perf_counter() - start
+
+            Updated = model.MLModel.from_model(name, copy.deepcopy(Model.get_model()))
+            start = time.perf_counter()
+            Updated.update(X_new, y_new)
+            update_seconds = time.perf_counter() - start
+            print(f"{scale:>6} {name:<14} {len(y):>9} {len(y_new):>5} {retrain_seconds:>12.2f} {update_seconds:>11.3f} "
+                  f"{retrain_seconds / update_seconds:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
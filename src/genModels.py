@@ -1,44 +1,136 @@
-
-import numpy as np
-import pandas as pd
-
-from ProAndTrain import dataProcessing, model
-
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
-from sklearn.model_selection import train_test_split
-
-
-from imblearn.over_sampling import SMOTE
-
+"""
+Trains every MLModel backend on the cervical cancer data and writes the artifacts to genModels/.
+
+Run from src/:  python genModels.py --jobs 4
+                python genModels.py --models xgboost random_forest
+                python genModels.py --models xgboost --chunk-rows 65536 --external-memory
+
+Each backend is evaluated with stratified k-fold cross-validation (ProAndTrain.evaluation):
+the fold indices and resampled rows are built once and shared, and every (model, fold) pair
+trains in parallel on memory-mapped data. The model of the first fold (trained on
+1 - 1/k of the rows, tested on the rest) is saved as the artifact, with its holdout and
+cross-validated metrics. A timing summary is written next to the models. With --chunk-rows,
+XGBoost trains out of core from chunks of the memory-mapped rows (ProAndTrain.outOfCore).
+"""
+
+import argparse
+import json
 import os
-
-import joblib
-
-print(os.getcwd())
-
-df = pd.read_csv("../data/risk_factors_cervical_cancer.csv")
-df = dataProcessing.process_data(df)
-
-ChoosenModel = "xgboost"
-Model = model.MLModel(ChoosenModel)
-
-X = np.array(df.drop(columns = ['Biopsy'])).astype('float32')
-y = np.array(df['Biopsy']).astype('float32')
-
-scaler = StandardScaler()
-X = scaler.fit_transform(X)
-
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size = 0.2)
-X_test, x_val, y_test, y_val = train_test_split(X, y, test_size = 0.5)
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size = 0.25)
-
-smote = SMOTE(random_state=42)
-X_resampled, y_resampled = smote.fit_resample(X_train, y_train)
-
-Model.train(X_resampled, y_resampled)
-
-result_train = Model.get_score(X_train, y_train)
-result_test = Model.get_score(X_test, y_test)
-print(result_train, result_test)
-
-joblib.dump(Model.get_model(), "../genModels/" + ChoosenModel + ".pkl")
+import time
+
+from ProAndTrain import dataCache, evaluation, hyperSearch, instrumentation, model, modelRegistry, resampling
+
+
+DATA_PATH = "../data/risk_factors_cervical_cancer.csv"
+MODELS_DIR = "../genModels"
+
+# Fold whose models become the artifacts
+ARTIFACT_FOLD = 0
+
+
+def train_all(data_path=DATA_PATH, models_dir=MODELS_DIR, model_names=None, jobs=None, params_dir=None,
+              n_folds=4, seed=42, resampler='smote', chunk_rows=None, external_memory=False):
+    """
+    Cross-validates the given backends (default: all of MLModel.AVAILABLE_MODELS) and saves their artifacts.
+
+    Parameters:
+    data_path (str): Path to the raw CSV data file
+    models_dir (str): Directory the artifacts, preprocessor.npz and training_summary.json are written to
+    model_names (list): Backends to train
+    jobs (int): Number of worker processes (default: os.cpu_count())
+    params_dir (str): Directory of tuneModels.py results; backends tuned there use their best parameters
+    n_folds (int): Number of cross-validation folds
+    seed (int): Seed of the folds and the resampler
+    resampler (str): Class-imbalance strategy of the training folds, one of resampling.RESAMPLERS
+    chunk_rows (int): Train XGBoost out of core, reading this many training rows at a time (see MLModel.train_chunks)
+    external_memory (bool): With chunk_rows, also page XGBoost's quantized training matrix to disk
+
+    Returns:
+    dict: Timing summary, as written to training_summary.json
+    """
+    model_names = model_names or model.MLModel.AVAILABLE_MODELS
+    unknown = [name for name in model_names if name not in model.MLModel.AVAILABLE_MODELS]
+    if unknown:
+        raise ValueError(f"Model '{unknown[0]}' is not recognized. Available options: {', '.join(model.MLModel.AVAILABLE_MODELS)}.")
+    params = {name: hyperSearch.load_best_params(params_dir, name) if params_dir else None for name in model_names}
+
+    wall_start = time.perf_counter()
+    timings = {}
+
+    start = time.perf_counter()
+    # Memory-mapped float32 arrays, rebuilt (in chunks) only when the raw CSV or the preprocessing changes
+    _, _, feature_names = dataCache.load_processed(data_path)
+    preprocessor = dataCache.load_cached_preprocessor(data_path)
+    data_sha256 = dataCache.file_hash(data_path)
+    timings['load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    evaluation.build_fold_cache(data_path, n_folds, seed, resampler)
+    timings['folds_and_resampling'] = time.perf_counter() - start
+
+    out_of_core = {'chunk_rows': chunk_rows, 'external_memory': external_memory} if chunk_rows else None
+    results = evaluation.evaluate_models(data_path, model_names, n_folds, seed, jobs, params, keep_fold=ARTIFACT_FOLD,
+                                          resampler=resampler, out_of_core=out_of_core)
+
+    # Artifact plus metadata (feature order, scaler, training data hash, metrics) for the app's registry
+    registry = modelRegistry.ModelRegistry(models_dir)
+    for name in model_names:
+        result = results[name]
+        holdout = {metric: result['folds'][ARTIFACT_FOLD][metric] for metric in evaluation.METRICS}
+        with instrumentation.span('save', model=name):
+            registry.save(name, result['model'], feature_names, scaler=result['scaler'], data_sha256=data_sha256,
+                          metrics={'holdout': holdout, 'cross_validation': result['cv'], 'n_folds': n_folds, 'seed': seed},
+                          resampler=resampler)
+
+        cv = ', '.join(f"{metric} {result['cv'][metric]['mean']:.4f}" for metric in evaluation.METRICS if result['cv'][metric])
+        print(f"{name}: {cv} ({n_folds}-fold mean, {sum(fold['train_seconds'] for fold in result['folds']):.2f} s training)")
+
+    preprocessor.save(os.path.join(models_dir, "preprocessor.npz"))
+
+    summary = {
+        'cores': os.cpu_count(),
+        'n_folds': n_folds,
+        'seed': seed,
+        'resampler': resampler,
+        'out_of_core': out_of_core,
+        'preprocessing_seconds': timings,
+        'models': {name: {'threads': results[name]['threads'], 'params': results[name]['folds'][ARTIFACT_FOLD]['params'],
+                          'train_seconds': [fold['train_seconds'] for fold in results[name]['folds']],
+                          'cross_validation': results[name]['cv']} for name in model_names},
+        'wall_seconds': time.perf_counter() - wall_start,
+    }
+    with open(os.path.join(models_dir, 'training_summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the MLModel backends in parallel and save them for the app.')
+    parser.add_argument('--data', type=str, default=DATA_PATH, help='Path to the raw CSV data file')
+    parser.add_argument('--models-dir', type=str, default=MODELS_DIR, help='Directory to write the trained models to')
+    parser.add_argument('--models', type=str, nargs='+', help=f"Backends to train (default: {', '.join(model.MLModel.AVAILABLE_MODELS)})")
+    parser.add_argument('--jobs', type=int, help='Number of worker processes (default: the number of cores)')
+    parser.add_argument('--params-dir', type=str, help='Directory of tuneModels.py results, to train with the tuned hyperparameters')
+    parser.add_argument('--folds', type=int, default=4, help='Number of cross-validation folds (the artifact is tested on 1/folds of the rows)')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the folds and the resampler')
+    parser.add_argument('--resampler', type=str, default='smote', choices=resampling.RESAMPLERS,
+                        help='Class-imbalance strategy: SMOTE rows, class weights, random undersampling or none')
+    parser.add_argument('--chunk-rows', type=int, help='Train XGBoost out of core, reading this many training rows at a time')
+    parser.add_argument('--external-memory', action='store_true',
+                        help="With --chunk-rows, page XGBoost's quantized training matrix to disk instead of memory")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    if args.external_memory and not args.chunk_rows:
+        parser.error('--external-memory needs --chunk-rows')
+    instrumentation.enable_from_args(args)
+
+    summary = train_all(args.data, args.models_dir, args.models, args.jobs, args.params_dir, args.folds, args.seed,
+                        args.resampler, args.chunk_rows, args.external_memory)
+
+    stages = ', '.join(f"{stage} {seconds:.2f} s" for stage, seconds in summary['preprocessing_seconds'].items())
+    print(f"Preprocessing once: {stages}")
+    print(f"Trained {len(summary['models'])} models x {summary['n_folds']} folds in {summary['wall_seconds']:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
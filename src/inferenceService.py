@@ -0,0 +1,305 @@
+"""
+Local HTTP inference service for the trained models in genModels/.
+
+Run from src/:  python inferenceService.py --port 8000 --window-ms 5
+
+Endpoints:
+    POST /predict        {"model": "xgboost", "features": {...}}            -> one prediction
+    POST /predict_batch  {"model": "xgboost", "records": [{...}, {...}]}     -> one prediction per record
+    GET  /metrics        p50/p99 latency and throughput per endpoint
+    GET  /health         loaded models
+
+Features are given by training column name (see genModels/<model>.json), or as a list
+of 21 values in that order. Missing values (null) are imputed like the training data.
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from ProAndTrain import dataProcessing, instrumentation, model, modelRegistry
+
+
+class ModelScorer:
+    def __init__(self, registry, preprocessor, model_name):
+        """
+        Imputes, scales and scores feature matrices with one registry model.
+
+        :param registry: ModelRegistry holding the model.
+        :param preprocessor: Preprocessor fitted at training time.
+        :param model_name: Model name in the registry.
+        """
+        self.registry = registry
+        self.preprocessor = preprocessor
+        self.model_name = model_name
+        # The array predictor of the .model file is mapped, not unpickled, so the service's processes
+        # share one copy of the model. Batches above COMPILED_MAX_ROWS (the tree ensembles' native code
+        # is faster there) go to the pickled estimator, unpickled on the first such batch only.
+        self.predictor = registry.load_predictor(model_name)
+        self.max_predictor_rows = model.MLModel.COMPILED_MAX_ROWS.get(model_name) if self.predictor is not None else 0
+        self._estimator = None
+        self._estimator_lock = threading.Lock()
+
+    def _estimator_model(self):
+        with self._estimator_lock:
+            if self._estimator is None:
+                self._estimator = model.MLModel.from_model(self.model_name, self.registry.load(self.model_name))
+            return self._estimator
+
+    def score(self, X):
+        """
+        :param X: 2-D array of raw features, in preprocessor.feature_names order (NaN for missing).
+        :return: (predictions, probabilities) lists; probabilities are None if the model has no predict_proba.
+        """
+        X = self.registry.scale(self.model_name, self.preprocessor.transform_array(X))
+        if self.max_predictor_rows is None or len(X) <= self.max_predictor_rows:
+            # SVM and CatBoost predictors have no row limit: their estimators are not faster per row
+            with instrumentation.span('predict', model=self.model_name, source='artifact') as stage:
+                stage.add(rows=len(X))
+                probability, predictions = self._predict(self.predictor, X)
+        else:
+            # MLModel reports its own predict spans
+            probability, predictions = self._predict(self._estimator_model(), X)
+        return predictions.astype('int64').tolist(), [None] * len(predictions) if probability is None else probability.tolist()
+
+    @staticmethod
+    def _predict(scorer, X):
+        probability = scorer.predict_proba(X)
+        # Every backend with probabilities predicts the positive class above 0.5, so one model call is enough
+        return probability, scorer.predict(X) if probability is None else probability > 0.5
+
+
+class MicroBatcher:
+    def __init__(self, score_fn, window_ms=5.0, max_batch=256):
+        """
+        Coalesces concurrent single-row requests into one matrix call.
+
+        The first queued row opens a window of window_ms milliseconds; every row arriving
+        in that window (up to max_batch) is scored in the same call.
+
+        :param score_fn: Function taking a 2-D array and returning (predictions, probabilities).
+        :param window_ms: Collection window in milliseconds.
+        :param max_batch: Largest number of rows per call.
+        """
+        self.score_fn = score_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, row):
+        """
+        Queues one row and waits for its (prediction, probability).
+        """
+        future = Future()
+        self._queue.put((row, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._score(batch)
+
+    def _score(self, batch):
+        """
+        Scores a batch of (row, future) pairs; if the call raises, bisects the batch so that
+        only the rows that fail on their own get the exception.
+        """
+        try:
+            predictions, probabilities = self.score_fn(np.vstack([row for row, _ in batch]))
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            middle = len(batch) // 2
+            self._score(batch[:middle])
+            self._score(batch[middle:])
+            return
+        for (_, future), prediction, probability in zip(batch, predictions, probabilities):
+            future.set_result((prediction, probability))
+
+
+class LatencyStats:
+    def __init__(self, window=10000):
+        """
+        Request latencies (the last `window` of them), row counts and failed requests for one endpoint.
+        """
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.rows = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, seconds, rows=1):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.requests += 1
+            self.rows += rows
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def summary(self):
+        with self._lock:
+            latencies = np.array(self.latencies)
+            requests, rows, errors = self.requests, self.rows, self.errors
+        uptime = time.perf_counter() - self.started
+        return {
+            'requests': requests,
+            'rows': rows,
+            'errors': errors,
+            'p50_ms': float(np.percentile(latencies, 50) * 1000) if len(latencies) else None,
+            'p99_ms': float(np.percentile(latencies, 99) * 1000) if len(latencies) else None,
+            'requests_per_sec': requests / uptime,
+            'rows_per_sec': rows / uptime,
+        }
+
+
+class InferenceService:
+    def __init__(self, models_dir, model_names=None, window_ms=5.0, max_batch=256):
+        """
+        Preloads the models and their micro-batchers.
+
+        :param models_dir: Directory of the model artifacts and preprocessor.npz.
+        :param model_names: Models to serve (default: every artifact in models_dir).
+        :param window_ms: Micro-batching window in milliseconds.
+        :param max_batch: Largest micro-batch.
+        """
+        registry = modelRegistry.get_registry(models_dir)
+        self.preprocessor = dataProcessing.Preprocessor.load(os.path.join(models_dir, 'preprocessor.npz'))
+        self.feature_names = self.preprocessor.feature_names
+
+        self.scorers = {}
+        self.batchers = {}
+        for name in model_names or registry.available():
+            self.scorers[name] = ModelScorer(registry, self.preprocessor, name)
+            self.batchers[name] = MicroBatcher(self.scorers[name].score, window_ms, max_batch)
+        self.default_model = next(iter(self.scorers))
+
+        self.stats = {'/predict': LatencyStats(), '/predict_batch': LatencyStats()}
+
+    def _model_name(self, payload):
+        name = payload.get('model', self.default_model)
+        if name not in self.scorers:
+            raise ValueError(f"Model '{name}' is not served. Available models: {', '.join(self.scorers)}.")
+        return name
+
+    def _row(self, features):
+        """
+        One feature vector in training order from a {name: value} dict or a list of values.
+        """
+        if isinstance(features, dict):
+            unknown = set(features) - set(self.feature_names)
+            if unknown:
+                raise ValueError(f"Unknown features: {', '.join(sorted(unknown))}.")
+            features = [features.get(name) for name in self.feature_names]
+        if len(features) != len(self.feature_names):
+            raise ValueError(f"Expected {len(self.feature_names)} features, got {len(features)}.")
+        return np.array([np.nan if value is None else value for value in features], dtype='float64')
+
+    def predict(self, payload):
+        name = self._model_name(payload)
+        prediction, probability = self.batchers[name].submit(self._row(payload['features']))
+        return {'model': name, 'prediction': prediction, 'probability': probability}
+
+    def predict_batch(self, payload):
+        name = self._model_name(payload)
+        X = np.vstack([self._row(record) for record in payload['records']])
+        predictions, probabilities = self.scorers[name].score(X)
+        return {'model': name, 'predictions': predictions, 'probabilities': probabilities}
+
+    def metrics(self):
+        return {endpoint: stats.summary() for endpoint, stats in self.stats.items()}
+
+
+class InferenceServer(ThreadingHTTPServer):
+    # Concurrent clients are the point of micro-batching; the default backlog of 5 resets them
+    request_queue_size = 128
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                self._send(200, service.metrics())
+            elif self.path == '/health':
+                self._send(200, {'models': list(service.scorers), 'features': service.feature_names})
+            else:
+                self._send(404, {'error': f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            endpoints = {'/predict': service.predict, '/predict_batch': service.predict_batch}
+            if self.path not in endpoints:
+                self._send(404, {'error': f"Unknown path {self.path}"})
+                return
+
+            start = time.perf_counter()
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                result = endpoints[self.path](payload)
+            except (ValueError, KeyError, TypeError) as e:
+                service.stats[self.path].record_error()
+                self._send(400, {'error': str(e)})
+                return
+            except Exception as e:
+                # Scoring failures (e.g. a backend error or MemoryError) still get a response
+                service.stats[self.path].record_error()
+                self._send(500, {'error': f"{type(e).__name__}: {e}"})
+                return
+
+            self._send(200, result)
+            rows = len(result['predictions']) if 'predictions' in result else 1
+            service.stats[self.path].record(time.perf_counter() - start, rows)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the trained models over HTTP with request micro-batching.')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to bind')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+    parser.add_argument('--models-dir', type=str, default='../genModels', help='Directory of the trained models')
+    parser.add_argument('--models', type=str, nargs='+', help='Models to serve (default: all in the models directory)')
+    parser.add_argument('--window-ms', type=float, default=5.0, help='Micro-batching window in milliseconds')
+    parser.add_argument('--max-batch', type=int, default=256, help='Largest micro-batch')
+    args = parser.parse_args()
+
+    service = InferenceService(args.models_dir, args.models, args.window_ms, args.max_batch)
+    server = InferenceServer((args.host, args.port), make_handler(service))
+    print(f"Serving {', '.join(service.scorers)} on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,73 +1,83 @@
 import streamlit as st
-import joblib
-import shap  # Import SHAP library
-import matplotlib.pyplot as plt
 
-import numpy as np
+import os
 
-import pandas as pd
+from ProAndTrain import SHAPexpls, dataCache, dataProcessing, evaluation, explainerCache, modelRegistry, shapPlots
 
-from sklearn.metrics import roc_auc_score, accuracy_score, precision_score, recall_score, f1_score, roc_curve
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
+
+def report_image(name):
+    # SHAPexpls.py writes PNGs, or JPEG/WebP drafts
+    for extension in ("png", "jpg", "webp"):
+        path = os.path.join("shap_results", f"{name}.{extension}")
+        if os.path.exists(path):
+            return path
+    return None
 
 
 def show_images():
-    # Load images (make sure to replace these with your actual image paths)
-    image_paths = ["shap_results/shap_bar_plot.jpg", "shap_results/shap_decision_plot.jpg", "shap_results/shap_force_plot.jpg", "shap_results/shap_summary_plot.jpg"]
+    # Plots of the last SHAPexpls.py report
+    names = ["shap_summary_plot", "shap_bar_plot", "shap_decision_plot", "shap_force_plot_example_1"]
+    image_paths = {name: report_image(name) for name in names}
 
     # Create a 2x2 layout to display images
     col1, col2 = st.columns(2)
 
-    with col1:
-        st.image(image_paths[0], caption="shap_summary_plot", use_container_width=True)
-        st.image(image_paths[1], caption="shap_decision_plot", use_container_width=True)
+    for column, name in zip([col1, col2, col1, col2], names):
+        with column:
+            if image_paths[name] is None:
+                st.info(f"{name} has not been generated yet (run SHAPexpls.py).")
+            else:
+                st.image(image_paths[name], caption=name, use_container_width=True)
 
-    with col2:
-        st.image(image_paths[2], caption="shap_force_plot", use_column_width=True)
-        st.image(image_paths[3], caption="shap_summary_plot", use_container_width=True)
 
-df = pd.read_csv("data/output.csv")
+@st.cache_resource
+def artifact_train_rows(data_path, n_folds, seed, resampler, data_mtime_ns):
+    # Training rows of an artifact: the first fold of the k-fold cache genModels.py trained it on.
+    # Cached across reruns; a changed CSV (data_mtime_ns) or retrained artifact gives a new key.
+    return evaluation.load_fold(evaluation.build_fold_cache(data_path, n_folds, seed, resampler), 0)['train']
 
-ChoosenModel = "svm"
 
-X = np.array(df.drop(columns = ['Biopsy'])).astype('float32')
-y = np.array(df['Biopsy']).astype('float32')
+@st.cache_resource
+def load_preprocessor(path, mtime_ns):
+    # Reloaded only when genModels.py writes a new preprocessor (mtime_ns)
+    return dataProcessing.Preprocessor.load(path)
+
+
+def fold_settings(metadata):
+    # Fold settings recorded with the artifact; genModels.py's defaults for artifacts saved without them
+    metrics = metadata.get('metrics') or {}
+    return metrics.get('n_folds', 4), metrics.get('seed', 42), metadata.get('resampler') or 'smote'
+
+# Memory-mapped processed data, so a rerun does not parse any CSV
+X, y, feature_names = dataCache.load_processed("data/risk_factors_cervical_cancer.csv")
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size = 0.2)
-X_test, x_val, y_test, y_val = train_test_split(X, y, test_size = 0.5)
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size = 0.25)
+ChoosenModel = "svm"
 
 # Streamlit App Title with a medical theme
 st.title("🏥 Cervical Cancer Risk Assessment Tool")
 
+# Trained artifacts of genModels/, loaded once per process and kept in an LRU cache across reruns
+registry = modelRegistry.get_registry("genModels")
+model_names = registry.available()
+model_labels = [modelRegistry.MODEL_LABELS.get(name, name) for name in model_names]
+
 # Choose machine learning model with a sleek radio button
 choice = st.radio(
     "🔬 Select Prediction Model:",
-    ("Random Forest Classifier", "GBoost Classifier", "SVM", "CatBoost Classifier"),
+    model_labels,
     key="model_choice",
     index=0,
     help="Select the machine learning model to predict your cervical cancer risk.",
 )
 
 # Load selected model
-model_mapping = {
-    "Random Forest Classifier": "genModels/random_forest.pkl",
-    "GBoost Classifier": "genModels/xgboost.pkl",
-    "SVM": "genModels/svm.pkl",
-    "CatBoost Classifier": "genModels/catboost.pkl",
-}
-model = joblib.load(model_mapping.get(choice))
-
-# Load the SHAP explainer (This will be model-specific)
-if choice == "Random Forest Classifier":
-    explainer = shap.TreeExplainer(model)
-elif choice == "GBoost Classifier":
-    explainer = shap.TreeExplainer(model)
-elif choice == "SVM":
-    explainer = shap.KernelExplainer(model.predict, X_train)  # X_train should be the training data
-elif choice == "CatBoost Classifier":
-    explainer = shap.TreeExplainer(model)
+model_name = model_names[model_labels.index(choice)]
+# Array predictor mapped from the artifact's .model file, shared by every session and process;
+# the pickle is only deserialized when there is no .model file (or for the SHAP explanation)
+predictor = registry.load_predictor(model_name)
+
+# Imputation tables fitted at training time, so a submission is imputed like the training data
+preprocessor = load_preprocessor("genModels/preprocessor.npz", os.stat("genModels/preprocessor.npz").st_mtime_ns)
 
 # Custom CSS for medical theme appearance
 st.markdown("""
@@ -235,6 +245,14 @@ for i in range(len(input_list)):
     if isinstance(input_list[i], str):
         input_list[i] = 1 if input_list[i] == "Yes" else 0
 
+# Training column of each entry of input_list ("Dx" is asked last but comes before the test results in the data)
+input_features = dict(zip([
+    "Age", "Number of sexual partners", "First sexual intercourse", "Num of pregnancies", "Smokes", "Smokes (years)",
+    "Smokes (packs/year)", "Hormonal Contraceptives", "Hormonal Contraceptives (years)", "IUD", "IUD (years)", "STDs",
+    "STDs (number)", "STDs: Number of diagnosis", "Dx:Cancer", "Dx:CIN", "Dx:HPV", "Hinselmann", "Schiller", "Citology", "Dx"
+], input_list))
+model_input = [input_features[feature] for feature in preprocessor.feature_names]
+
 # Submit Button with medical styling
 if st.button("Generate Risk Assessment", key="submit_button"):
     # Show entered information in a collapsible section
@@ -253,7 +271,9 @@ if st.button("Generate Risk Assessment", key="submit_button"):
             st.write(f"**{feature}:** {value}")
     
     # Make the prediction
-    prediction = model.predict([input_list])
+    patient_row = preprocessor.transform_array(model_input)
+    scaled_row = registry.scale(model_name, patient_row)
+    prediction = (predictor or registry.load(model_name)).predict(scaled_row)
     
     # Display prediction result with appropriate styling
     st.write("-" * 40)
@@ -276,6 +296,14 @@ if st.button("Generate Risk Assessment", key="submit_button"):
         </div>
         """, unsafe_allow_html=True)
     
+    # Live explanation of this assessment; the explainer is built once per model artifact and reused
+    with st.expander("Why this assessment? (SHAP explanation)"):
+        data_path = "data/risk_factors_cervical_cancer.csv"
+        train_rows = artifact_train_rows(data_path, *fold_settings(registry.metadata(model_name)), os.stat(data_path).st_mtime_ns)
+        explainer = explainerCache.get_explainer_cache(registry).get(model_name, X[train_rows])
+        values, expected_value = SHAPexpls.explain_patient(explainer, scaled_row)
+        st.pyplot(shapPlots.patient_figure(values, expected_value, patient_row[0], preprocessor.feature_names))
+
     # Disclaimer
     st.markdown("""
     <div style='background-color: #f5f5f5; padding: 10px; border-radius: 5px; margin-top: 20px; font-size: 14px;'>
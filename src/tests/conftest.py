@@ -0,0 +1,64 @@
+"""
+Shared fixtures of the tests: the 858-row CSV, its scaled features and small trained models.
+
+Run from src/:  python -m pytest -q tests
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ProAndTrain import dataProcessing, model
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data')
+RAW_DATA_PATH = os.path.join(DATA_DIR, 'risk_factors_cervical_cancer.csv')
+# Written by the original row-wise process_data
+REFERENCE_PATH = os.path.join(DATA_DIR, 'output.csv')
+
+# Small models, so the whole suite trains in seconds
+BACKEND_PARAMS = {
+    'random_forest': {'n_estimators': 50, 'random_state': 42},
+    'xgboost': {'n_estimators': 50, 'random_state': 42},
+    'catboost': {'iterations': 50, 'random_seed': 42},
+    'svm': {},
+}
+
+
+@pytest.fixture(scope='session')
+def raw():
+    return pd.read_csv(RAW_DATA_PATH)
+
+
+@pytest.fixture(scope='session')
+def features(raw):
+    from sklearn.preprocessing import StandardScaler
+
+    processed = dataProcessing.Preprocessor().fit_transform(raw)
+    X = processed.drop(columns='Biopsy').to_numpy(dtype='float32')
+    y = processed['Biopsy'].to_numpy(dtype='float32')
+    return StandardScaler().fit_transform(X).astype('float32'), y
+
+
+# Shared by the compiled-predictor and the artifact tests, so every backend is trained once
+@pytest.fixture(scope='session', params=list(BACKEND_PARAMS))
+def trained(request, features):
+    X, y = features
+    Model = model.MLModel(request.param, n_threads=1, params=BACKEND_PARAMS[request.param])
+    Model.train(X, y)
+    return Model
+
+
+def assert_same_predictions(expected_probability, probability, expected_labels, labels):
+    np.testing.assert_allclose(probability, expected_probability, rtol=0, atol=1e-6)
+    # Rows on the 0.5 boundary may round either way in float32
+    decided = np.abs(expected_probability - 0.5) > 1e-6
+    np.testing.assert_array_equal(np.asarray(labels)[decided], np.asarray(expected_labels)[decided])
+
+
+@pytest.fixture(scope='session')
+def cache_dir(tmp_path_factory):
+    # A data cache of the CSV outside the repository's own cache directory
+    return str(tmp_path_factory.mktemp('cache'))
@@ -0,0 +1,28 @@
+"""
+Compiled tree-ensemble predictors: same probabilities and labels as the estimators they were compiled from.
+"""
+
+import numpy as np
+import pytest
+
+from ProAndTrain import compiledTrees
+from conftest import assert_same_predictions
+
+
+def test_compiled_predictor_matches_estimator(trained, features):
+    X, _ = features
+    if trained.model_name not in ('random_forest', 'xgboost', 'catboost'):
+        pytest.skip('only tree ensembles are compiled')
+    compiled = compiledTrees.compile_model(trained.get_model())
+    expected = trained.get_model().predict_proba(X)[:, 1]
+    assert_same_predictions(expected, compiled.predict_proba(X), trained.get_model().predict(X), compiled.predict(X))
+
+
+def test_mlmodel_uses_compiled_predictor_for_small_batches(trained, features):
+    X, _ = features
+    expected = trained.decision_scores(X[:16])
+    trained.compile()
+    try:
+        np.testing.assert_allclose(trained.decision_scores(X[:16]), expected, rtol=0, atol=1e-6)
+    finally:
+        trained.compiled = None
@@ -0,0 +1,53 @@
+"""
+Regression tests of the vectorized preprocessing against the original row-wise process_data output.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ProAndTrain import dataProcessing
+from benchmarks.imputation import legacy_impute
+from benchmarks.synthetic import scaled_raw_frame
+from conftest import RAW_DATA_PATH, REFERENCE_PATH
+
+
+def test_preprocessor_matches_process_data_reference(raw):
+    processed = dataProcessing.Preprocessor().fit_transform(raw)
+    with open(REFERENCE_PATH, newline='') as f:
+        assert processed.to_csv(index=False) == f.read()
+
+
+def test_group_means_match_row_wise_imputation(raw):
+    df = dataProcessing.select_model_columns(raw)
+    columns = dataProcessing.MEAN_IMPUTED_COLUMNS
+    expected = legacy_impute(df.copy())[columns].to_numpy()
+    imputed = dataProcessing.impute_group_means(df.copy(), dataProcessing.compute_group_means(df))[columns].to_numpy()
+    np.testing.assert_array_equal(imputed, expected)
+
+
+@pytest.mark.parametrize('scale', [1, 3])
+def test_fit_chunks_matches_fit(scale):
+    # At 3x most Age groups have more than the 128 rows np.sum adds before splitting
+    df = scaled_raw_frame(scale, RAW_DATA_PATH)
+    fitted = dataProcessing.Preprocessor().fit(df)
+    chunked = dataProcessing.Preprocessor().fit_chunks(lambda: (df.iloc[start:start + 100] for start in range(0, len(df), 100)))
+
+    assert chunked.columns == fitted.columns
+    assert chunked.float_columns == fitted.float_columns
+    np.testing.assert_array_equal(chunked.mean_table, fitted.mean_table)
+    for column, table in fitted.mode_tables.items():
+        np.testing.assert_array_equal(chunked.mode_tables[column], table)
+
+
+def test_preprocessor_round_trip_and_transform_array(raw, tmp_path):
+    preprocessor = dataProcessing.Preprocessor().fit(raw)
+    path = str(tmp_path / 'preprocessor.npz')
+    preprocessor.save(path)
+    loaded = dataProcessing.Preprocessor.load(path)
+
+    expected = preprocessor.transform(raw)
+    pd.testing.assert_frame_equal(loaded.transform(raw), expected)
+
+    raw_features = dataProcessing.select_model_columns(raw)[loaded.feature_names].to_numpy(dtype='float64')
+    np.testing.assert_array_equal(loaded.transform_array(raw_features), expected[loaded.feature_names].to_numpy(dtype='float64'))
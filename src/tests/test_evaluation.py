@@ -0,0 +1,62 @@
+"""
+Shared fold cache: built once per data and fold settings, and gathered into the same matrices by every reader.
+"""
+
+import os
+
+import numpy as np
+
+from ProAndTrain import dataCache, evaluation
+from conftest import RAW_DATA_PATH
+
+
+def fold_files_mtime(fold_dir):
+    return {name: os.stat(os.path.join(fold_dir, name)).st_mtime_ns for name in sorted(os.listdir(fold_dir))}
+
+
+def test_fold_cache_is_reused_until_settings_change(cache_dir):
+    fold_dir = evaluation.build_fold_cache(RAW_DATA_PATH, n_folds=3, cache_dir=cache_dir)
+    written = fold_files_mtime(fold_dir)
+
+    assert evaluation.build_fold_cache(RAW_DATA_PATH, n_folds=3, cache_dir=cache_dir) == fold_dir
+    assert fold_files_mtime(fold_dir) == written
+    assert evaluation.build_fold_cache(RAW_DATA_PATH, n_folds=3, resampler='none', cache_dir=cache_dir) != fold_dir
+
+
+def test_folds_partition_the_rows(cache_dir):
+    _, y, _ = dataCache.load_processed(RAW_DATA_PATH, cache_dir)
+    fold_dir = evaluation.build_fold_cache(RAW_DATA_PATH, n_folds=3, cache_dir=cache_dir)
+    folds = [evaluation.load_fold(fold_dir, i) for i in range(3)]
+
+    np.testing.assert_array_equal(np.sort(np.concatenate([fold['test'] for fold in folds])), np.arange(len(y)))
+    for fold in folds:
+        assert np.intersect1d(fold['train'], fold['test']).size == 0
+        assert np.isin(fold['fit'], fold['train']).all()
+
+
+def test_fold_data_matches_direct_scaling(cache_dir):
+    from sklearn.preprocessing import StandardScaler
+
+    X, y, _ = dataCache.load_processed(RAW_DATA_PATH, cache_dir)
+    fold = evaluation.load_fold(evaluation.build_fold_cache(RAW_DATA_PATH, n_folds=3, cache_dir=cache_dir), 1)
+    X_fit, y_fit, X_test, y_test, _ = evaluation.fold_data(X, y, fold)
+
+    scaler = StandardScaler().fit(X[fold['train']])
+    n_fit = len(fold['fit'])
+    np.testing.assert_array_equal(X_fit[:n_fit], scaler.transform(X[fold['fit']]).astype('float32'))
+    np.testing.assert_array_equal(X_fit[n_fit:], fold['X_synthetic'])
+    np.testing.assert_array_equal(y_fit, np.concatenate([y[fold['fit']], fold['y_synthetic']]))
+    np.testing.assert_array_equal(X_test, scaler.transform(X[fold['test']]).astype('float32'))
+    np.testing.assert_array_equal(y_test, y[fold['test']])
+
+
+def test_fold_chunks_match_fold_data(cache_dir):
+    X, y, _ = dataCache.load_processed(RAW_DATA_PATH, cache_dir)
+    fold = evaluation.load_fold(evaluation.build_fold_cache(RAW_DATA_PATH, n_folds=3, cache_dir=cache_dir), 0)
+    X_fit, y_fit, X_test, _, _ = evaluation.fold_data(X, y, fold)
+    chunks, X_test_chunked, _, _ = evaluation.fold_chunks(X, y, fold, chunk_rows=100)
+
+    X_chunks, y_chunks = zip(*chunks())
+    np.testing.assert_allclose(np.concatenate(X_chunks), X_fit, rtol=1e-6, atol=1e-6)
+    np.testing.assert_array_equal(np.concatenate(y_chunks), y_fit)
+    np.testing.assert_allclose(X_test_chunked, X_test, rtol=1e-6, atol=1e-6)
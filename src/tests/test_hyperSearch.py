@@ -0,0 +1,32 @@
+"""
+Tuning folds: the evaluation folds, with an early-stopping split carved out of each fold's training rows.
+"""
+
+import numpy as np
+
+from ProAndTrain import dataCache, evaluation, hyperSearch
+from conftest import RAW_DATA_PATH
+
+
+def test_tuning_folds_reuse_the_evaluation_folds(cache_dir):
+    X, y, _ = dataCache.load_processed(RAW_DATA_PATH, cache_dir)
+    fold_dir = evaluation.build_fold_cache(RAW_DATA_PATH, n_folds=3, cache_dir=cache_dir)
+    folds = hyperSearch.tuning_folds(X, y, fold_dir, stop_size=0.2)
+
+    assert len(folds) == 3
+    for i, tuning in enumerate(folds):
+        fold = evaluation.load_fold(fold_dir, i)
+        X_fit, y_fit, X_test, y_test, _ = evaluation.fold_data(X, y, fold)
+        n_synthetic = len(fold['y_synthetic'])
+
+        np.testing.assert_array_equal(tuning['X_eval'], X_test)
+        np.testing.assert_array_equal(tuning['y_eval'], y_test)
+        # The stop rows are held out of the original rows only; the synthetic rows stay in X_fit
+        assert len(tuning['y_stop']) + len(tuning['y_fit']) == len(y_fit)
+        assert abs(len(tuning['y_stop']) - 0.2 * len(fold['fit'])) <= 1
+        np.testing.assert_array_equal(tuning['X_fit'][-n_synthetic:], fold['X_synthetic'])
+        assert set(np.unique(tuning['y_stop'])) == {0, 1}
+
+        # Every training row ends up in exactly one of the two parts
+        rows = np.concatenate([tuning['X_fit'][:-n_synthetic], tuning['X_stop']])
+        np.testing.assert_array_equal(rows[np.lexsort(rows.T)], X_fit[:-n_synthetic][np.lexsort(X_fit[:-n_synthetic].T)])
@@ -0,0 +1,24 @@
+"""
+Round trip of the exported .model artifacts: the mapped predictors must score like the estimators they were exported from.
+"""
+
+import numpy as np
+
+from ProAndTrain import modelArtifact
+from conftest import assert_same_predictions
+
+
+def test_model_artifact_round_trip(trained, features, tmp_path):
+    X, _ = features
+    estimator = trained.get_model()
+    path = str(tmp_path / f'{trained.model_name}{modelArtifact.EXTENSION}')
+    modelArtifact.save(path, modelArtifact.export_model(estimator), trained.model_name)
+    predictor = modelArtifact.load(path)
+
+    assert predictor.header['model_name'] == trained.model_name
+    if trained.model_name == 'svm':
+        np.testing.assert_allclose(predictor.decision_function(X), estimator.decision_function(X), rtol=1e-9, atol=1e-9)
+        np.testing.assert_array_equal(predictor.predict(X), estimator.predict(X))
+    else:
+        expected = estimator.predict_proba(X)[:, 1]
+        assert_same_predictions(expected, predictor.predict_proba(X), estimator.predict(X), predictor.predict(X))
@@ -0,0 +1,63 @@
+"""
+Warm-start updates: a model updated with new rows scores a holdout about as well as one retrained on all rows.
+"""
+
+import numpy as np
+import pytest
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+
+from ProAndTrain import model
+from conftest import BACKEND_PARAMS
+
+
+# Largest holdout ROC-AUC an update may lose against a full retrain (about 0.035 at most on this data)
+MAX_AUC_LOSS = 0.06
+
+
+@pytest.fixture(scope='module')
+def splits(features):
+    _, y = features
+    rows = np.arange(len(y))
+    old, rest = train_test_split(rows, test_size=0.5, stratify=y, random_state=0)
+    new, holdout = train_test_split(rest, test_size=0.5, stratify=y[rest], random_state=0)
+    return old, new, holdout
+
+
+def holdout_auc(Model, X, y, holdout):
+    return roc_auc_score(y[holdout], Model.decision_scores(X[holdout]))
+
+
+@pytest.mark.parametrize('model_name', list(BACKEND_PARAMS))
+def test_update_scores_the_holdout_like_a_retrain(features, splits, model_name):
+    X, y = features
+    old, new, holdout = splits
+
+    updated = model.MLModel(model_name, n_threads=1, params=BACKEND_PARAMS[model_name])
+    updated.train(X[old], y[old])
+    updated.update(X[new], y[new])
+
+    retrained = model.MLModel(model_name, n_threads=1, params=BACKEND_PARAMS[model_name])
+    retrained.train(X[np.concatenate([old, new])], y[np.concatenate([old, new])])
+
+    assert holdout_auc(updated, X, y, holdout) > 0.85
+    assert holdout_auc(updated, X, y, holdout) >= holdout_auc(retrained, X, y, holdout) - MAX_AUC_LOSS
+
+
+def test_update_adds_trees(features, splits):
+    X, y = features
+    old, new, _ = splits
+    Model = model.MLModel('random_forest', n_threads=1, params=BACKEND_PARAMS['random_forest'])
+    Model.train(X[old], y[old])
+    Model.update(X[new], y[new], n_estimators=10)
+    assert len(Model.get_model().estimators_) == BACKEND_PARAMS['random_forest']['n_estimators'] + 10
+
+
+def test_random_forest_update_needs_both_classes(features, splits):
+    X, y = features
+    old, new, _ = splits
+    Model = model.MLModel('random_forest', n_threads=1, params=BACKEND_PARAMS['random_forest'])
+    Model.train(X[old], y[old])
+    negatives = new[y[new] == 0]
+    with pytest.raises(ValueError, match='every class'):
+        Model.update(X[negatives], y[negatives])
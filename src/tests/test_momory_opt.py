@@ -0,0 +1,26 @@
+"""
+Schema reads: the same processed values as process_data, and nullable narrowed frames that convert back to NaN.
+"""
+
+import numpy as np
+import pandas as pd
+
+from ProAndTrain import dataCache, momory_opt
+from conftest import RAW_DATA_PATH, REFERENCE_PATH
+
+
+def test_cached_features_match_process_data_reference(cache_dir):
+    X, y, feature_names = dataCache.load_processed(RAW_DATA_PATH, cache_dir)
+    reference = pd.read_csv(REFERENCE_PATH)
+    np.testing.assert_array_equal(X, reference[feature_names].to_numpy(dtype='float32'))
+    np.testing.assert_array_equal(y, reference['Biopsy'].to_numpy(dtype='float32'))
+
+
+def test_narrowed_frame_keeps_missing_values_as_nan():
+    frame = pd.DataFrame({'Age': [18.0, np.nan, 300.0], 'Smokes': [0.0, 1.0, np.nan], 'IUD (years)': [0.5, np.nan, 2.0]})
+    narrowed = momory_opt.narrow_to_schema(frame)
+
+    assert str(narrowed['Smokes'].dtype) == 'UInt8'
+    # 300 is out of UInt8's range, so Age keeps its values as Float32
+    assert str(narrowed['Age'].dtype) == 'Float32'
+    np.testing.assert_array_equal(narrowed.to_numpy(dtype='float32', na_value=np.nan), frame.to_numpy(dtype='float32'))
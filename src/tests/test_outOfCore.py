@@ -0,0 +1,37 @@
+"""
+Out-of-core XGBoost training: the same model from chunks as from the whole matrix.
+"""
+
+import numpy as np
+import pytest
+
+from ProAndTrain import model, outOfCore
+from conftest import BACKEND_PARAMS
+
+
+# With fewer rows than max_bin per feature the merged per-chunk sketches give the same split candidates
+MAX_SCORE_DIFFERENCE = 1e-6
+
+
+def train_both(X, y, chunk_rows, **chunk_options):
+    in_memory = model.MLModel('xgboost', n_threads=1, params=BACKEND_PARAMS['xgboost'])
+    in_memory.train(X, y)
+    chunked = model.MLModel('xgboost', n_threads=1, params=BACKEND_PARAMS['xgboost'])
+    chunked.train_chunks(outOfCore.array_chunks(X, y, chunk_rows=chunk_rows), **chunk_options)
+    return in_memory, chunked
+
+
+@pytest.mark.parametrize('external_memory', [False, True])
+def test_train_chunks_matches_train(features, tmp_path, external_memory):
+    X, y = features
+    options = {'external_memory': external_memory, 'cache_dir': str(tmp_path)} if external_memory else {}
+    in_memory, chunked = train_both(X, y, chunk_rows=200, **options)
+
+    np.testing.assert_allclose(chunked.decision_scores(X), in_memory.decision_scores(X), atol=MAX_SCORE_DIFFERENCE)
+    assert chunked.get_model().get_booster().num_boosted_rounds() == BACKEND_PARAMS['xgboost']['n_estimators']
+
+
+def test_train_chunks_rejects_other_backends(features):
+    X, y = features
+    with pytest.raises(ValueError, match='cannot be trained from chunks'):
+        model.MLModel('random_forest', n_threads=1).train_chunks(outOfCore.array_chunks(X, y))
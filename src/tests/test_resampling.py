@@ -0,0 +1,54 @@
+"""
+Class balance of every resampler on the processed training rows.
+"""
+
+import numpy as np
+import pytest
+
+from ProAndTrain import resampling
+
+
+def balance(rows, X_synthetic, y_synthetic, y):
+    y_resampled = np.concatenate([y[rows], y_synthetic])
+    assert len(X_synthetic) == len(y_synthetic)
+    return int((y_resampled == 0).sum()), int((y_resampled == 1).sum())
+
+
+@pytest.mark.parametrize('strategy', ['smote', 'undersample'])
+def test_balancing_resamplers_equalize_the_classes(features, strategy):
+    X, y = features
+    rows, X_synthetic, y_synthetic = resampling.resample(strategy, X, y)
+
+    negatives, positives = balance(rows, X_synthetic, y_synthetic, y)
+    assert negatives == positives
+    # The minority (positive) rows are all kept
+    assert positives >= int((y == 1).sum())
+
+
+@pytest.mark.parametrize('strategy', ['class_weight', 'none'])
+def test_weighting_resamplers_keep_the_rows(features, strategy):
+    X, y = features
+    rows, X_synthetic, y_synthetic = resampling.resample(strategy, X, y)
+
+    np.testing.assert_array_equal(rows, np.arange(len(y)))
+    assert len(X_synthetic) == 0
+    assert balance(rows, X_synthetic, y_synthetic, y) == (int((y == 0).sum()), int((y == 1).sum()))
+
+
+def test_smote_rows_lie_between_minority_rows(features):
+    X, y = features
+    _, X_synthetic, _ = resampling.resample('smote', X, y)
+    minority = X[y == 1]
+    assert (X_synthetic >= minority.min(axis=0) - 1e-6).all() and (X_synthetic <= minority.max(axis=0) + 1e-6).all()
+
+
+def test_class_weight_params_balance_xgboost(features):
+    _, y = features
+    params = resampling.class_weight_params('xgboost', y)
+    assert params['scale_pos_weight'] * (y == 1).sum() == pytest.approx((y == 0).sum())
+
+
+def test_unknown_resampler_is_rejected(features):
+    X, y = features
+    with pytest.raises(ValueError, match='not recognized'):
+        resampling.resample('adasyn', X, y)
@@ -0,0 +1,61 @@
+"""
+SHAP store hits and misses: stored rows are found by content, other models and settings start empty.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ProAndTrain import shapStore
+
+
+FEATURES = ['a', 'b', 'c']
+
+
+@pytest.fixture
+def rows():
+    return pd.DataFrame(np.arange(18, dtype='float64').reshape(6, 3), columns=FEATURES)
+
+
+def test_stored_rows_are_hits_in_any_order(rows, tmp_path):
+    hashes = shapStore.row_hashes(rows)
+    values = rows.to_numpy() / 10
+    store = shapStore.ShapStore(str(tmp_path), 'f' * 64, FEATURES, settings={'nsamples': 100})
+    assert store.missing(hashes).all()
+
+    store.add(hashes[:4], values[:4], expected_value=0.25)
+    np.testing.assert_array_equal(store.missing(hashes), [False] * 4 + [True] * 2)
+
+    # Reopened from disk, the rows are found by content, not by position
+    reopened = shapStore.ShapStore(str(tmp_path), 'f' * 64, FEATURES, settings={'nsamples': 100})
+    np.testing.assert_array_equal(reopened.get(hashes[[3, 0]]), values[[3, 0]])
+    assert reopened.expected_value == 0.25
+    with pytest.raises(KeyError):
+        reopened.get(hashes)
+
+
+def test_added_rows_are_stored_once_and_keep_the_expected_value(rows, tmp_path):
+    hashes = shapStore.row_hashes(rows)
+    values = rows.to_numpy() / 10
+    store = shapStore.ShapStore(str(tmp_path), 'f' * 64, FEATURES)
+    store.add(hashes[:4], values[:4], expected_value=0.25)
+    store.add(hashes[2:], values[2:], expected_value=0.5)
+
+    assert len(store.rows) == len(rows)
+    np.testing.assert_array_equal(store.get(hashes), values)
+    assert store.expected_value == 0.25
+
+
+def test_other_model_or_settings_start_empty(rows, tmp_path):
+    hashes = shapStore.row_hashes(rows)
+    shapStore.ShapStore(str(tmp_path), 'f' * 64, FEATURES, settings={'background_sha256': '1'}).add(hashes, rows.to_numpy())
+
+    assert shapStore.ShapStore(str(tmp_path), 'f' * 64, FEATURES, settings={'background_sha256': '2'}).missing(hashes).all()
+    assert shapStore.ShapStore(str(tmp_path), 'e' * 64, FEATURES, settings={'background_sha256': '1'}).missing(hashes).all()
+    assert not shapStore.ShapStore(str(tmp_path), 'f' * 64, FEATURES, settings={'background_sha256': '1'}).missing(hashes).any()
+
+
+def test_data_hash_depends_on_content_and_order(rows):
+    assert shapStore.data_hash(rows) == shapStore.data_hash(rows.to_numpy())
+    assert shapStore.data_hash(rows) != shapStore.data_hash(rows.iloc[::-1])
+    assert shapStore.data_hash(rows) != shapStore.data_hash(rows.iloc[:5])
@@ -0,0 +1,56 @@
+"""
+Hyperparameter search for the MLModel backends (Hyperband or successive halving).
+
+Run from src/:  python tuneModels.py --models xgboost catboost --jobs 4
+                python genModels.py --params-dir ../genModels/search
+
+Trials are appended to ../genModels/search/<model>.trials.jsonl as they finish; re-running
+the same command after an interruption continues the search instead of starting over.
+"""
+
+import argparse
+import time
+
+from ProAndTrain import evaluation, hyperSearch, instrumentation, model, resampling
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune the hyperparameters of the MLModel backends.')
+    parser.add_argument('--data', type=str, default='../data/risk_factors_cervical_cancer.csv', help='Path to the raw CSV data file')
+    parser.add_argument('--models', type=str, nargs='+', default=model.MLModel.AVAILABLE_MODELS, help='Backends to tune')
+    parser.add_argument('--log-dir', type=str, default='../genModels/search', help='Directory of the trial logs and best configurations')
+    parser.add_argument('--method', type=str, default='hyperband', choices=['hyperband', 'halving'], help='Search schedule')
+    parser.add_argument('--eta', type=int, default=3, help='Keep 1/eta of the configurations at each rung')
+    parser.add_argument('--rungs', type=int, default=4, help='Rungs of the most aggressive bracket')
+    parser.add_argument('--folds', type=int, default=3, help='Number of cross-validation folds')
+    parser.add_argument('--resampler', type=str, default='smote', choices=resampling.RESAMPLERS,
+                        help='Class-imbalance strategy of the training folds')
+    parser.add_argument('--stop-size', type=float, default=0.15, help='Fraction of each training fold held out for early stopping')
+    parser.add_argument('--early-stopping-rounds', type=int, default=20, help='Early stopping patience of XGBoost and CatBoost')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the folds and the sampled configurations')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.enable_from_args(args)
+
+    # The folds (and their resampled rows) are shared with genModels' evaluation of the same settings
+    fold_dir = evaluation.build_fold_cache(args.data, n_folds=args.folds, seed=args.seed, resampler=args.resampler)
+
+    for model_name in args.models:
+        start = time.perf_counter()
+        search = hyperSearch.HyperSearch(model_name, args.data, fold_dir, args.log_dir, eta=args.eta, rungs=args.rungs,
+                                         method=args.method, jobs=args.jobs,
+                                         early_stopping_rounds=args.early_stopping_rounds, stop_size=args.stop_size,
+                                         seed=args.seed)
+        try:
+            best = search.run()
+        except ValueError as e:
+            print(f"{model_name}: not tuned ({e})")
+            continue
+        budget = '' if best['budget'] == 1.0 else f" at budget {best['budget']:.3g} (no full-budget trial scored)"
+        print(f"{model_name}: ROC-AUC {best['score']:.4f}{budget} with {best['params']} "
+              f"({best['trials_run']} trials in {time.perf_counter() - start:.1f} s, {best['trials_resumed']} resumed from the log)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Updates the saved models with newly labeled records instead of retraining them on the whole dataset.
+
+Run from src/:  python updateModels.py --new-data ../data/new_records.csv
+                python updateModels.py --new-data ../data/new_records.csv --models xgboost catboost --metric recall
+
+The new records (raw CSV layout, with 'Biopsy') are imputed with the saved preprocessor and
+scaled with each model's saved scaler, so every feature means what it meant at training time.
+A stratified --holdout fraction of them is set aside, and each model continues training on the
+rest only (MLModel.update), rebalanced with the resampler recorded in the artifact's metadata
+as the training folds were: more boosting rounds for XGBoost and CatBoost, more trees for the
+random forest, a partial_fit pass for the approximate SVM, and a refit on the support vectors
+plus the new rows for the SVM. The validation rows are the held-out records plus the artifact's
+own test fold of --data (when that file is still the one it was trained on). The artifact is
+replaced only if the updated model's --metric there is at least the current model's minus
+--tolerance; each accepted update is appended to the metrics in the model's metadata. A model
+validated on fewer than MIN_VALIDATION_ROWS rows is flagged in the output.
+"""
+
+import argparse
+import copy
+import os
+import time
+
+import numpy as np
+
+import genModels
+from ProAndTrain import dataCache, dataProcessing, evaluation, instrumentation, model, modelRegistry, momory_opt, resampling
+
+
+# Fewer validation rows than this give a noisy metric, so the accept/reject decision is flagged
+MIN_VALIDATION_ROWS = 200
+
+
+def read_new_records(path, preprocessor):
+    """
+    Imputed frame of newly labeled records
+
+    Parameters:
+    path (str): CSV in the raw layout, with a 'Biopsy' column
+    preprocessor (Preprocessor): The preprocessor saved with the models
+
+    Returns:
+    DataFrame: Records with a label, in the preprocessor's column order
+    """
+    records = momory_opt.narrow_to_schema(preprocessor.transform(momory_opt.read_csv_with_schema(path)))
+    return records[records['Biopsy'].notna()]
+
+
+def split_holdout(y, holdout, seed):
+    """
+    (update, holdout) row indices; stratified unless a class has fewer than two rows
+    """
+    from sklearn.model_selection import train_test_split
+
+    rows = np.arange(len(y))
+    stratify = y if np.unique(y, return_counts=True)[1].min() >= 2 else None
+    return train_test_split(rows, test_size=holdout, random_state=seed, stratify=stratify)
+
+
+def base_test_rows(data_path, metadata, seed, max_rows):
+    """
+    Processed rows of the test fold an artifact was evaluated on in genModels.py
+
+    Parameters:
+    data_path (str): Raw CSV the artifact was trained on
+    metadata (dict): The artifact's metadata (training data hash, n_folds, feature order)
+    seed (int): Seed of genModels.py's folds
+    max_rows (int): Largest number of rows returned (a random sample of the fold above it)
+
+    Returns:
+    tuple: (X, y), or None if data_path is not the data the artifact was trained on
+    """
+    n_folds = metadata.get('metrics', {}).get('n_folds')
+    try:
+        if not n_folds or metadata.get('data_sha256') != dataCache.file_hash(data_path):
+            return None
+    except FileNotFoundError:
+        return None
+    X, y, feature_names = dataCache.load_processed(data_path)
+    if feature_names != metadata.get('feature_names'):
+        return None
+
+    test = evaluation.fold_indices(y, n_folds, seed)[genModels.ARTIFACT_FOLD][1]
+    if len(test) > max_rows:
+        test = np.sort(np.random.default_rng(seed).choice(test, size=max_rows, replace=False))
+    return np.asarray(X[test]), np.asarray(y[test])
+
+
+def update_model(registry, name, records, update_rows, holdout_rows, data_path, seed=42, metric='roc_auc', tolerance=0.0,
+                 n_estimators=None, max_validation_rows=20000, new_data_sha256=None, dry_run=False):
+    """
+    Updates one saved model on the new records and replaces its artifact if it validates
+
+    Parameters:
+    registry (ModelRegistry): Registry of the saved models
+    name (str): Model name
+    records (DataFrame): Imputed new records (read_new_records)
+    update_rows (array): Rows of records to train on
+    holdout_rows (array): Rows of records to validate on
+    data_path (str): Raw CSV the model was trained on (its test fold is validated on too)
+    seed (int): Seed of genModels.py's folds
+    metric (str): Metric that decides, one of evaluation.METRICS
+    tolerance (float): Largest accepted drop of the metric
+    n_estimators (int): Trees or boosting rounds to add (default: see MLModel.update)
+    max_validation_rows (int): Largest number of test-fold rows validated on
+    new_data_sha256 (str): Hash of the new records' CSV, recorded in the metadata
+    dry_run (bool): Validate without replacing the artifact
+
+    Returns:
+    dict: Rows, training seconds, the metrics before and after and whether the artifact was replaced
+    """
+    metadata = registry.metadata(name)
+    feature_names = metadata.get('feature_names') or [column for column in records.columns if column != 'Biopsy']
+    # The narrowed columns are nullable; na_value keeps a missing value NaN on every pandas version
+    X = registry.scale(name, records[feature_names].to_numpy(dtype='float32', na_value=np.nan))
+    y = records['Biopsy'].to_numpy(dtype='float32', na_value=np.nan)
+
+    X_update, y_update = X[update_rows], y[update_rows]
+    resampler = metadata.get('resampler')
+    if resampler is not None and len(np.unique(y_update)) > 1:
+        # The new rows get the class balance the training folds had ('class_weight' is in the model's parameters)
+        rows, X_synthetic, y_synthetic = resampling.resample(resampler, X_update, y_update, seed)
+        X_update = np.concatenate([X_update[rows], X_synthetic.astype(X_update.dtype)])
+        y_update = np.concatenate([y_update[rows], y_synthetic])
+
+    X_val, y_val = X[holdout_rows], y[holdout_rows]
+    base = base_test_rows(data_path, metadata, seed, max_validation_rows)
+    if base is not None:
+        X_val = np.concatenate([X_val, registry.scale(name, base[0])])
+        y_val = np.concatenate([y_val, base[1]])
+
+    current = model.MLModel.from_model(name, registry.load(name))
+    # The registry's cached model stays untouched until the update is accepted
+    updated = model.MLModel.from_model(name, copy.deepcopy(current.get_model()))
+    start = time.perf_counter()
+    updated.update(X_update, y_update, n_estimators)
+    train_seconds = time.perf_counter() - start
+
+    before, after = current.evaluate(X_val, y_val), updated.evaluate(X_val, y_val)
+    accepted = before[metric] is not None and after[metric] is not None and after[metric] >= before[metric] - tolerance
+    update = {'new_data_sha256': new_data_sha256, 'rows': len(update_rows), 'resampler': resampler,
+              'resampled_rows': len(y_update), 'validation_rows': len(y_val),
+              'base_test_fold': base is not None, 'train_seconds': train_seconds, 'metric': metric,
+              'before': before, 'after': after}
+
+    if accepted and not dry_run:
+        metrics = metadata.get('metrics', {})
+        with instrumentation.span('save', model=name):
+            registry.save(name, updated.get_model(), feature_names, scaler=metadata.get('scaler'),
+                          data_sha256=metadata.get('data_sha256'),
+                          metrics={**metrics, 'updates': metrics.get('updates', []) + [update]}, resampler=resampler)
+    return {**update, 'accepted': accepted, 'replaced': accepted and not dry_run}
+
+
+def format_metric(value):
+    return 'undefined' if value is None else f"{value:.4f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Update the saved models with new labeled records (warm start).')
+    parser.add_argument('--new-data', type=str, required=True, help='CSV of the new records (raw layout, with Biopsy)')
+    parser.add_argument('--data', type=str, default=genModels.DATA_PATH, help='Raw CSV the models were trained on')
+    parser.add_argument('--models-dir', type=str, default=genModels.MODELS_DIR, help='Directory of the saved models')
+    parser.add_argument('--models', type=str, nargs='+', help='Models to update (default: every saved backend)')
+    parser.add_argument('--holdout', type=float, default=0.25, help='Fraction of the new records kept for validation')
+    parser.add_argument('--metric', type=str, default='roc_auc', choices=evaluation.METRICS, help='Metric an update must not worsen')
+    parser.add_argument('--tolerance', type=float, default=0.0, help='Largest accepted drop of the metric')
+    parser.add_argument('--n-estimators', type=int, help='Trees or boosting rounds to add (default: a tenth of the current count)')
+    parser.add_argument('--max-validation-rows', type=int, default=20000, help="Largest sample of the artifact's test fold validated on")
+    parser.add_argument('--seed', type=int, default=42, help="Seed of the holdout split (and of genModels.py's folds)")
+    parser.add_argument('--dry-run', action='store_true', help='Validate the updates without replacing any artifact')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.enable_from_args(args)
+
+    registry = modelRegistry.ModelRegistry(args.models_dir)
+    names = args.models or [name for name in registry.available() if name in model.MLModel.AVAILABLE_MODELS]
+    preprocessor = dataProcessing.Preprocessor.load(os.path.join(args.models_dir, 'preprocessor.npz'))
+    records = read_new_records(args.new_data, preprocessor)
+    update_rows, holdout_rows = split_holdout(records['Biopsy'].to_numpy(dtype='float32', na_value=np.nan), args.holdout, args.seed)
+    new_data_sha256 = dataCache.file_hash(args.new_data)
+    print(f"{len(records)} new records: {len(update_rows)} to train on, {len(holdout_rows)} held out")
+
+    for name in names:
+        try:
+            result = update_model(registry, name, records, update_rows, holdout_rows, args.data, args.seed, args.metric,
+                                  args.tolerance, args.n_estimators, args.max_validation_rows, new_data_sha256, args.dry_run)
+        except ValueError as e:
+            print(f"{name}: not updated ({e})")
+            continue
+        before, after = (format_metric(result[key][args.metric]) for key in ('before', 'after'))
+        status = 'replaced' if result['replaced'] else 'accepted (dry run)' if result['accepted'] else 'kept the current model'
+        print(f"{name}: {args.metric} {before} -> {after} on {result['validation_rows']} validation rows, "
+              f"{result['train_seconds']:.2f} s training on {result['rows']} rows: {status}")
+        if result['validation_rows'] < MIN_VALIDATION_ROWS:
+            source = '' if result['base_test_fold'] else f", the held-out records alone (no test fold of {args.data} for this artifact)"
+            print(f"  warning: only {result['validation_rows']} validation rows{source}; the {args.metric} comparison is noisy")
+
+
+if __name__ == '__main__':
+    main()